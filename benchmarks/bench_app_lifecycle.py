@@ -0,0 +1,44 @@
+"""Compare a BankAccounts application per request with a shared one.
+
+Run with ``python -m benchmarks.bench_app_lifecycle``. Set
+``PERSISTENCE_MODULE`` and the ``POSTGRES_*`` variables to benchmark
+against Postgres, where the per-request cost includes a new pool.
+"""
+
+import argparse
+
+from src.app.bank_accounts import BankAccounts
+from src.app.container import Container
+
+from .utils import print_summary, time_calls
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=500)
+    args = parser.parse_args()
+
+    def per_request() -> None:
+        accounts = BankAccounts()
+        try:
+            accounts.open_account("Alice", "alice@example.com")
+        finally:
+            accounts.close()
+
+    container = Container()
+    container.start()
+
+    def shared() -> None:
+        container.bank_accounts.open_account("Alice", "alice@example.com")
+
+    try:
+        print_summary(
+            "before: application per request", time_calls(per_request, args.iterations)
+        )
+        print_summary("after: shared application", time_calls(shared, args.iterations))
+    finally:
+        container.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""Rebuild time of the projections, in one process and in a process pool.
+
+Run with ``python -m benchmarks.bench_catchup``. Records transactions in a
+new SQLite database, then rebuilds the summaries and statistics with
+Follower.rebuild() and with catch_up_in_parallel() for each number of
+processes. The speedup is bounded by the number of CPUs.
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+from decimal import Decimal
+
+from eventsourcing.system import SingleThreadedRunner
+
+from src.app.bank_account_statistics import BankAccountStatistics
+from src.app.bank_account_summaries import BankAccountSummaries
+from src.app.bank_accounts import BankAccounts
+from src.app.catchup import catch_up_in_parallel
+from src.app.container import system
+
+FOLLOWERS = [BankAccountSummaries, BankAccountStatistics]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--accounts", type=int, default=1000)
+    parser.add_argument("--events", type=int, default=100)
+    parser.add_argument("--batch-size", type=int, default=10_000)
+    parser.add_argument("--processes", type=int, nargs="+", default=[2, 4])
+    args = parser.parse_args()
+
+    print(f"{os.cpu_count()} CPUs")
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        env = {
+            "PERSISTENCE_MODULE": "eventsourcing.sqlite",
+            "SQLITE_DBNAME": os.path.join(tmpdir, "bank.db"),
+        }
+
+        accounts = BankAccounts(env=env)
+        try:
+            account_ids = [
+                accounts.open_account(f"Client {i}", f"client{i}@example.com")
+                for i in range(args.accounts)
+            ]
+            for _ in range(args.events - 1):
+                accounts.apply_transactions(
+                    [(account_id, Decimal("1.00")) for account_id in account_ids]
+                )
+        finally:
+            accounts.close()
+
+        total = args.accounts * args.events
+        runner = SingleThreadedRunner(system, env=env)
+        runner.start()
+        try:
+            for follower_class in FOLLOWERS:
+                started = time.perf_counter()
+                runner.get(follower_class).rebuild(
+                    BankAccounts.name, batch_size=args.batch_size
+                )
+                elapsed = time.perf_counter() - started
+                print(
+                    f"{follower_class.__name__:<24} 1 process   "
+                    f"{elapsed:7.2f}s {total / elapsed:>10,.0f} events/s"
+                )
+        finally:
+            runner.stop()
+
+        for processes in args.processes:
+            for follower_class in FOLLOWERS:
+                started = time.perf_counter()
+                catch_up_in_parallel(
+                    follower_class,
+                    BankAccounts,
+                    processes,
+                    env=env,
+                    batch_size=args.batch_size,
+                )
+                elapsed = time.perf_counter() - started
+                print(
+                    f"{follower_class.__name__:<24} {processes} processes "
+                    f"{elapsed:7.2f}s {total / elapsed:>10,.0f} events/s"
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""Stored size and replay latency of bank accounts per compression setting.
+
+Run with ``python -m benchmarks.bench_compression``. Each setting records the
+same transactions in a new SQLite database, then replays one account with
+snapshots and the aggregate cache switched off. zstd is skipped when the
+zstandard package isn't installed.
+"""
+
+import argparse
+import importlib.util
+import os
+import tempfile
+
+from decimal import Decimal
+
+from src.app.bank_accounts import BankAccounts
+
+from .utils import print_summary, time_calls
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--accounts", type=int, default=100)
+    parser.add_argument("--events", type=int, default=1000)
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--min-size", type=int, default=64)
+    args = parser.parse_args()
+
+    algorithms = ["", "zlib"]
+    if importlib.util.find_spec("zstandard"):
+        algorithms.append("zstd")
+
+    for algorithm in algorithms:
+        label = algorithm or "none"
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            env = {
+                "PERSISTENCE_MODULE": "eventsourcing.sqlite",
+                "SQLITE_DBNAME": os.path.join(tmpdir, "bank.db"),
+                "IS_SNAPSHOTTING_ENABLED": "n",
+                "COMPRESSION_ALGORITHM": algorithm,
+                "COMPRESSION_MIN_SIZE": str(args.min_size),
+            }
+
+            accounts = BankAccounts(env=env)
+            try:
+                account_ids = [
+                    accounts.open_account(f"Client {i}", f"client{i}@example.com")
+                    for i in range(args.accounts)
+                ]
+                for _ in range(args.events - 1):
+                    accounts.apply_transactions(
+                        [(account_id, Decimal("1.00")) for account_id in account_ids]
+                    )
+
+                stats = accounts.compression_stats
+                if stats is not None:
+                    print(
+                        f"{label}: {stats.compressed:,} events compressed, "
+                        f"{stats.skipped:,} skipped, "
+                        f"{stats.bytes_saved:,} of {stats.bytes_in:,} bytes saved"
+                    )
+            finally:
+                accounts.close()
+
+            size = os.path.getsize(env["SQLITE_DBNAME"])
+            print(f"{label}: database {size:,} bytes")
+
+            # Without the cache, every read replays the whole stream.
+            accounts = BankAccounts(env={**env, "AGGREGATE_CACHE_MAXSIZE": ""})
+            try:
+                samples = time_calls(
+                    lambda: accounts.get_account(account_ids[0]), args.iterations
+                )
+                print_summary(f"{label}: replay {args.events} events", samples)
+            finally:
+                accounts.close()
+
+
+if __name__ == "__main__":
+    main()
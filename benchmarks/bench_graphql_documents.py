@@ -0,0 +1,74 @@
+"""Parse and validate cost per GraphQL request, with and without caching.
+
+Run with ``python -m benchmarks.bench_graphql_documents``. Each of the
+``bench_suite`` operations is parsed and validated against the API schema
+on every call, as with DM_DOCUMENT_CACHE_MAXSIZE=0, and then through LRU
+caches like the schema's ParserCache and ValidationCache. The request
+body sizes show what sending a persisted query's hash saves.
+"""
+
+import argparse
+import hashlib
+import json
+
+from functools import lru_cache
+
+from graphql import specified_rules
+from strawberry.schema.execute import parse_document, validate_document
+
+from src.entrypoints.api.graphql import schema
+
+from .bench_suite import DEPOSIT_FUNDS, GET_ACCOUNT, OPEN_ACCOUNT, TRANSFER_FUNDS
+from .utils import print_summary, time_calls
+
+OPERATIONS = {
+    "open": OPEN_ACCOUNT,
+    "deposit": DEPOSIT_FUNDS,
+    "transfer": TRANSFER_FUNDS,
+    "node": GET_ACCOUNT,
+}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+
+    graphql_schema = schema._schema
+    rules = tuple(specified_rules)
+    cached_parse_document = lru_cache(maxsize=1000)(parse_document)
+    cached_validate_document = lru_cache(maxsize=1000)(validate_document)
+
+    for name, query in OPERATIONS.items():
+        document = parse_document(query)
+
+        print_summary(
+            f"{name}: parse",
+            time_calls(lambda: parse_document(query), args.iterations),
+        )
+        print_summary(
+            f"{name}: validate",
+            time_calls(
+                lambda: validate_document(graphql_schema, document, rules),
+                args.iterations,
+            ),
+        )
+        print_summary(
+            f"{name}: cached parse and validate",
+            time_calls(
+                lambda: cached_validate_document(
+                    graphql_schema, cached_parse_document(query), rules
+                ),
+                args.iterations,
+            ),
+        )
+
+        sha256_hash = hashlib.sha256(query.encode()).hexdigest()
+        extensions = {"persistedQuery": {"version": 1, "sha256Hash": sha256_hash}}
+        query_size = len(json.dumps({"query": query}))
+        hash_size = len(json.dumps({"extensions": extensions}))
+        print(f"{name}: request body {query_size} bytes, {hash_size} with the hash")
+
+
+if __name__ == "__main__":
+    main()
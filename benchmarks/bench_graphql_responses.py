@@ -0,0 +1,99 @@
+"""Encoding cost of large GraphQL responses, with json and with orjson.
+
+Run with ``python -m benchmarks.bench_graphql_responses``. Opens accounts
+in memory, then fetches them all with one ``bankAccounts`` query through
+the ``create_app()`` ASGI app. The response is encoded with json.dumps, as
+strawberry's own router does, and with the API router's orjson encoder,
+and the whole request is timed with each.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import time
+
+from httpx import ASGITransport, AsyncClient
+from strawberry.relay import to_base64
+
+from src.entrypoints.api.app import create_app
+from src.entrypoints.api.graphql import router
+
+from .utils import print_summary, time_calls
+
+GET_ACCOUNTS = """
+query ($ids: [GlobalID!]!) {
+    bankAccounts(ids: $ids) {
+        id
+        balance
+        email
+        fullName
+        overdraftLimit
+    }
+}
+"""
+
+
+async def run(num_accounts: int, iterations: int) -> None:
+    app = create_app()
+
+    async with app.router.lifespan_context(app):
+        bank_accounts = app.state.container.bank_accounts
+        ids = [
+            to_base64(
+                "BankAccount",
+                str(
+                    bank_accounts.open_account(f"Client {i}", f"client{i}@example.com")
+                ),
+            )
+            for i in range(num_accounts)
+        ]
+
+        transport = ASGITransport(app=app)
+        async with AsyncClient(transport=transport, base_url="http://bench") as client:
+
+            async def fetch() -> bytes:
+                response = await client.post(
+                    "/graphql", json={"query": GET_ACCOUNTS, "variables": {"ids": ids}}
+                )
+                response.raise_for_status()
+                return response.content
+
+            response_data = json.loads(await fetch())
+            assert len(response_data["data"]["bankAccounts"]) == num_accounts
+
+            print(f"{num_accounts} nodes, {len(json.dumps(response_data)):,} bytes")
+            print_summary(
+                "encode json",
+                time_calls(lambda: json.dumps(response_data), iterations),
+            )
+            print_summary(
+                "encode orjson",
+                time_calls(lambda: router.encode_json(response_data), iterations),
+            )
+
+            encoders = {"json": json.dumps, "orjson": router.encode_json}
+            for label, encode in encoders.items():
+                router.encode_json = encode  # type: ignore[method-assign]
+                samples = []
+                for _ in range(iterations):
+                    started = time.perf_counter()
+                    await fetch()
+                    samples.append((time.perf_counter() - started) * 1000)
+                print_summary(f"request with {label}", samples)
+
+            del router.encode_json
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--accounts", type=int, default=1000)
+    parser.add_argument("--iterations", type=int, default=50)
+    args = parser.parse_args()
+
+    os.environ["PERSISTENCE_MODULE"] = "eventsourcing.popo"
+    asyncio.run(run(args.accounts, args.iterations))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""Decimal amounts against integer minor units, in arithmetic and replay.
+
+Run with ``python -m benchmarks.bench_money``. First sums amounts as Decimal
+and as plain integers of minor units, then replays an account whose events were stored
+by OrjsonTranscoder (Decimal strings) and MinorUnitsTranscoder (integers).
+"""
+
+import argparse
+
+from decimal import Decimal
+
+from src.app.bank_accounts import BankAccounts
+from src.domain.money import Money
+
+from .utils import print_summary, time_calls
+
+TRANSCODERS = {
+    "decimal strings": "src.app.transcoders:OrjsonTranscoder",
+    "minor units": "src.app.transcoders:MinorUnitsTranscoder",
+}
+
+
+def sum_decimals(amounts: list[Decimal]) -> Decimal:
+    balance = Decimal("0.00")
+    for amount in amounts:
+        balance += amount
+    return balance
+
+
+def sum_minor_units(amounts: list[int]) -> int:
+    balance = 0
+    for amount in amounts:
+        balance += amount
+    return balance
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--events", type=int, default=100_000)
+    parser.add_argument("--iterations", type=int, default=5)
+    args = parser.parse_args()
+
+    decimals = [Decimal("12.34")] * args.events
+    minor_units = [Money.from_decimal(amount).minor_units for amount in decimals]
+
+    print_summary(
+        f"sum {args.events} Decimal",
+        time_calls(lambda: sum_decimals(decimals), args.iterations),
+    )
+    print_summary(
+        f"sum {args.events} int",
+        time_calls(lambda: sum_minor_units(minor_units), args.iterations),
+    )
+
+    for name, topic in TRANSCODERS.items():
+        accounts = BankAccounts(
+            env={
+                "TRANSCODER_TOPIC": topic,
+                "IS_SNAPSHOTTING_ENABLED": "n",
+                "AGGREGATE_CACHE_MAXSIZE": "",
+            }
+        )
+        try:
+            account_id = accounts.open_account("Alice", "alice@example.com")
+            accounts.apply_transactions(
+                [(account_id, Decimal("12.34"))] * (args.events - 1)
+            )
+            print_summary(
+                f"get_account, {name}",
+                time_calls(lambda: accounts.get_account(account_id), args.iterations),
+            )
+            print_summary(
+                f"fold_balance, {name}",
+                time_calls(lambda: accounts.fold_balance(account_id), args.iterations),
+            )
+        finally:
+            accounts.close()
+
+
+if __name__ == "__main__":
+    main()
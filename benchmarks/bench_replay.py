@@ -0,0 +1,50 @@
+"""Time and memory to compute a balance by replaying a long event stream.
+
+Run with ``python -m benchmarks.bench_replay``. Compares reconstructing the
+aggregate with get_account() against fold_balance(), which sums amounts from
+the decoded stored events without constructing event objects. Snapshots and
+the aggregate cache are switched off so both replay the whole stream.
+"""
+
+import argparse
+import tracemalloc
+
+from decimal import Decimal
+
+from src.app.bank_accounts import BankAccounts
+
+from .utils import print_summary, time_calls
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--events", type=int, default=100_000)
+    parser.add_argument("--iterations", type=int, default=5)
+    args = parser.parse_args()
+
+    accounts = BankAccounts(
+        env={"IS_SNAPSHOTTING_ENABLED": "n", "AGGREGATE_CACHE_MAXSIZE": ""}
+    )
+    try:
+        account_id = accounts.open_account("Alice", "alice@example.com")
+        accounts.apply_transactions([(account_id, Decimal("1.00"))] * (args.events - 1))
+
+        replays = {
+            "get_account": lambda: accounts.get_account(account_id).balance,
+            "fold_balance": lambda: accounts.fold_balance(account_id),
+        }
+        for name, replay in replays.items():
+            tracemalloc.start()
+            replay()
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+            samples = time_calls(replay, args.iterations)
+            print_summary(f"{name} ({args.events} events)", samples)
+            print(f"{'':<40} peak memory={peak / 1024 / 1024:.1f}MiB")
+    finally:
+        accounts.close()
+
+
+if __name__ == "__main__":
+    main()
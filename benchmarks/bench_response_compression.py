@@ -0,0 +1,65 @@
+"""Response compression ratio and CPU time per algorithm and level.
+
+Run with ``python -m benchmarks.bench_response_compression``. Compresses
+``bankAccounts`` responses of several sizes with each available algorithm
+at the levels ResponseCompressor picks, and with gzip at level 9 as
+GZipMiddleware did.
+"""
+
+import argparse
+import time
+
+from uuid import uuid4
+
+import orjson
+from strawberry.relay import to_base64
+
+from src.entrypoints.api.compression import LEVELS, ResponseCompressor, _compress
+
+
+def make_response(num_accounts: int) -> bytes:
+    return orjson.dumps(
+        {
+            "data": {
+                "bankAccounts": [
+                    {
+                        "id": to_base64("BankAccount", str(uuid4())),
+                        "balance": f"{i * 37 % 100000}.{i % 100:02}",
+                        "email": f"client{i}@example.com",
+                        "fullName": f"Client {i}",
+                    }
+                    for i in range(num_accounts)
+                ]
+            }
+        }
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--accounts", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--iterations", type=int, default=100)
+    args = parser.parse_args()
+
+    algorithms = ResponseCompressor().algorithms
+    for num_accounts in args.accounts:
+        body = make_response(num_accounts)
+        print(f"{num_accounts} accounts, {len(body):,} bytes")
+
+        settings = [("gzip", 9)]
+        for algorithm in algorithms:
+            settings += [(algorithm, level) for level in sorted(set(LEVELS[algorithm]))]
+
+        for algorithm, level in settings:
+            started = time.thread_time()
+            for _ in range(args.iterations):
+                compressed = _compress(algorithm, body, level)
+            cpu_ms = (time.thread_time() - started) / args.iterations * 1000
+            print(
+                f"  {algorithm:<4} level {level:<2} {len(compressed):>9,} bytes "
+                f"({len(compressed) / len(body):6.1%}) {cpu_ms:8.3f}ms CPU"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""Read latency against event count, with and without snapshots.
+
+Run with ``python -m benchmarks.bench_snapshotting``.
+"""
+
+import argparse
+from decimal import Decimal
+
+from src.app.bank_accounts import BankAccounts
+
+from .utils import print_summary, time_calls
+
+
+def build_account(accounts: BankAccounts, num_events: int):
+    account_id = accounts.open_account("Alice", "alice@example.com")
+
+    for _ in range(num_events - 1):
+        accounts.deposit_funds(account_id, Decimal("1.00"))
+
+    return account_id
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--event-counts", type=int, nargs="+", default=[100, 1000, 10000]
+    )
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--interval", type=int, default=100)
+    args = parser.parse_args()
+
+    settings = {
+        "without snapshots": {"IS_SNAPSHOTTING_ENABLED": "n"},
+        f"snapshot every {args.interval}": {
+            "BANK_ACCOUNT_SNAPSHOTTING_INTERVAL": str(args.interval)
+        },
+    }
+
+    for num_events in args.event_counts:
+        for label, env in settings.items():
+            # Time replays, not aggregate cache hits.
+            accounts = BankAccounts(env={**env, "AGGREGATE_CACHE_MAXSIZE": ""})
+            try:
+                account_id = build_account(accounts, num_events)
+                samples = time_calls(
+                    lambda: accounts.get_account(account_id), args.iterations
+                )
+                print_summary(f"{num_events} events, {label}", samples)
+            finally:
+                accounts.close()
+
+
+if __name__ == "__main__":
+    main()
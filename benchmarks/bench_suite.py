@@ -0,0 +1,290 @@
+"""Throughput and latency of the main workloads, per persistence module.
+
+Run with ``python -m benchmarks.bench_suite``. Each workload is run against
+the ``BankAccounts`` application directly and against the GraphQL API, by
+driving the real ``create_app()`` ASGI app through httpx. The postgres
+module reads its connection settings (POSTGRES_DBNAME, POSTGRES_HOST, ...)
+from the environment. Pass ``--output`` to save the results as JSON.
+"""
+
+import argparse
+import asyncio
+import contextlib
+import datetime
+import itertools
+import json
+import os
+import platform
+import random
+import subprocess
+import tempfile
+import time
+import typing
+
+from decimal import Decimal
+
+from httpx import ASGITransport, AsyncClient
+
+from src.app.bank_accounts import BankAccounts
+from src.entrypoints.api.app import create_app
+
+from .utils import print_results, summarize
+
+WORKLOADS = ["open", "deposit", "transfer", "node", "mixed"]
+
+PERSISTENCE_MODULES = {
+    "popo": "eventsourcing.popo",
+    "sqlite": "eventsourcing.sqlite",
+    "postgres": "eventsourcing.postgres",
+}
+
+OPEN_ACCOUNT = """
+mutation ($input: OpenBankAccountInput!) {
+    bankAccount {
+        open(input: $input) {
+            ... on Success {
+                entities
+            }
+        }
+    }
+}
+"""
+
+DEPOSIT_FUNDS = """
+mutation ($input: DepositFundsInput!) {
+    bankAccount {
+        depositFunds(input: $input) {
+            ... on Success {
+                message
+            }
+        }
+    }
+}
+"""
+
+TRANSFER_FUNDS = """
+mutation ($input: TransferBankAccountFundsInput!) {
+    bankAccount {
+        transferFunds(input: $input) {
+            ... on Success {
+                message
+            }
+        }
+    }
+}
+"""
+
+GET_ACCOUNT = """
+query ($id: GlobalID!) {
+    bankAccount(id: $id) {
+        balance
+        fullName
+    }
+}
+"""
+
+
+@contextlib.contextmanager
+def persistence_env(persistence: str) -> typing.Iterator[None]:
+    """Point applications constructed in this block at ``persistence``"""
+    saved = dict(os.environ)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        os.environ["PERSISTENCE_MODULE"] = PERSISTENCE_MODULES[persistence]
+        if persistence == "sqlite":
+            os.environ["SQLITE_DBNAME"] = os.path.join(tmpdir, "bank.db")
+
+        try:
+            yield
+        finally:
+            os.environ.clear()
+            os.environ.update(saved)
+
+
+def pick_operation(workload: str, rng: random.Random) -> str:
+    if workload != "mixed":
+        return workload
+
+    # Reads dominate, as they do for most API clients.
+    return rng.choices(["node", "deposit", "transfer"], weights=[6, 3, 1])[0]
+
+
+def run_direct(workload: str, num_accounts: int, iterations: int) -> dict:
+    accounts = BankAccounts()
+    rng = random.Random(0)
+
+    try:
+        account_ids = [
+            accounts.open_account(f"Client {i}", f"client{i}@example.com")
+            for i in range(num_accounts)
+        ]
+        for account_id in account_ids:
+            accounts.deposit_funds(account_id, Decimal("1000000.00"))
+
+        operations: dict[str, typing.Callable[[], typing.Any]] = {
+            "open": lambda: accounts.open_account("Alice", "alice@example.com"),
+            "deposit": lambda: accounts.deposit_funds(
+                rng.choice(account_ids), Decimal("1.00")
+            ),
+            "transfer": lambda: accounts.transfer_funds(
+                *rng.sample(account_ids, 2), Decimal("1.00")
+            ),
+            "node": lambda: accounts.get_account(rng.choice(account_ids)),
+        }
+
+        samples = []
+        for _ in range(iterations):
+            operation = operations[pick_operation(workload, rng)]
+            started = time.perf_counter()
+            operation()
+            samples.append((time.perf_counter() - started) * 1000)
+
+        return summarize(samples)
+    finally:
+        accounts.close()
+
+
+async def run_api(
+    workload: str, num_accounts: int, iterations: int, concurrency: int
+) -> dict:
+    app = create_app()
+    rng = random.Random(0)
+
+    async with app.router.lifespan_context(app):
+        transport = ASGITransport(app=app)
+        async with AsyncClient(transport=transport, base_url="http://bench") as client:
+
+            async def post(query: str, variables: dict) -> dict:
+                response = await client.post(
+                    "/graphql", json={"query": query, "variables": variables}
+                )
+                response.raise_for_status()
+                return response.json()
+
+            async def open_account() -> str:
+                result = await post(
+                    OPEN_ACCOUNT,
+                    {"input": {"email": "alice@example.com", "fullName": "Alice"}},
+                )
+                return result["data"]["bankAccount"]["open"]["entities"][0]
+
+            account_ids = [await open_account() for _ in range(num_accounts)]
+            for account_id in account_ids:
+                await post(
+                    DEPOSIT_FUNDS,
+                    {"input": {"bankAccount": account_id, "amount": "1000000.00"}},
+                )
+
+            async def deposit() -> None:
+                await post(
+                    DEPOSIT_FUNDS,
+                    {
+                        "input": {
+                            "bankAccount": rng.choice(account_ids),
+                            "amount": "1.00",
+                        }
+                    },
+                )
+
+            async def transfer() -> None:
+                debit, credit = rng.sample(account_ids, 2)
+                await post(
+                    TRANSFER_FUNDS,
+                    {
+                        "input": {
+                            "debitBankAccount": debit,
+                            "creditBankAccount": credit,
+                            "amount": "1.00",
+                        }
+                    },
+                )
+
+            async def node() -> None:
+                await post(GET_ACCOUNT, {"id": rng.choice(account_ids)})
+
+            operations: dict[str, typing.Callable[[], typing.Awaitable]] = {
+                "open": open_account,
+                "deposit": deposit,
+                "transfer": transfer,
+                "node": node,
+            }
+            samples: list[float] = []
+            remaining = itertools.count()
+
+            async def run_client() -> None:
+                while next(remaining) < iterations:
+                    operation = operations[pick_operation(workload, rng)]
+                    started = time.perf_counter()
+                    await operation()
+                    samples.append((time.perf_counter() - started) * 1000)
+
+            started = time.perf_counter()
+            await asyncio.gather(*(run_client() for _ in range(concurrency)))
+            elapsed = time.perf_counter() - started
+
+    return summarize(samples, elapsed)
+
+
+def git_commit() -> str | None:
+    with contextlib.suppress(OSError, subprocess.CalledProcessError):
+        return subprocess.check_output(
+            ["git", "rev-parse", "HEAD"], text=True, stderr=subprocess.DEVNULL
+        ).strip()
+    return None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--persistence",
+        nargs="+",
+        choices=list(PERSISTENCE_MODULES),
+        default=["popo", "sqlite"],
+    )
+    parser.add_argument("--workloads", nargs="+", choices=WORKLOADS, default=WORKLOADS)
+    parser.add_argument(
+        "--targets", nargs="+", choices=["direct", "api"], default=["direct", "api"]
+    )
+    parser.add_argument("--iterations", type=int, default=500)
+    parser.add_argument("--accounts", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    args = parser.parse_args()
+
+    results = []
+
+    for persistence, target, workload in itertools.product(
+        args.persistence, args.targets, args.workloads
+    ):
+        with persistence_env(persistence):
+            if target == "direct":
+                summary = run_direct(workload, args.accounts, args.iterations)
+            else:
+                summary = asyncio.run(
+                    run_api(workload, args.accounts, args.iterations, args.concurrency)
+                )
+
+        print_results(f"{persistence} {target} {workload}", summary)
+        results.append(
+            {
+                "persistence": persistence,
+                "target": target,
+                "workload": workload,
+                **summary,
+            }
+        )
+
+    if args.output:
+        report = {
+            "created_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "parameters": vars(args),
+            "results": results,
+        }
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""Encode and decode throughput of TransactionAppended events per transcoder.
+
+Run with ``python -m benchmarks.bench_transcoders``. Events are mapped to
+and from stored events with each transcoder, in chunks so that a million
+events don't have to be held in memory at once.
+"""
+
+import argparse
+import time
+
+from datetime import datetime, timezone
+from decimal import Decimal
+from uuid import uuid4
+
+from src.app.bank_accounts import BankAccounts
+from src.domain.bank_account import TransactionAppended
+
+TRANSCODERS = {
+    "json": "eventsourcing.persistence:JSONTranscoder",
+    "orjson": "src.app.transcoders:OrjsonTranscoder",
+}
+
+
+def create_events(start: int, count: int) -> list[TransactionAppended]:
+    originator_id = uuid4()
+
+    return [
+        TransactionAppended(
+            originator_id=originator_id,
+            originator_version=version,
+            timestamp=datetime.now(timezone.utc),
+            amount=Decimal("12.34"),
+            transaction_id=uuid4(),
+        )
+        for version in range(start, start + count)
+    ]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--events", type=int, default=1_000_000)
+    parser.add_argument("--chunk-size", type=int, default=10_000)
+    args = parser.parse_args()
+
+    for name, topic in TRANSCODERS.items():
+        accounts = BankAccounts(env={"TRANSCODER_TOPIC": topic})
+        mapper = accounts.mapper
+        encode_time = decode_time = 0.0
+        total_bytes = 0
+
+        for start in range(0, args.events, args.chunk_size):
+            events = create_events(start + 1, min(args.chunk_size, args.events - start))
+
+            started = time.perf_counter()
+            stored_events = [mapper.to_stored_event(event) for event in events]
+            encode_time += time.perf_counter() - started
+
+            started = time.perf_counter()
+            for stored_event in stored_events:
+                mapper.to_domain_event(stored_event)
+            decode_time += time.perf_counter() - started
+
+            total_bytes += sum(
+                len(stored_event.state) for stored_event in stored_events
+            )
+
+        accounts.close()
+        print(
+            f"{name:<8} encode={args.events / encode_time:>10,.0f} events/s "
+            f"decode={args.events / decode_time:>10,.0f} events/s "
+            f"size={total_bytes / args.events:.0f} bytes/event"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""Requests/sec of the GraphQL API at increasing client concurrency.
+
+Run with ``python -m benchmarks.load_test``. Requests go through the real
+``create_app()`` ASGI app in-process, so results exclude network cost.
+"""
+
+import argparse
+import asyncio
+import time
+
+from httpx import ASGITransport, AsyncClient
+
+from src.entrypoints.api.app import create_app
+
+OPEN_ACCOUNT = """
+mutation ($input: OpenBankAccountInput!) {
+    bankAccount {
+        open(input: $input) {
+            ... on Success {
+                entities
+            }
+        }
+    }
+}
+"""
+
+DEPOSIT_FUNDS = """
+mutation ($input: DepositFundsInput!) {
+    bankAccount {
+        depositFunds(input: $input) {
+            ... on Success {
+                message
+            }
+        }
+    }
+}
+"""
+
+GET_BALANCE = """
+query ($id: GlobalID!) {
+    bankAccount(id: $id) {
+        balance
+    }
+}
+"""
+
+
+async def run_clients(
+    client: AsyncClient, concurrency: int, requests_per_client: int
+) -> float:
+    async def run_client() -> None:
+        response = await client.post(
+            "/graphql",
+            json={
+                "query": OPEN_ACCOUNT,
+                "variables": {
+                    "input": {"email": "alice@example.com", "fullName": "Alice"}
+                },
+            },
+        )
+        account = response.json()["data"]["bankAccount"]["open"]["entities"][0]
+
+        for i in range(requests_per_client - 1):
+            if i % 2:
+                payload = {
+                    "query": DEPOSIT_FUNDS,
+                    "variables": {"input": {"bankAccount": account, "amount": "1.00"}},
+                }
+            else:
+                payload = {"query": GET_BALANCE, "variables": {"id": account}}
+
+            await client.post("/graphql", json=payload)
+
+    started = time.perf_counter()
+    await asyncio.gather(*[run_client() for _ in range(concurrency)])
+    elapsed = time.perf_counter() - started
+
+    return concurrency * requests_per_client / elapsed
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[50, 200, 1000])
+    parser.add_argument("--requests-per-client", type=int, default=10)
+    args = parser.parse_args()
+
+    app = create_app()
+
+    async with app.router.lifespan_context(app):
+        transport = ASGITransport(app=app)
+        async with AsyncClient(transport=transport, base_url="http://bench") as client:
+            for concurrency in args.concurrency:
+                rps = await run_clients(client, concurrency, args.requests_per_client)
+                print(f"{concurrency:>5} concurrent clients: {rps:,.0f} requests/sec")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,57 @@
+import statistics
+import time
+import typing
+
+
+def percentile(samples: list[float], pct: float) -> float:
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, round(pct / 100 * (len(ordered) - 1)))
+
+    return ordered[index]
+
+
+def time_calls(func: typing.Callable[[], typing.Any], iterations: int) -> list[float]:
+    """Call ``func`` ``iterations`` times, returning each latency in ms"""
+    samples = []
+
+    for _ in range(iterations):
+        started = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - started) * 1000)
+
+    return samples
+
+
+def summarize(samples: list[float], elapsed: float | None = None) -> dict[str, float]:
+    """Latency percentiles, plus throughput over ``elapsed`` seconds.
+
+    Without ``elapsed`` the calls are taken to have run back to back.
+    """
+    if elapsed is None:
+        elapsed = sum(samples) / 1000
+
+    return {
+        "count": len(samples),
+        "throughput_per_sec": len(samples) / elapsed,
+        "mean_ms": statistics.fmean(samples),
+        "p50_ms": percentile(samples, 50),
+        "p95_ms": percentile(samples, 95),
+        "p99_ms": percentile(samples, 99),
+    }
+
+
+def print_summary(
+    name: str, samples: list[float], elapsed: float | None = None
+) -> None:
+    print_results(name, summarize(samples, elapsed))
+
+
+def print_results(name: str, summary: dict[str, float]) -> None:
+    print(
+        f"{name:<40} n={summary['count']:<6} "
+        f"ops/s={summary['throughput_per_sec']:,.0f} "
+        f"mean={summary['mean_ms']:.3f}ms "
+        f"p50={summary['p50_ms']:.3f}ms "
+        f"p95={summary['p95_ms']:.3f}ms "
+        f"p99={summary['p99_ms']:.3f}ms"
+    )
@@ -1,7 +1,7 @@
 import nox
 from nox_poetry import session
 
-nox.options.sessions = ["test_integration"]
+nox.options.sessions = ["test_unit", "test_integration"]
 
 TEST_ENV_VARS = {
     "DM_LOG_LEVEL": "info",
@@ -14,6 +14,16 @@ TEST_ENV_VARS = {
 }
 
 
+@session(python="3.12", reuse_venv=True)
+def test_unit(local_session):
+    """Run all unit tests"""
+    local_session.run_always("poetry", "install", external=True)
+
+    local_session.run(
+        "pytest", "--disable-warnings", "tests/unit", *local_session.posargs
+    )
+
+
 @session(python="3.12", reuse_venv=True)
 def test_integration(local_session):
     """Run all integration tests"""
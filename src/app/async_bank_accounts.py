@@ -0,0 +1,197 @@
+import asyncio
+import functools
+import typing
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from decimal import Decimal
+from uuid import UUID
+
+from src.app.bank_account_statistics import BankAccountStatistics
+from src.app.bank_account_summaries import BankAccountSummaries
+from src.app.bank_accounts import BankAccounts, TransactionOutcome
+from src.app.dispatcher import CommandDispatcher
+from src.app.statistics_recorders import BankStatistics
+from src.app.summary_recorders import BankAccountSummary
+from src.domain.bank_account import BankAccount, TransactionAppended
+
+T = typing.TypeVar("T")
+
+
+class AsyncBankAccounts:
+    """Async interface to a BankAccounts application.
+
+    Calls run on a dedicated worker pool instead of the event loop or the
+    Starlette threadpool. By default it has one worker per database
+    connection (POSTGRES_POOL_SIZE + POSTGRES_POOL_MAX_OVERFLOW), so extra
+    requests wait in the loop rather than in threads holding no connection.
+
+    Setting COMMAND_DISPATCHER_PARTITIONS routes deposits and withdrawals
+    through a CommandDispatcher, which batches concurrent transactions on
+    the same account into one save. Those with an idempotency key are
+    applied on their own.
+    """
+
+    BANK_ACCOUNTS_MAX_WORKERS = "BANK_ACCOUNTS_MAX_WORKERS"
+    COMMAND_DISPATCHER_PARTITIONS = "COMMAND_DISPATCHER_PARTITIONS"
+
+    def __init__(
+        self,
+        accounts: BankAccounts,
+        summaries: BankAccountSummaries | None = None,
+        statistics: BankAccountStatistics | None = None,
+    ) -> None:
+        self.accounts = accounts
+        self.summaries = summaries
+        self.statistics = statistics
+        self.max_workers = self._get_max_workers(accounts)
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.max_workers,
+            thread_name_prefix="bank-accounts",
+        )
+        self.dispatcher = self._construct_dispatcher(accounts)
+
+    @classmethod
+    def _get_max_workers(cls, accounts: BankAccounts) -> int:
+        max_workers = accounts.env.get(cls.BANK_ACCOUNTS_MAX_WORKERS)
+        if max_workers:
+            return int(max_workers)
+
+        pool_size = accounts.env.get("POSTGRES_POOL_SIZE") or "5"
+        max_overflow = accounts.env.get("POSTGRES_POOL_MAX_OVERFLOW") or "10"
+        return int(pool_size) + int(max_overflow)
+
+    def _construct_dispatcher(self, accounts: BankAccounts) -> CommandDispatcher | None:
+        num_partitions = int(accounts.env.get(self.COMMAND_DISPATCHER_PARTITIONS) or 0)
+        if num_partitions <= 0:
+            return None
+
+        return CommandDispatcher(
+            self.apply_transactions, num_partitions, accounts.retry_policy
+        )
+
+    async def _run(
+        self, func: typing.Callable[..., T], *args: typing.Any, **kwargs: typing.Any
+    ) -> T:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor, functools.partial(func, *args, **kwargs)
+        )
+
+    async def open_account(self, full_name: str, email_address: str) -> UUID:
+        return await self._run(self.accounts.open_account, full_name, email_address)
+
+    async def get_account(
+        self, account_id: UUID, version: int | None = None
+    ) -> BankAccount:
+        return await self._run(self.accounts.get_account, account_id, version)
+
+    async def get_account_at(self, account_id: UUID, at: datetime) -> BankAccount:
+        return await self._run(self.accounts.get_account_at, account_id, at)
+
+    async def get_accounts(
+        self, account_ids: typing.Iterable[UUID]
+    ) -> dict[UUID, BankAccount]:
+        return await self._run(self.accounts.get_accounts, list(account_ids))
+
+    async def get_summaries(
+        self, account_ids: typing.Iterable[UUID]
+    ) -> dict[UUID, BankAccountSummary]:
+        assert self.summaries is not None
+        return await self._run(self.summaries.get_summaries, list(account_ids))
+
+    async def get_summaries_by_email(
+        self, email_address: str
+    ) -> list[BankAccountSummary]:
+        assert self.summaries is not None
+        return await self._run(self.summaries.get_summaries_by_email, email_address)
+
+    async def search_summaries(
+        self, name_prefix: str, limit: int
+    ) -> list[BankAccountSummary]:
+        assert self.summaries is not None
+        return await self._run(self.summaries.search_summaries, name_prefix, limit)
+
+    async def get_statistics(self) -> BankStatistics:
+        assert self.statistics is not None
+        return await self._run(self.statistics.get_statistics)
+
+    async def get_balance_at(self, account_id: UUID, at: datetime) -> Decimal:
+        return await self._run(self.accounts.get_balance_at, account_id, at)
+
+    async def get_transactions(
+        self,
+        account_id: UUID,
+        limit: int,
+        gt: int | None = None,
+        lte: int | None = None,
+        desc: bool = False,
+    ) -> list[TransactionAppended]:
+        return await self._run(
+            self.accounts.get_transactions, account_id, limit, gt, lte, desc
+        )
+
+    async def get_balance(self, account_id: UUID) -> Decimal:
+        return await self._run(self.accounts.get_balance, account_id)
+
+    async def deposit_funds(
+        self,
+        credit_account_id: UUID,
+        amount: Decimal,
+        idempotency_key: str | None = None,
+    ) -> None:
+        if self.dispatcher is not None and idempotency_key is None:
+            await self.dispatcher.submit(credit_account_id, amount)
+        else:
+            await self._run(
+                self.accounts.deposit_funds, credit_account_id, amount, idempotency_key
+            )
+
+    async def withdraw_funds(
+        self,
+        debit_account_id: UUID,
+        amount: Decimal,
+        idempotency_key: str | None = None,
+    ) -> None:
+        if self.dispatcher is not None and idempotency_key is None:
+            await self.dispatcher.submit(debit_account_id, -amount)
+        else:
+            await self._run(
+                self.accounts.withdraw_funds, debit_account_id, amount, idempotency_key
+            )
+
+    async def transfer_funds(
+        self,
+        debit_account_id: UUID,
+        credit_account_id: UUID,
+        amount: Decimal,
+        idempotency_key: str | None = None,
+    ) -> None:
+        await self._run(
+            self.accounts.transfer_funds,
+            debit_account_id,
+            credit_account_id,
+            amount,
+            idempotency_key,
+        )
+
+    async def apply_transactions(
+        self, transactions: typing.Sequence[tuple[UUID, Decimal]]
+    ) -> list[TransactionOutcome]:
+        return await self._run(self.accounts.apply_transactions, transactions)
+
+    async def set_overdraft_limit(
+        self, account_id: UUID, overdraft_limit: Decimal
+    ) -> None:
+        await self._run(self.accounts.set_overdraft_limit, account_id, overdraft_limit)
+
+    async def get_overdraft_limit(self, account_id: UUID) -> Decimal:
+        return await self._run(self.accounts.get_overdraft_limit, account_id)
+
+    async def close_account(self, account_id: UUID) -> None:
+        await self._run(self.accounts.close_account, account_id)
+
+    def close(self) -> None:
+        if self.dispatcher is not None:
+            self.dispatcher.stop()
+        self._executor.shutdown(wait=True)
@@ -0,0 +1,187 @@
+import typing
+
+from dataclasses import replace
+from decimal import Decimal
+from functools import singledispatchmethod
+from uuid import UUID
+
+from eventsourcing import postgres, sqlite
+from eventsourcing.application import ProcessingEvent
+from eventsourcing.domain import DomainEventProtocol
+from eventsourcing.persistence import Mapper, Notification, Transcoder
+from eventsourcing.utils import get_topic
+
+from src.app.catchup import RebuildableFollower
+from src.app.compression import construct_mapper
+from src.app.repository import decode_event_state
+from src.app.statistics_recorders import (
+    BALANCES_KWARG,
+    STATISTICS_KWARG,
+    ZERO,
+    BankStatistics,
+    BankStatisticsRecorder,
+    POPOBankStatisticsRecorder,
+    PostgresBankStatisticsRecorder,
+    SQLiteBankStatisticsRecorder,
+)
+from src.app.transcoders import construct_transcoder
+from src.domain.bank_account import Closed, Opened, TransactionAppended
+
+OPENED_TOPIC = get_topic(Opened)
+TRANSACTION_APPENDED_TOPIC = get_topic(TransactionAppended)
+CLOSED_TOPIC = get_topic(Closed)
+
+# The statistics, and the balance of each account.
+StatisticsFold = tuple[BankStatistics, dict[UUID, Decimal]]
+
+
+class BankAccountStatistics(RebuildableFollower):
+    """Keeps running totals across all bank accounts.
+
+    The totals are a single row, updated with each event in the same
+    transaction as the position in the followed notification log, so
+    reading them doesn't depend on the number of accounts or events. The
+    balance of each account is kept alongside, to tell when an account
+    becomes or stops being overdrawn.
+    """
+
+    env = {
+        # Must be able to read the events BankAccounts writes.
+        "TRANSCODER_TOPIC": "src.app.transcoders:OrjsonTranscoder",
+    }
+
+    follow_topics = [OPENED_TOPIC, TRANSACTION_APPENDED_TOPIC, CLOSED_TOPIC]
+
+    recorder: BankStatisticsRecorder
+
+    def construct_transcoder(self) -> Transcoder:
+        return construct_transcoder(self)
+
+    def construct_mapper(self) -> Mapper:
+        return construct_mapper(self)
+
+    def construct_recorder(self) -> BankStatisticsRecorder:
+        recorder: BankStatisticsRecorder
+
+        if isinstance(self.factory, postgres.Factory):
+            prefix = self.name.lower()
+            table_names = [f"{prefix}_events", f"{prefix}_tracking"]
+            if self.factory.datastore.schema:
+                schema = self.factory.datastore.schema
+                table_names = [f"{schema}.{name}" for name in table_names]
+            recorder = PostgresBankStatisticsRecorder(
+                self.factory.datastore, *table_names
+            )
+        elif isinstance(self.factory, sqlite.Factory):
+            recorder = SQLiteBankStatisticsRecorder(self.factory.datastore)
+        else:
+            return POPOBankStatisticsRecorder()
+
+        if self.factory.env_create_table():
+            recorder.create_table()
+        return recorder
+
+    def get_statistics(self) -> BankStatistics:
+        return self.recorder.select_statistics()
+
+    def rebuild(self, leader_name: str, batch_size: int = 1000) -> BankStatistics:
+        """Recomputes the statistics from the start of the leader's log.
+
+        Notifications are read ``batch_size`` at a time and folded in
+        memory, without constructing event objects. The result replaces
+        the recorded statistics and position in one transaction, so
+        processing continues from the end of what was read.
+        """
+        statistics, _ = self._rebuild(leader_name, batch_size)
+        return statistics
+
+    def fold_notifications(
+        self,
+        mapper: Mapper,
+        notifications: typing.Iterable[Notification],
+        fold: StatisticsFold | None = None,
+    ) -> StatisticsFold:
+        statistics, balances = (BankStatistics(), {}) if fold is None else fold
+
+        for notification in notifications:
+            account_id = notification.originator_id
+            if notification.topic == TRANSACTION_APPENDED_TOPIC:
+                amount = decode_event_state(mapper, notification)["amount"]
+                balance = balances[account_id]
+                statistics = statistics.with_transaction(balance, amount)
+                balances[account_id] = balance + amount
+            elif notification.topic == OPENED_TOPIC:
+                statistics = replace(
+                    statistics, account_count=statistics.account_count + 1
+                )
+                balances[account_id] = ZERO
+            elif notification.topic == CLOSED_TOPIC:
+                statistics = replace(
+                    statistics,
+                    closed_account_count=statistics.closed_account_count + 1,
+                )
+
+        return statistics, balances
+
+    def merge_folds(self, folds: typing.Sequence[StatisticsFold]) -> StatisticsFold:
+        statistics = BankStatistics()
+        balances: dict[UUID, Decimal] = {}
+        for fold_statistics, fold_balances in folds:
+            statistics += fold_statistics
+            balances.update(fold_balances)
+        return statistics, balances
+
+    def save_fold(
+        self, leader_name: str, fold: StatisticsFold, notification_id: int
+    ) -> None:
+        statistics, balances = fold
+        self.recorder.replace_statistics(
+            leader_name, statistics, balances, notification_id
+        )
+
+    @singledispatchmethod
+    def policy(
+        self,
+        domain_event: DomainEventProtocol,
+        processing_event: ProcessingEvent,
+    ) -> None:
+        """Default policy"""
+
+    @policy.register
+    def _(self, domain_event: Opened, processing_event: ProcessingEvent) -> None:
+        statistics = self.get_statistics()
+        processing_event.collect_events(
+            **{
+                STATISTICS_KWARG: replace(
+                    statistics, account_count=statistics.account_count + 1
+                ),
+                BALANCES_KWARG: {domain_event.originator_id: ZERO},
+            }
+        )
+
+    @policy.register
+    def _(
+        self, domain_event: TransactionAppended, processing_event: ProcessingEvent
+    ) -> None:
+        account_id = domain_event.originator_id
+        balance: Decimal = self.recorder.select_balances([account_id])[account_id]
+        processing_event.collect_events(
+            **{
+                STATISTICS_KWARG: self.get_statistics().with_transaction(
+                    balance, domain_event.amount
+                ),
+                BALANCES_KWARG: {account_id: balance + domain_event.amount},
+            }
+        )
+
+    @policy.register
+    def _(self, domain_event: Closed, processing_event: ProcessingEvent) -> None:
+        statistics = self.get_statistics()
+        processing_event.collect_events(
+            **{
+                STATISTICS_KWARG: replace(
+                    statistics,
+                    closed_account_count=statistics.closed_account_count + 1,
+                ),
+            }
+        )
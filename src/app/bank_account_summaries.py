@@ -0,0 +1,234 @@
+import typing
+
+from dataclasses import replace
+from decimal import Decimal
+from functools import singledispatchmethod
+from uuid import UUID
+
+from eventsourcing import postgres, sqlite
+from eventsourcing.application import ProcessingEvent
+from eventsourcing.domain import DomainEventProtocol
+from eventsourcing.persistence import Mapper, Notification, Transcoder
+from eventsourcing.utils import get_topic
+
+from src.app.catchup import RebuildableFollower
+from src.app.compression import construct_mapper
+from src.app.repository import decode_event_state
+from src.app.summary_recorders import (
+    SUMMARIES_KWARG,
+    BankAccountSummary,
+    BankAccountSummaryRecorder,
+    POPOBankAccountSummaryRecorder,
+    PostgresBankAccountSummaryRecorder,
+    SQLiteBankAccountSummaryRecorder,
+)
+from src.app.transcoders import construct_transcoder
+from src.domain.bank_account import BankAccount, Closed, Opened, TransactionAppended
+from src.domain.exceptions import AccountNotFoundError
+
+OPENED_TOPIC = get_topic(Opened)
+TRANSACTION_APPENDED_TOPIC = get_topic(TransactionAppended)
+OVERDRAFT_LIMIT_SET_TOPIC = get_topic(BankAccount.OverdraftLimitSet)
+CLOSED_TOPIC = get_topic(Closed)
+
+
+class BankAccountSummaries(RebuildableFollower):
+    """Projects bank account events into the bank_account_summary table.
+
+    Summaries are written in the same transaction as the position in the
+    followed notification log, so processing resumes where it stopped.
+    """
+
+    env = {
+        # Must be able to read the events BankAccounts writes.
+        "TRANSCODER_TOPIC": "src.app.transcoders:OrjsonTranscoder",
+    }
+
+    follow_topics = [
+        OPENED_TOPIC,
+        TRANSACTION_APPENDED_TOPIC,
+        OVERDRAFT_LIMIT_SET_TOPIC,
+        CLOSED_TOPIC,
+    ]
+
+    recorder: BankAccountSummaryRecorder
+
+    def construct_transcoder(self) -> Transcoder:
+        return construct_transcoder(self)
+
+    def construct_mapper(self) -> Mapper:
+        return construct_mapper(self)
+
+    def construct_recorder(self) -> BankAccountSummaryRecorder:
+        recorder: BankAccountSummaryRecorder
+
+        if isinstance(self.factory, postgres.Factory):
+            prefix = self.name.lower()
+            table_names = [f"{prefix}_events", f"{prefix}_tracking"]
+            if self.factory.datastore.schema:
+                schema = self.factory.datastore.schema
+                table_names = [f"{schema}.{name}" for name in table_names]
+            recorder = PostgresBankAccountSummaryRecorder(
+                self.factory.datastore, *table_names
+            )
+        elif isinstance(self.factory, sqlite.Factory):
+            recorder = SQLiteBankAccountSummaryRecorder(self.factory.datastore)
+        else:
+            return POPOBankAccountSummaryRecorder()
+
+        if self.factory.env_create_table():
+            recorder.create_table()
+        return recorder
+
+    def get_summary(self, account_id: UUID) -> BankAccountSummary:
+        summaries = self.recorder.select_summaries([account_id])
+        if not summaries:
+            raise AccountNotFoundError(account_id)
+        return summaries[0]
+
+    def get_summaries(
+        self, account_ids: typing.Iterable[UUID]
+    ) -> dict[UUID, BankAccountSummary]:
+        summaries = self.recorder.select_summaries(list(dict.fromkeys(account_ids)))
+        return {summary.id: summary for summary in summaries}
+
+    def get_summaries_by_email(self, email_address: str) -> list[BankAccountSummary]:
+        return self.recorder.select_summaries_by_email(email_address)
+
+    def search_summaries(
+        self, name_prefix: str, limit: int
+    ) -> list[BankAccountSummary]:
+        return self.recorder.search_summaries(name_prefix, limit)
+
+    def rebuild(self, leader_name: str, batch_size: int = 1000) -> int:
+        """Recomputes the summaries from the start of the leader's log.
+
+        Notifications are read ``batch_size`` at a time and folded in
+        memory, without constructing event objects. The result replaces
+        the recorded summaries and position in one transaction. Returns
+        the number of summaries.
+        """
+        return len(self._rebuild(leader_name, batch_size))
+
+    def fold_notifications(
+        self,
+        mapper: Mapper,
+        notifications: typing.Iterable[Notification],
+        fold: dict[UUID, BankAccountSummary] | None = None,
+    ) -> dict[UUID, BankAccountSummary]:
+        summaries = {} if fold is None else fold
+
+        for notification in notifications:
+            account_id = notification.originator_id
+            version = notification.originator_version
+            if notification.topic == OPENED_TOPIC:
+                state = decode_event_state(mapper, notification)
+                summaries[account_id] = BankAccountSummary(
+                    id=account_id,
+                    full_name=state["full_name"],
+                    email_address=state["email_address"],
+                    balance=Decimal("0.00"),
+                    overdraft_limit=Decimal("0.00"),
+                    is_closed=False,
+                    version=version,
+                )
+            elif notification.topic == TRANSACTION_APPENDED_TOPIC:
+                summary = summaries[account_id]
+                summaries[account_id] = replace(
+                    summary,
+                    balance=summary.balance
+                    + decode_event_state(mapper, notification)["amount"],
+                    version=version,
+                )
+            elif notification.topic == OVERDRAFT_LIMIT_SET_TOPIC:
+                summaries[account_id] = replace(
+                    summaries[account_id],
+                    overdraft_limit=decode_event_state(mapper, notification)[
+                        "overdraft_limit"
+                    ],
+                    version=version,
+                )
+            elif notification.topic == CLOSED_TOPIC:
+                summaries[account_id] = replace(
+                    summaries[account_id], is_closed=True, version=version
+                )
+
+        return summaries
+
+    def merge_folds(
+        self, folds: typing.Sequence[dict[UUID, BankAccountSummary]]
+    ) -> dict[UUID, BankAccountSummary]:
+        return {
+            account_id: summary
+            for fold in folds
+            for account_id, summary in fold.items()
+        }
+
+    def save_fold(
+        self,
+        leader_name: str,
+        fold: dict[UUID, BankAccountSummary],
+        notification_id: int,
+    ) -> None:
+        self.recorder.replace_summaries(leader_name, fold.values(), notification_id)
+
+    @singledispatchmethod
+    def policy(
+        self,
+        domain_event: DomainEventProtocol,
+        processing_event: ProcessingEvent,
+    ) -> None:
+        """Default policy"""
+
+    @policy.register
+    def _(self, domain_event: Opened, processing_event: ProcessingEvent) -> None:
+        summary = BankAccountSummary(
+            id=domain_event.originator_id,
+            full_name=domain_event.full_name,
+            email_address=domain_event.email_address,
+            balance=Decimal("0.00"),
+            overdraft_limit=Decimal("0.00"),
+            is_closed=False,
+            version=domain_event.originator_version,
+        )
+        self._collect_summary(summary, processing_event)
+
+    @policy.register
+    def _(
+        self, domain_event: TransactionAppended, processing_event: ProcessingEvent
+    ) -> None:
+        summary = self.get_summary(domain_event.originator_id)
+        summary = replace(
+            summary,
+            balance=summary.balance + domain_event.amount,
+            version=domain_event.originator_version,
+        )
+        self._collect_summary(summary, processing_event)
+
+    @policy.register
+    def _(
+        self,
+        domain_event: BankAccount.OverdraftLimitSet,
+        processing_event: ProcessingEvent,
+    ) -> None:
+        summary = replace(
+            self.get_summary(domain_event.originator_id),
+            overdraft_limit=domain_event.overdraft_limit,
+            version=domain_event.originator_version,
+        )
+        self._collect_summary(summary, processing_event)
+
+    @policy.register
+    def _(self, domain_event: Closed, processing_event: ProcessingEvent) -> None:
+        summary = replace(
+            self.get_summary(domain_event.originator_id),
+            is_closed=True,
+            version=domain_event.originator_version,
+        )
+        self._collect_summary(summary, processing_event)
+
+    @staticmethod
+    def _collect_summary(
+        summary: BankAccountSummary, processing_event: ProcessingEvent
+    ) -> None:
+        processing_event.collect_events(**{SUMMARIES_KWARG: [summary]})
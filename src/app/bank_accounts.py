@@ -1,12 +1,186 @@
+import logging
+import typing
+
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from itertools import chain
 from uuid import UUID
 from decimal import Decimal
-from eventsourcing.application import Application, AggregateNotFound
+from eventsourcing.application import (
+    AggregateNotFound,
+    Application,
+    LRUCache,
+    ProcessingEvent,
+    Repository,
+    project_aggregate,
+)
+from eventsourcing.persistence import (
+    IntegrityError,
+    Mapper,
+    Recording,
+    StoredEvent,
+    Transcoder,
+)
+from eventsourcing.postgres import PostgresAggregateRecorder
+from eventsourcing.utils import EnvType, get_topic
+
+from src.app.compression import CompressionStats, EventCompressor, construct_mapper
+from src.app.concurrency import (
+    ConflictStats,
+    RecordingConflict,
+    RetryPolicy,
+    retry_on_conflict,
+)
+from src.app.repository import (
+    CacheStats,
+    CountingCache,
+    CountingProjector,
+    decode_event_state,
+    select_events_after,
+    select_latest_events,
+)
+from src.app.telemetry import get_telemetry, traced
+from src.app.transcoders import construct_transcoder
+from src.domain.bank_account import BankAccount, TransactionAppended
+from src.domain.exceptions import AccountNotFoundError, TransactionError
+from src.domain.idempotency_key import IdempotencyKey
+
+
+logger = logging.getLogger(__name__)
+
+TRANSACTION_APPENDED_TOPIC = get_topic(TransactionAppended)
+
+TransactionStatus = typing.Literal["committed", "conflicted", "failed"]
+
 
-from src.domain.bank_account import BankAccount
-from src.domain.exceptions import AccountNotFoundError
+@dataclass(frozen=True)
+class TransactionOutcome:
+    """What became of one transaction passed to apply_transactions().
+
+    Only committed transactions were saved. Conflicted ones weren't, as
+    another writer saved one of the accounts of their chunk first, and can
+    be retried. Failed ones were rejected, or their chunk failed to save.
+    """
+
+    status: TransactionStatus
+    error: Exception | None = None
+
+    @property
+    def is_committed(self) -> bool:
+        return self.status == "committed"
+
+
+COMMITTED = TransactionOutcome("committed")
 
 
 class BankAccounts(Application):
+    BANK_ACCOUNT_SNAPSHOTTING_INTERVAL = "BANK_ACCOUNT_SNAPSHOTTING_INTERVAL"
+    COMMAND_MAX_ATTEMPTS = "COMMAND_MAX_ATTEMPTS"
+    COMMAND_RETRY_BASE_DELAY = "COMMAND_RETRY_BASE_DELAY"
+    COMMAND_RETRY_MAX_DELAY = "COMMAND_RETRY_MAX_DELAY"
+    IDEMPOTENCY_CACHE_MAXSIZE = "IDEMPOTENCY_CACHE_MAXSIZE"
+
+    env = {
+        # Cached aggregates are fast-forwarded from the event store on every
+        # read, so workers sharing one database don't serve stale state.
+        "AGGREGATE_CACHE_MAXSIZE": "1000",
+        "AGGREGATE_CACHE_FASTFORWARD": "y",
+        # Commands that hit a version conflict are retried with backoff.
+        "COMMAND_MAX_ATTEMPTS": "3",
+        "COMMAND_RETRY_BASE_DELAY": "0.01",
+        "COMMAND_RETRY_MAX_DELAY": "0.5",
+        # Compact event encoding, which can also read JSONTranscoder events.
+        "TRANSCODER_TOPIC": "src.app.transcoders:OrjsonTranscoder",
+        # Idempotency keys known to be used, which can be repeated without
+        # loading the account.
+        "IDEMPOTENCY_CACHE_MAXSIZE": "10000",
+    }
+
+    # Number of accounts saved per transaction by apply_transactions().
+    apply_transactions_chunk_size = 100
+
+    # Snapshot store can be switched off with IS_SNAPSHOTTING_ENABLED=n.
+    is_snapshotting_enabled = True
+    snapshotting_intervals = {BankAccount: 100}
+
+    def __init__(self, env: EnvType | None = None) -> None:
+        super().__init__(env)
+
+        interval = self.env.get(self.BANK_ACCOUNT_SNAPSHOTTING_INTERVAL)
+        if interval:
+            intervals = dict(type(self).snapshotting_intervals)
+            if int(interval) > 0:
+                intervals[BankAccount] = int(interval)
+            else:
+                del intervals[BankAccount]
+            self.snapshotting_intervals = intervals
+
+        self.retry_policy = RetryPolicy(
+            max_attempts=int(self.env.get(self.COMMAND_MAX_ATTEMPTS)),
+            base_delay=float(self.env.get(self.COMMAND_RETRY_BASE_DELAY)),
+            max_delay=float(self.env.get(self.COMMAND_RETRY_MAX_DELAY)),
+        )
+        self.conflict_stats = ConflictStats()
+
+        maxsize = self.env.get(self.IDEMPOTENCY_CACHE_MAXSIZE)
+        self.recent_idempotency_keys: LRUCache[UUID, bool] | None = (
+            LRUCache(maxsize=int(maxsize)) if maxsize and int(maxsize) > 0 else None
+        )
+
+    @property
+    def cache_stats(self) -> CacheStats | None:
+        cache = self.repository.cache
+        return cache.stats if isinstance(cache, CountingCache) else None
+
+    @property
+    def compression_stats(self) -> CompressionStats | None:
+        compressor = self.mapper.compressor
+        if isinstance(compressor, EventCompressor) and compressor.algorithm:
+            return compressor.stats
+        return None
+
+    def construct_transcoder(self) -> Transcoder:
+        return construct_transcoder(self)
+
+    def construct_mapper(self) -> Mapper:
+        return construct_mapper(self)
+
+    def construct_repository(self) -> Repository:
+        repository = super().construct_repository()
+        if repository.cache is not None:
+            repository.cache = CountingCache(repository.cache)
+        return repository
+
+    @traced
+    def save(self, *objs: typing.Any, **kwargs: typing.Any) -> list[Recording]:
+        recordings = super().save(*objs, **kwargs)
+
+        telemetry = get_telemetry()
+        if telemetry.enabled:
+            telemetry.observe("bank_accounts_events_written", len(recordings))
+            telemetry.observe(
+                "bank_accounts_bytes_written",
+                sum(len(recording.notification.state) for recording in recordings),
+            )
+
+        return recordings
+
+    def _record(self, processing_event: ProcessingEvent) -> list[Recording]:
+        try:
+            recordings = super()._record(processing_event)
+        except IntegrityError as e:
+            raise RecordingConflict(*e.args) from e
+
+        # Write saved accounts through to the cache.
+        if self.repository.cache is not None:
+            for aggregate_id, aggregate in processing_event.aggregates.items():
+                if isinstance(aggregate, BankAccount):
+                    self.repository.cache.put(aggregate_id, aggregate)
+
+        return recordings
+
+    @traced
     def open_account(self, full_name: str, email_address: str) -> UUID:
         account = BankAccount.open(
             full_name=full_name,
@@ -15,51 +189,360 @@ class BankAccounts(Application):
         self.save(account)
         return account.id
 
-    def get_account(self, account_id: UUID) -> BankAccount:
+    @traced
+    def get_account(self, account_id: UUID, version: int | None = None) -> BankAccount:
+        """The account's current state, or its state as of ``version``.
+
+        Historical versions are replayed from the nearest snapshot at or
+        before ``version``.
+        """
+        telemetry = get_telemetry()
         try:
-            aggregate = self.repository.get(account_id)
+            if telemetry.enabled:
+                projector = CountingProjector()
+                with telemetry.span("Repository.get"):
+                    aggregate = self.repository.get(
+                        account_id, version=version, projector_func=projector
+                    )
+                telemetry.observe("bank_accounts_events_replayed", projector.count)
+            else:
+                aggregate = self.repository.get(account_id, version=version)
         except AggregateNotFound:
             raise AccountNotFoundError(account_id)
         else:
             assert isinstance(aggregate, BankAccount)
             return aggregate
 
+    @traced
+    def get_account_at(self, account_id: UUID, at: datetime) -> BankAccount:
+        """The account's state as of ``at`` (naive datetimes are taken as UTC)"""
+        if at.tzinfo is None:
+            at = at.replace(tzinfo=timezone.utc)
+
+        latest = self.recorder.select_events(account_id, desc=True, limit=1)
+        if not latest:
+            raise AccountNotFoundError(account_id)
+
+        # Versions are contiguous from 1 and timestamps increase with them,
+        # so the last version recorded by ``at`` can be found by bisection.
+        low, high = 0, latest[0].originator_version
+        if self._get_event_timestamp(latest[0]) <= at:
+            return self.get_account(account_id)
+
+        high -= 1
+        while low < high:
+            middle = (low + high + 1) // 2
+            (stored_event,) = self.recorder.select_events(
+                account_id, gt=middle - 1, lte=middle
+            )
+            if self._get_event_timestamp(stored_event) <= at:
+                low = middle
+            else:
+                high = middle - 1
+
+        if low == 0:
+            # The account hadn't been opened yet.
+            raise AccountNotFoundError(account_id)
+
+        return self.get_account(account_id, version=low)
+
+    def _get_event_timestamp(self, stored_event: StoredEvent) -> datetime:
+        return self.mapper.to_domain_event(stored_event).timestamp
+
+    @traced
+    def get_accounts(
+        self, account_ids: typing.Iterable[UUID]
+    ) -> dict[UUID, BankAccount]:
+        """Get many accounts at once, leaving out any that don't exist"""
+        account_ids = list(dict.fromkeys(account_ids))
+
+        if not account_ids:
+            return {}
+
+        if not isinstance(self.recorder, PostgresAggregateRecorder):
+            # Local recorders have no round trips to save.
+            accounts = {}
+            for account_id in account_ids:
+                try:
+                    accounts[account_id] = self.get_account(account_id)
+                except AccountNotFoundError:
+                    pass
+            return accounts
+
+        # One query for the latest snapshots, one for the events after them.
+        snapshots = {}
+        if self.snapshots is not None:
+            assert isinstance(self.snapshots.recorder, PostgresAggregateRecorder)
+            for stored_snapshot in select_latest_events(
+                self.snapshots.recorder, account_ids
+            ):
+                snapshot = self.mapper.to_domain_event(stored_snapshot)
+                snapshots[snapshot.originator_id] = snapshot
+
+        positions = {
+            account_id: snapshots[account_id].originator_version
+            if account_id in snapshots
+            else 0
+            for account_id in account_ids
+        }
+        events = defaultdict(list)
+        for stored_event in select_events_after(self.recorder, positions):
+            events[stored_event.originator_id].append(
+                self.mapper.to_domain_event(stored_event)
+            )
+
+        accounts = {}
+        for account_id in account_ids:
+            initial = [snapshots[account_id]] if account_id in snapshots else []
+            aggregate = project_aggregate(
+                None, chain(initial, events.get(account_id, []))
+            )
+            if aggregate is not None:
+                assert isinstance(aggregate, BankAccount)
+                accounts[account_id] = aggregate
+
+        return accounts
+
+    @traced
+    def get_transactions(
+        self,
+        account_id: UUID,
+        limit: int,
+        gt: int | None = None,
+        lte: int | None = None,
+        desc: bool = False,
+    ) -> list[TransactionAppended]:
+        """Up to ``limit`` transactions with versions in (``gt``, ``lte``].
+
+        Events are read from the recorder a page at a time, so only the
+        requested range of the stream is ever loaded.
+        """
+        transactions: list[TransactionAppended] = []
+
+        while len(transactions) < limit:
+            page_size = limit - len(transactions)
+            stored_events = self.recorder.select_events(
+                account_id, gt=gt, lte=lte, desc=desc, limit=page_size
+            )
+            for stored_event in stored_events:
+                event = self.mapper.to_domain_event(stored_event)
+                if isinstance(event, TransactionAppended):
+                    transactions.append(event)
+
+            if len(stored_events) < page_size:
+                break
+
+            # Continue after the last version read, in the same direction.
+            last_version = stored_events[-1].originator_version
+            if desc:
+                lte = last_version - 1
+            else:
+                gt = last_version
+
+        return transactions
+
+    @traced
     def get_balance(self, account_id: UUID) -> Decimal:
+        if self.repository.cache is None:
+            return self.fold_balance(account_id)
+
         account = self.get_account(account_id)
         return account.balance
 
-    def deposit_funds(self, credit_account_id: UUID, amount: Decimal) -> None:
+    @traced
+    def fold_balance(self, account_id: UUID) -> Decimal:
+        """Sum the balance from the latest snapshot and the decoded events after it.
+
+        Unlike get_account(), no event objects or aggregate are constructed,
+        and events other than TransactionAppended aren't decoded at all.
+        """
+        balance = None
+        gt = None
+
+        if self.snapshots is not None:
+            snapshots = self.snapshots.recorder.select_events(
+                account_id, desc=True, limit=1
+            )
+            if snapshots:
+                state = decode_event_state(self.mapper, snapshots[0])
+                balance = state["state"]["balance"]
+                gt = snapshots[0].originator_version
+
+        stored_events = self.recorder.select_events(account_id, gt=gt)
+        if balance is None:
+            if not stored_events:
+                raise AccountNotFoundError(account_id)
+            balance = Decimal("0.00")
+
+        for stored_event in stored_events:
+            if stored_event.topic == TRANSACTION_APPENDED_TOPIC:
+                balance += decode_event_state(self.mapper, stored_event)["amount"]
+
+        return balance
+
+    @traced
+    def get_balance_at(self, account_id: UUID, at: datetime) -> Decimal:
+        account = self.get_account_at(account_id, at)
+        return account.balance
+
+    @traced
+    @retry_on_conflict("credit_account_id")
+    def deposit_funds(
+        self,
+        credit_account_id: UUID,
+        amount: Decimal,
+        idempotency_key: str | None = None,
+    ) -> None:
+        if self._is_recent_idempotency_key(idempotency_key):
+            return
+
         account = self.get_account(credit_account_id)
-        account.append_transaction(amount)
-        self.save(account)
+        account.append_transaction(amount, get_transaction_id(idempotency_key))
+        self._save_with_idempotency_key(idempotency_key, account)
+
+    @traced
+    @retry_on_conflict("debit_account_id")
+    def withdraw_funds(
+        self,
+        debit_account_id: UUID,
+        amount: Decimal,
+        idempotency_key: str | None = None,
+    ) -> None:
+        if self._is_recent_idempotency_key(idempotency_key):
+            return
 
-    def withdraw_funds(self, debit_account_id: UUID, amount: Decimal) -> None:
         account = self.get_account(debit_account_id)
-        account.append_transaction(-amount)
-        self.save(account)
+        account.append_transaction(-amount, get_transaction_id(idempotency_key))
+        self._save_with_idempotency_key(idempotency_key, account)
 
+    @traced
+    @retry_on_conflict("debit_account_id", "credit_account_id")
     def transfer_funds(
         self,
         debit_account_id: UUID,
         credit_account_id: UUID,
         amount: Decimal,
+        idempotency_key: str | None = None,
     ) -> None:
+        if self._is_recent_idempotency_key(idempotency_key):
+            return
+
+        transaction_id = get_transaction_id(idempotency_key)
         debit_account = self.get_account(debit_account_id)
         credit_account = self.get_account(credit_account_id)
-        debit_account.append_transaction(-amount)
-        credit_account.append_transaction(amount)
-        self.save(debit_account, credit_account)
+        debit_account.append_transaction(-amount, transaction_id)
+        credit_account.append_transaction(amount, transaction_id)
+        self._save_with_idempotency_key(idempotency_key, debit_account, credit_account)
+
+    def _is_recent_idempotency_key(self, idempotency_key: str | None) -> bool:
+        if idempotency_key is None or self.recent_idempotency_keys is None:
+            return False
+
+        try:
+            return self.recent_idempotency_keys.get(
+                IdempotencyKey.create_id(idempotency_key)
+            )
+        except KeyError:
+            return False
+
+    def _save_with_idempotency_key(
+        self, idempotency_key: str | None, *accounts: BankAccount
+    ) -> None:
+        """Save the accounts, unless a command with the key was applied already.
+
+        The key is saved in the same transaction as the accounts' events,
+        so of two commands with the same key only one can succeed.
+        """
+        if idempotency_key is None:
+            self.save(*accounts)
+            return
+
+        key = IdempotencyKey.use(idempotency_key)
+        try:
+            self.save(*accounts, key)
+        except RecordingConflict:
+            # Either a version conflict on an account, to be retried, or
+            # the key was used by an earlier command.
+            if not self.recorder.select_events(key.id, limit=1):
+                raise
+
+        if self.recent_idempotency_keys is not None:
+            self.recent_idempotency_keys.put(key.id, True)
+
+    @traced
+    def apply_transactions(
+        self, transactions: typing.Sequence[tuple[UUID, Decimal]]
+    ) -> list[TransactionOutcome]:
+        """Apply a batch of (account id, amount) transactions.
+
+        Negative amounts are withdrawals. Each account is loaded once and
+        saved with the other accounts in its chunk in one transaction, so
+        a batch can be partly applied. Returns the outcome of each
+        transaction in order.
+        """
+        outcomes = [COMMITTED] * len(transactions)
+        accounts = self.get_accounts(account_id for account_id, _ in transactions)
+        indexes_by_account = defaultdict(list)
+
+        for index, (account_id, amount) in enumerate(transactions):
+            try:
+                account = accounts[account_id]
+            except KeyError:
+                outcomes[index] = TransactionOutcome(
+                    "failed", AccountNotFoundError(account_id)
+                )
+                continue
+
+            try:
+                account.append_transaction(amount)
+            except TransactionError as e:
+                outcomes[index] = TransactionOutcome("failed", e)
+            else:
+                indexes_by_account[account_id].append(index)
 
+        changed = list(indexes_by_account)
+        size = self.apply_transactions_chunk_size
+
+        for chunk in (changed[i : i + size] for i in range(0, len(changed), size)):
+            try:
+                self.save(*(accounts[account_id] for account_id in chunk))
+            except RecordingConflict as e:
+                outcome = TransactionOutcome("conflicted", e)
+            except Exception as e:
+                # Later chunks are still saved, so don't raise.
+                logger.exception("Error saving %d bank accounts", len(chunk))
+                outcome = TransactionOutcome("failed", e)
+            else:
+                continue
+
+            for account_id in chunk:
+                for index in indexes_by_account[account_id]:
+                    outcomes[index] = outcome
+
+        return outcomes
+
+    @traced
+    @retry_on_conflict("account_id")
     def set_overdraft_limit(self, account_id: UUID, overdraft_limit: Decimal) -> None:
         account = self.get_account(account_id)
         account.set_overdraft_limit(overdraft_limit)
         self.save(account)
 
+    @traced
     def get_overdraft_limit(self, account_id: UUID) -> Decimal:
         account = self.get_account(account_id)
         return account.overdraft_limit
 
+    @traced
+    @retry_on_conflict("account_id")
     def close_account(self, account_id: UUID) -> None:
         account = self.get_account(account_id)
         account.close()
         self.save(account)
+
+
+def get_transaction_id(idempotency_key: str | None) -> UUID | None:
+    """Transactions applied with an idempotency key are identified by it"""
+    if idempotency_key is None:
+        return None
+    return IdempotencyKey.create_id(idempotency_key)
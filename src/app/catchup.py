@@ -0,0 +1,271 @@
+import multiprocessing
+import pickle
+import time
+import typing
+
+from abc import abstractmethod
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from dataclasses import dataclass
+from itertools import chain
+from queue import Empty, Queue
+
+from eventsourcing import popo, postgres, sqlite
+from eventsourcing.application import Application, LocalNotificationLog
+from eventsourcing.persistence import Mapper, Notification
+from eventsourcing.system import Follower
+from eventsourcing.utils import EnvType
+
+from src.app.catchup_recorders import (
+    CatchUpRecorder,
+    POPOCatchUpRecorder,
+    PostgresCatchUpRecorder,
+    SQLiteCatchUpRecorder,
+)
+from src.app.repository import select_notification_batches
+
+
+class RebuildableFollower(Follower):
+    """Follower whose state can be recomputed from its leader's log.
+
+    Notifications are folded into an intermediate value, which is saved
+    with the new position in one transaction. A fold can be continued with
+    later notifications, and folds of notifications partitioned by
+    originator must merge into the fold of them all, so that partitions can
+    be folded in parallel and checkpointed.
+    """
+
+    def __init__(self, env: EnvType | None = None) -> None:
+        super().__init__(env)
+        self.catchup_recorder = self.construct_catchup_recorder()
+
+    def construct_catchup_recorder(self) -> CatchUpRecorder:
+        recorder: CatchUpRecorder
+
+        if isinstance(self.factory, postgres.Factory):
+            table_name = f"{self.name.lower()}_catchup"
+            if self.factory.datastore.schema:
+                table_name = f"{self.factory.datastore.schema}.{table_name}"
+            recorder = PostgresCatchUpRecorder(self.factory.datastore, table_name)
+        elif isinstance(self.factory, sqlite.Factory):
+            recorder = SQLiteCatchUpRecorder(self.factory.datastore)
+        else:
+            return POPOCatchUpRecorder()
+
+        if self.factory.env_create_table():
+            recorder.create_table()
+        return recorder
+
+    def pull_and_process(
+        self, leader_name: str, start: int | None = None, stop: int | None = None
+    ) -> None:
+        # Saving a rebuilt state resets the position, so it waits for this.
+        with self.catchup_recorder.processing(self.name):
+            super().pull_and_process(leader_name, start, stop)
+
+    @abstractmethod
+    def fold_notifications(
+        self,
+        mapper: Mapper,
+        notifications: typing.Iterable[Notification],
+        fold: typing.Any = None,
+    ) -> typing.Any:
+        """Folds the notifications into ``fold``, which may be updated in
+        place, or from the start when it's None."""
+
+    @abstractmethod
+    def merge_folds(self, folds: typing.Sequence[typing.Any]) -> typing.Any:
+        pass
+
+    @abstractmethod
+    def save_fold(
+        self, leader_name: str, fold: typing.Any, notification_id: int
+    ) -> None:
+        """Replaces the state projected from the leader with the fold."""
+
+    def _rebuild(self, leader_name: str, batch_size: int) -> typing.Any:
+        log = self.readers[leader_name].notification_log
+        assert isinstance(log, LocalNotificationLog)
+        stop = log.recorder.max_notification_id()
+
+        batches = select_notification_batches(
+            log, batch_size, self.follow_topics, stop=stop
+        )
+        fold = self.fold_notifications(
+            self.mappers[leader_name], chain.from_iterable(batches)
+        )
+        with self.catchup_recorder.rebuilding(self.name), self.processing_lock:
+            self.save_fold(leader_name, fold, stop)
+
+        return fold
+
+
+@dataclass(frozen=True)
+class CatchUpProgress:
+    partition: int
+    # Notification id read up to, of ``stop``.
+    position: int
+    stop: int
+    # Events of the partition folded so far.
+    events: int
+
+
+def catch_up_in_parallel(
+    follower_class: type[RebuildableFollower],
+    leader_class: type[Application],
+    num_partitions: int,
+    env: EnvType | None = None,
+    batch_size: int = 10_000,
+    on_progress: typing.Callable[[CatchUpProgress], None] | None = None,
+    checkpoint_interval: float = 5.0,
+) -> int:
+    """Rebuilds a follower from its leader's log in a pool of processes.
+
+    Each process reads only the notifications of the accounts in its
+    partition of originator ids, up to the log's current end, in batches,
+    and folds their events. The fold and position of each partition are
+    recorded at most every ``checkpoint_interval`` seconds, and when it's
+    done, so a catch-up that fails resumes from them when it's run again
+    with the same number of partitions.
+
+    The folds are merged and saved with the end position in one
+    transaction, while the follower's processing in other threads and
+    processes waits, so the follower's state is never partly rebuilt.
+    Returns the position.
+    """
+    leader = leader_class(env)
+    follower = follower_class(env)
+
+    try:
+        if isinstance(follower.factory, popo.Factory):
+            raise ValueError("Parallel catch-up needs a database shared by processes")
+
+        follower.follow(leader.name, leader.notification_log)
+        recorder = follower.catchup_recorder
+        partitions = recorder.select_partitions(follower.name)
+        if not partitions or partitions[0].num_partitions != num_partitions:
+            partitions = recorder.insert_partitions(
+                follower.name, num_partitions, leader.recorder.max_notification_id()
+            )
+        stop = partitions[0].stop
+
+        pending = []
+        for partition in partitions:
+            if on_progress is not None:
+                on_progress(
+                    CatchUpProgress(
+                        partition.partition,
+                        partition.notification_id,
+                        stop,
+                        partition.events,
+                    )
+                )
+            if partition.fold is None or partition.notification_id < stop:
+                pending.append(partition.partition)
+
+        if pending:
+            context = multiprocessing.get_context("spawn")
+            with context.Manager() as manager, ProcessPoolExecutor(
+                len(pending), mp_context=context
+            ) as executor:
+                progress = manager.Queue()
+                futures = {
+                    executor.submit(
+                        _fold_partition,
+                        follower_class,
+                        leader_class,
+                        env,
+                        partition,
+                        stop,
+                        batch_size,
+                        checkpoint_interval,
+                        progress,
+                    )
+                    for partition in pending
+                }
+
+                while futures:
+                    _, futures = wait(futures, timeout=0.5, return_when=FIRST_COMPLETED)
+                    _report_progress(progress, on_progress)
+                _report_progress(progress, on_progress)
+
+            partitions = recorder.select_partitions(follower.name)
+
+        folds = [pickle.loads(partition.fold) for partition in partitions]
+        with recorder.rebuilding(follower.name), follower.processing_lock:
+            follower.save_fold(leader.name, follower.merge_folds(folds), stop)
+        recorder.delete_partitions(follower.name)
+
+        return stop
+    finally:
+        follower.close()
+        leader.close()
+
+
+def _report_progress(
+    progress: "Queue[CatchUpProgress]",
+    on_progress: typing.Callable[[CatchUpProgress], None] | None,
+) -> None:
+    while True:
+        try:
+            item = progress.get_nowait()
+        except Empty:
+            return
+        if on_progress is not None:
+            on_progress(item)
+
+
+def _fold_partition(
+    follower_class: type[RebuildableFollower],
+    leader_class: type[Application],
+    env: EnvType | None,
+    partition: int,
+    stop: int,
+    batch_size: int,
+    checkpoint_interval: float,
+    progress: "Queue[CatchUpProgress]",
+) -> None:
+    leader = leader_class(env)
+    follower = follower_class(env)
+    follower.follow(leader.name, leader.notification_log)
+    mapper = follower.mappers[leader.name]
+    recorder = follower.catchup_recorder
+
+    try:
+        state = recorder.select_partitions(follower.name)[partition]
+        fold = None if state.fold is None else pickle.loads(state.fold)
+        notification_id = state.notification_id
+        events = state.events
+        checkpointed = time.monotonic()
+
+        for notifications in select_notification_batches(
+            leader.notification_log,
+            batch_size,
+            follower.follow_topics,
+            stop=stop,
+            partition=partition,
+            num_partitions=state.num_partitions,
+            start=notification_id + 1,
+        ):
+            fold = follower.fold_notifications(mapper, notifications, fold)
+            notification_id = notifications[-1].id
+            events += len(notifications)
+            if time.monotonic() - checkpointed >= checkpoint_interval:
+                recorder.update_partition(
+                    follower.name,
+                    partition,
+                    notification_id,
+                    events,
+                    pickle.dumps(fold),
+                )
+                checkpointed = time.monotonic()
+            progress.put(CatchUpProgress(partition, notification_id, stop, events))
+
+        if fold is None:
+            fold = follower.fold_notifications(mapper, ())
+        recorder.update_partition(
+            follower.name, partition, stop, events, pickle.dumps(fold)
+        )
+        progress.put(CatchUpProgress(partition, stop, stop, events))
+    finally:
+        follower.close()
+        leader.close()
@@ -0,0 +1,366 @@
+import fcntl
+import typing
+
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from dataclasses import dataclass
+from threading import Condition
+
+from eventsourcing.postgres import PostgresDatastore
+from eventsourcing.sqlite import SQLiteDatastore
+
+
+@dataclass(frozen=True)
+class CatchUpPartition:
+    partition: int
+    num_partitions: int
+    # Notification id the catch-up reads up to.
+    stop: int
+    # Notification id the partition is folded up to, and its events so far.
+    notification_id: int
+    events: int
+    # The pickled fold, None before the partition's first checkpoint.
+    fold: bytes | None
+
+
+class CatchUpRecorder(ABC):
+    """Records the progress of each partition of a projection's catch-up,
+    so that a catch-up that fails can resume.
+
+    Also keeps the projection's followers from processing while a rebuilt
+    state replaces theirs, across processes. Followers process within
+    processing(), and a rebuilt state is saved within rebuilding().
+    """
+
+    @abstractmethod
+    def create_table(self) -> None:
+        pass
+
+    @abstractmethod
+    def select_partitions(self, application_name: str) -> list[CatchUpPartition]:
+        """The partitions of the application's catch-up, in order, if any"""
+
+    @abstractmethod
+    def insert_partitions(
+        self, application_name: str, num_partitions: int, stop: int
+    ) -> list[CatchUpPartition]:
+        """Starts a catch-up up to ``stop``, replacing any recorded before."""
+
+    @abstractmethod
+    def update_partition(
+        self,
+        application_name: str,
+        partition: int,
+        notification_id: int,
+        events: int,
+        fold: bytes,
+    ) -> None:
+        pass
+
+    @abstractmethod
+    def delete_partitions(self, application_name: str) -> None:
+        pass
+
+    @abstractmethod
+    def processing(self, application_name: str) -> typing.ContextManager[None]:
+        """Shared with the application's other followers, excluding
+        rebuilding()."""
+
+    @abstractmethod
+    def rebuilding(self, application_name: str) -> typing.ContextManager[None]:
+        """Waits for the application's followers to finish processing, and
+        keeps them from starting again until it exits."""
+
+
+class SharedLock:
+    """A readers-writer lock for the threads of one process."""
+
+    def __init__(self) -> None:
+        self._condition = Condition()
+        self._shared = 0
+        self._is_exclusive = False
+
+    @contextmanager
+    def shared(self) -> typing.Iterator[None]:
+        with self._condition:
+            self._condition.wait_for(lambda: not self._is_exclusive)
+            self._shared += 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._shared -= 1
+                self._condition.notify_all()
+
+    @contextmanager
+    def exclusive(self) -> typing.Iterator[None]:
+        with self._condition:
+            self._condition.wait_for(
+                lambda: not self._is_exclusive and not self._shared
+            )
+            self._is_exclusive = True
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._is_exclusive = False
+                self._condition.notify_all()
+
+
+class POPOCatchUpRecorder(CatchUpRecorder):
+    def __init__(self) -> None:
+        self._partitions: dict[str, list[CatchUpPartition]] = {}
+        self._locks: dict[str, SharedLock] = {}
+
+    def create_table(self) -> None:
+        pass
+
+    def select_partitions(self, application_name: str) -> list[CatchUpPartition]:
+        return list(self._partitions.get(application_name, ()))
+
+    def insert_partitions(
+        self, application_name: str, num_partitions: int, stop: int
+    ) -> list[CatchUpPartition]:
+        partitions = [
+            CatchUpPartition(partition, num_partitions, stop, 0, 0, None)
+            for partition in range(num_partitions)
+        ]
+        self._partitions[application_name] = partitions
+        return list(partitions)
+
+    def update_partition(
+        self,
+        application_name: str,
+        partition: int,
+        notification_id: int,
+        events: int,
+        fold: bytes,
+    ) -> None:
+        partitions = self._partitions[application_name]
+        partitions[partition] = CatchUpPartition(
+            partition,
+            partitions[partition].num_partitions,
+            partitions[partition].stop,
+            notification_id,
+            events,
+            fold,
+        )
+
+    def delete_partitions(self, application_name: str) -> None:
+        self._partitions.pop(application_name, None)
+
+    def processing(self, application_name: str) -> typing.ContextManager[None]:
+        return self._get_lock(application_name).shared()
+
+    def rebuilding(self, application_name: str) -> typing.ContextManager[None]:
+        return self._get_lock(application_name).exclusive()
+
+    def _get_lock(self, application_name: str) -> SharedLock:
+        return self._locks.setdefault(application_name, SharedLock())
+
+
+class SQLiteCatchUpRecorder(CatchUpRecorder):
+    """Records catch-ups in a table shared by the applications, like
+    tracking. A database file is locked by its followers and rebuilds with
+    a lock file beside it, and an in-memory database within the process.
+    """
+
+    def __init__(
+        self, datastore: SQLiteDatastore, catchup_table_name: str = "catchup"
+    ) -> None:
+        self.datastore = datastore
+        self.catchup_table_name = catchup_table_name
+        self._memory_locks: dict[str, SharedLock] = {}
+
+    def create_table(self) -> None:
+        with self.datastore.transaction(commit=True) as c:
+            c.execute(
+                "CREATE TABLE IF NOT EXISTS "
+                f"{self.catchup_table_name} ("
+                "application_name TEXT, "
+                "partition INTEGER, "
+                "num_partitions INTEGER NOT NULL, "
+                "stop INTEGER NOT NULL, "
+                "notification_id INTEGER NOT NULL, "
+                "events INTEGER NOT NULL, "
+                "fold BLOB, "
+                "PRIMARY KEY (application_name, partition)) "
+                "WITHOUT ROWID"
+            )
+
+    def select_partitions(self, application_name: str) -> list[CatchUpPartition]:
+        with self.datastore.transaction(commit=False) as c:
+            c.execute(
+                f"SELECT * FROM {self.catchup_table_name} "
+                "WHERE application_name = ? ORDER BY partition",
+                (application_name,),
+            )
+            return [_to_partition(row) for row in c.fetchall()]
+
+    def insert_partitions(
+        self, application_name: str, num_partitions: int, stop: int
+    ) -> list[CatchUpPartition]:
+        with self.datastore.transaction(commit=True) as c:
+            c.execute(
+                f"DELETE FROM {self.catchup_table_name} WHERE application_name = ?",
+                (application_name,),
+            )
+            for partition in range(num_partitions):
+                c.execute(
+                    f"INSERT INTO {self.catchup_table_name} "
+                    "VALUES (?, ?, ?, ?, 0, 0, NULL)",
+                    (application_name, partition, num_partitions, stop),
+                )
+        return self.select_partitions(application_name)
+
+    def update_partition(
+        self,
+        application_name: str,
+        partition: int,
+        notification_id: int,
+        events: int,
+        fold: bytes,
+    ) -> None:
+        with self.datastore.transaction(commit=True) as c:
+            c.execute(
+                f"UPDATE {self.catchup_table_name} "
+                "SET notification_id = ?, events = ?, fold = ? "
+                "WHERE application_name = ? AND partition = ?",
+                (notification_id, events, fold, application_name, partition),
+            )
+
+    def delete_partitions(self, application_name: str) -> None:
+        with self.datastore.transaction(commit=True) as c:
+            c.execute(
+                f"DELETE FROM {self.catchup_table_name} WHERE application_name = ?",
+                (application_name,),
+            )
+
+    def processing(self, application_name: str) -> typing.ContextManager[None]:
+        if self.datastore.pool.is_sqlite_memory_mode:
+            return self._get_memory_lock(application_name).shared()
+        return self._lock_file(application_name, fcntl.LOCK_SH)
+
+    def rebuilding(self, application_name: str) -> typing.ContextManager[None]:
+        if self.datastore.pool.is_sqlite_memory_mode:
+            return self._get_memory_lock(application_name).exclusive()
+        return self._lock_file(application_name, fcntl.LOCK_EX)
+
+    def _get_memory_lock(self, application_name: str) -> SharedLock:
+        return self._memory_locks.setdefault(application_name, SharedLock())
+
+    @contextmanager
+    def _lock_file(
+        self, application_name: str, operation: int
+    ) -> typing.Iterator[None]:
+        # Released by the system if the process exits while holding it.
+        path = f"{self.datastore.pool.db_name}.{application_name.lower()}.lock"
+        with open(path, "a") as file:
+            fcntl.flock(file, operation)
+            try:
+                yield
+            finally:
+                fcntl.flock(file, fcntl.LOCK_UN)
+
+
+class PostgresCatchUpRecorder(CatchUpRecorder):
+    """Records catch-ups in a table of the application's own, and locks
+    its followers and rebuilds with a session advisory lock, which
+    PostgreSQL releases if the connection is lost.
+    """
+
+    def __init__(self, datastore: PostgresDatastore, catchup_table_name: str):
+        self.datastore = datastore
+        self.catchup_table_name = catchup_table_name
+
+    def create_table(self) -> None:
+        with self.datastore.transaction(commit=True) as c:
+            c.execute(
+                "CREATE TABLE IF NOT EXISTS "
+                f"{self.catchup_table_name} ("
+                "application_name text, "
+                "partition integer, "
+                "num_partitions integer NOT NULL, "
+                "stop bigint NOT NULL, "
+                "notification_id bigint NOT NULL, "
+                "events bigint NOT NULL, "
+                "fold bytea, "
+                "PRIMARY KEY (application_name, partition))"
+            )
+
+    def select_partitions(self, application_name: str) -> list[CatchUpPartition]:
+        with self.datastore.transaction(commit=False) as c:
+            c.execute(
+                f"SELECT * FROM {self.catchup_table_name} "
+                "WHERE application_name = %s ORDER BY partition",
+                (application_name,),
+            )
+            return [_to_partition(row) for row in c.fetchall()]
+
+    def insert_partitions(
+        self, application_name: str, num_partitions: int, stop: int
+    ) -> list[CatchUpPartition]:
+        with self.datastore.transaction(commit=True) as c:
+            c.execute(
+                f"DELETE FROM {self.catchup_table_name} WHERE application_name = %s",
+                (application_name,),
+            )
+            c.execute(
+                f"INSERT INTO {self.catchup_table_name} "
+                "SELECT %s, partition, %s, %s, 0, 0, NULL "
+                "FROM generate_series(0, %s - 1) AS partition",
+                (application_name, num_partitions, stop, num_partitions),
+            )
+        return self.select_partitions(application_name)
+
+    def update_partition(
+        self,
+        application_name: str,
+        partition: int,
+        notification_id: int,
+        events: int,
+        fold: bytes,
+    ) -> None:
+        with self.datastore.transaction(commit=True) as c:
+            c.execute(
+                f"UPDATE {self.catchup_table_name} "
+                "SET notification_id = %s, events = %s, fold = %s "
+                "WHERE application_name = %s AND partition = %s",
+                (notification_id, events, fold, application_name, partition),
+            )
+
+    def delete_partitions(self, application_name: str) -> None:
+        with self.datastore.transaction(commit=True) as c:
+            c.execute(
+                f"DELETE FROM {self.catchup_table_name} WHERE application_name = %s",
+                (application_name,),
+            )
+
+    def processing(self, application_name: str) -> typing.ContextManager[None]:
+        return self._advisory_lock(application_name, "_shared")
+
+    def rebuilding(self, application_name: str) -> typing.ContextManager[None]:
+        return self._advisory_lock(application_name, "")
+
+    @contextmanager
+    def _advisory_lock(self, application_name: str, mode: str) -> typing.Iterator[None]:
+        key = f"{self.catchup_table_name}:{application_name}"
+        with self.datastore.get_connection() as conn:
+            with conn.transaction(commit=True) as c:
+                c.execute(f"SELECT pg_advisory_lock{mode}(hashtext(%s))", (key,))
+            try:
+                yield
+            finally:
+                with conn.transaction(commit=True) as c:
+                    c.execute(f"SELECT pg_advisory_unlock{mode}(hashtext(%s))", (key,))
+
+
+def _to_partition(row: typing.Mapping[str, typing.Any]) -> CatchUpPartition:
+    return CatchUpPartition(
+        partition=row["partition"],
+        num_partitions=row["num_partitions"],
+        stop=row["stop"],
+        notification_id=row["notification_id"],
+        events=row["events"],
+        fold=None if row["fold"] is None else bytes(row["fold"]),
+    )
@@ -0,0 +1,196 @@
+import threading
+import typing
+import zlib
+
+from dataclasses import dataclass
+
+from eventsourcing.application import Application
+from eventsourcing.persistence import Cipher, Compressor, Mapper, Transcoder
+
+COMPRESSION_ALGORITHM = "COMPRESSION_ALGORITHM"
+COMPRESSION_LEVEL = "COMPRESSION_LEVEL"
+COMPRESSION_MIN_SIZE = "COMPRESSION_MIN_SIZE"
+
+DEFAULT_MIN_SIZE = 64
+
+# Preset dictionary of the field names and values repeated in every event and
+# snapshot, which is what makes events of ~100 bytes worth compressing.
+# Stored events can't be decompressed without it, so it must never change.
+COMPRESSION_DICTIONARY = (
+    b'{"timestamp":{"$t":"2024-01-01T00:00:00.000000+00:00"},'
+    b'"topic":"src.domain.bank_account:BankAccount","state":{'
+    b'"_created_on":{"$t":"","_modified_on":{"$t":"","full_name":"",'
+    b'"email_address":"","balance":{"$d":"","overdraft_limit":{"$d":"",'
+    b'"is_closed":false}},"originator_topic":"src.domain.bank_account:'
+    b'BankAccount","amount":{"$d":"","transaction_id":null}'
+)
+
+_ZLIB_HEADER = b"\x78"
+_ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+
+@dataclass(frozen=True)
+class CompressionStats:
+    compressed: int
+    skipped: int
+    bytes_in: int
+    bytes_out: int
+
+    @property
+    def bytes_saved(self) -> int:
+        return self.bytes_in - self.bytes_out
+
+
+class EventCompressor(Compressor):
+    """Compresses stored state of at least ``min_size`` bytes.
+
+    State is kept as it is when it's smaller than ``min_size`` or doesn't
+    get smaller. zlib and zstd output are told apart from uncompressed JSON
+    by their first bytes, so state written with any algorithm, or none,
+    can be decompressed.
+    """
+
+    def __init__(
+        self,
+        algorithm: str | None = None,
+        min_size: int = DEFAULT_MIN_SIZE,
+        level: int | None = None,
+    ) -> None:
+        if algorithm not in (None, "zlib", "zstd"):
+            raise ValueError(f"Unknown compression algorithm: {algorithm}")
+
+        self.algorithm = algorithm
+        self.min_size = min_size
+        self.level = level
+        self._zstd = threading.local()
+        self._lock = threading.Lock()
+        self._compressed = 0
+        self._skipped = 0
+        self._bytes_in = 0
+        self._bytes_out = 0
+
+        if algorithm == "zstd":
+            # Fails now rather than on the first save.
+            self._get_zstd_compressor()
+
+    @property
+    def stats(self) -> CompressionStats:
+        return CompressionStats(
+            compressed=self._compressed,
+            skipped=self._skipped,
+            bytes_in=self._bytes_in,
+            bytes_out=self._bytes_out,
+        )
+
+    def compress(self, data: bytes) -> bytes:
+        if self.algorithm is None:
+            return data
+
+        compressed = data
+
+        if self.algorithm == "zlib" and len(data) >= self.min_size:
+            compressor = zlib.compressobj(
+                -1 if self.level is None else self.level,
+                zdict=COMPRESSION_DICTIONARY,
+            )
+            compressed = compressor.compress(data) + compressor.flush()
+        elif self.algorithm == "zstd" and len(data) >= self.min_size:
+            compressed = self._get_zstd_compressor().compress(data)
+
+        if len(compressed) >= len(data):
+            compressed = data
+
+        with self._lock:
+            if compressed is data:
+                self._skipped += 1
+            else:
+                self._compressed += 1
+            self._bytes_in += len(data)
+            self._bytes_out += len(compressed)
+
+        return compressed
+
+    def decompress(self, data: bytes) -> bytes:
+        if data.startswith(_ZLIB_HEADER):
+            decompressor = zlib.decompressobj(zdict=COMPRESSION_DICTIONARY)
+            return decompressor.decompress(data) + decompressor.flush()
+        if data.startswith(_ZSTD_MAGIC):
+            return self._get_zstd_decompressor().decompress(data)
+        return data
+
+    # zstandard compressors can't be shared between threads.
+    def _get_zstd_compressor(self) -> typing.Any:
+        try:
+            return self._zstd.compressor
+        except AttributeError:
+            zstandard = _import_zstandard()
+            self._zstd.compressor = zstandard.ZstdCompressor(
+                level=3 if self.level is None else self.level,
+                dict_data=_get_zstd_dictionary(zstandard),
+                write_dict_id=False,
+            )
+            return self._zstd.compressor
+
+    def _get_zstd_decompressor(self) -> typing.Any:
+        try:
+            return self._zstd.decompressor
+        except AttributeError:
+            zstandard = _import_zstandard()
+            self._zstd.decompressor = zstandard.ZstdDecompressor(
+                dict_data=_get_zstd_dictionary(zstandard)
+            )
+            return self._zstd.decompressor
+
+
+def _import_zstandard() -> typing.Any:
+    try:
+        import zstandard
+    except ImportError:
+        raise ImportError(
+            "zstd compression needs the zstandard package: pip install zstandard"
+        ) from None
+    return zstandard
+
+
+def _get_zstd_dictionary(zstandard: typing.Any) -> typing.Any:
+    return zstandard.ZstdCompressionDict(
+        COMPRESSION_DICTIONARY, dict_type=zstandard.DICT_TYPE_RAWCONTENT
+    )
+
+
+class EventMapper(Mapper):
+    """Mapper that can decompress EventCompressor output.
+
+    Followers construct the mappers for reading their leaders' events with
+    no compression settings, so they fall back to a compressor that only
+    decompresses.
+    """
+
+    def __init__(
+        self,
+        transcoder: Transcoder,
+        compressor: Compressor | None = None,
+        cipher: Cipher | None = None,
+    ) -> None:
+        super().__init__(
+            transcoder, compressor=compressor or EventCompressor(), cipher=cipher
+        )
+
+
+def construct_mapper(application: Application) -> Mapper:
+    """Mapper compressing with the application's COMPRESSION_* settings"""
+    env = application.env
+    mapper = application.factory.mapper(
+        application.construct_transcoder(), mapper_class=EventMapper
+    )
+
+    algorithm = env.get(COMPRESSION_ALGORITHM)
+    if algorithm:
+        level = env.get(COMPRESSION_LEVEL)
+        mapper.compressor = EventCompressor(
+            algorithm,
+            min_size=int(env.get(COMPRESSION_MIN_SIZE) or DEFAULT_MIN_SIZE),
+            level=int(level) if level else None,
+        )
+
+    return mapper
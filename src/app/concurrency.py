@@ -0,0 +1,103 @@
+import functools
+import inspect
+import random
+import time
+import typing
+
+from collections import Counter
+from dataclasses import dataclass
+from threading import Lock
+from uuid import UUID
+
+from eventsourcing.persistence import IntegrityError
+
+T = typing.TypeVar("T")
+
+
+class RecordingConflict(IntegrityError):
+    """Recording a command's events conflicted with events already
+    recorded, such as another command's for the same account version.
+    None of the command's events were recorded.
+    """
+
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    max_attempts: int
+    base_delay: float
+    max_delay: float
+
+    def get_delay(self, attempt: int) -> float:
+        """Exponential backoff with full jitter"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2**attempt))
+
+
+class ConflictStats:
+    """Counts command attempts and version conflicts per account."""
+
+    def __init__(self) -> None:
+        self._lock = Lock()
+        self.attempts = 0
+        self.conflicts = 0
+        self.conflicts_by_account: Counter[UUID] = Counter()
+
+    @property
+    def conflict_rate(self) -> float:
+        return self.conflicts / self.attempts if self.attempts else 0.0
+
+    def record_attempt(self) -> None:
+        with self._lock:
+            self.attempts += 1
+
+    def record_conflict(self, account_ids: typing.Iterable[UUID]) -> None:
+        with self._lock:
+            self.conflicts += 1
+            self.conflicts_by_account.update(account_ids)
+
+    def hot_accounts(self, n: int = 10) -> list[tuple[UUID, int]]:
+        with self._lock:
+            return self.conflicts_by_account.most_common(n)
+
+
+class RetriesConflicts(typing.Protocol):
+    retry_policy: RetryPolicy
+    conflict_stats: ConflictStats
+
+
+def retry_on_conflict(
+    *account_id_args: str,
+) -> typing.Callable[[typing.Callable[..., T]], typing.Callable[..., T]]:
+    """Retry an application command when saving hits a version conflict.
+
+    The command is run again from the start, so the accounts named by
+    ``account_id_args`` are reloaded and the command reapplied. Only a
+    RecordingConflict is retried, as other errors may come after the
+    command's events were recorded.
+    """
+
+    def decorator(method: typing.Callable[..., T]) -> typing.Callable[..., T]:
+        signature = inspect.signature(method)
+
+        @functools.wraps(method)
+        def wrapper(
+            self: RetriesConflicts, *args: typing.Any, **kwargs: typing.Any
+        ) -> T:
+            arguments = signature.bind(self, *args, **kwargs).arguments
+            account_ids = [arguments[name] for name in account_id_args]
+            policy = self.retry_policy
+
+            for attempt in range(policy.max_attempts):
+                self.conflict_stats.record_attempt()
+                try:
+                    return method(self, *args, **kwargs)
+                except RecordingConflict:
+                    self.conflict_stats.record_conflict(account_ids)
+                    if attempt + 1 >= policy.max_attempts:
+                        raise
+                    time.sleep(policy.get_delay(attempt))
+
+            raise AssertionError("max_attempts must be at least 1")
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,104 @@
+import logging
+
+from eventsourcing.system import System
+
+from src.app.async_bank_accounts import AsyncBankAccounts
+from src.app.bank_account_statistics import BankAccountStatistics
+from src.app.bank_account_summaries import BankAccountSummaries
+from src.app.bank_accounts import BankAccounts
+from src.app.runner import BackgroundRunner
+
+logger = logging.getLogger(__name__)
+
+
+class ContainerNotStartedError(Exception):
+    pass
+
+
+system = System(
+    pipes=[
+        [BankAccounts, BankAccountSummaries],
+        [BankAccounts, BankAccountStatistics],
+    ]
+)
+
+
+class Container:
+    """Holds the process-wide application instances.
+
+    Constructing an eventsourcing application sets up its datastore,
+    connection pool and transcoder, so this happens once on startup
+    rather than once per request. The projections are processed in
+    background threads, so they catch up shortly after commands return.
+    """
+
+    def __init__(self) -> None:
+        self._runner: BackgroundRunner | None = None
+        self._async_bank_accounts: AsyncBankAccounts | None = None
+
+    @property
+    def is_started(self) -> bool:
+        return self._runner is not None
+
+    @property
+    def bank_accounts(self) -> BankAccounts:
+        if self._runner is None:
+            raise ContainerNotStartedError()
+
+        return self._runner.get(BankAccounts)
+
+    @property
+    def bank_account_summaries(self) -> BankAccountSummaries:
+        if self._runner is None:
+            raise ContainerNotStartedError()
+
+        return self._runner.get(BankAccountSummaries)
+
+    @property
+    def bank_account_statistics(self) -> BankAccountStatistics:
+        if self._runner is None:
+            raise ContainerNotStartedError()
+
+        return self._runner.get(BankAccountStatistics)
+
+    @property
+    def async_bank_accounts(self) -> AsyncBankAccounts:
+        if self._async_bank_accounts is None:
+            raise ContainerNotStartedError()
+
+        return self._async_bank_accounts
+
+    def start(self) -> None:
+        if self.is_started:
+            return
+
+        logger.info("Starting application container")
+        self._runner = BackgroundRunner(system)
+        self._runner.start()
+
+        self._async_bank_accounts = AsyncBankAccounts(
+            self.bank_accounts,
+            self.bank_account_summaries,
+            self.bank_account_statistics,
+        )
+
+    def wait_for_projections(self, timeout: float | None = None) -> bool:
+        """Waits until the projections have processed the events recorded
+        so far. Returns False if ``timeout`` ran out first.
+        """
+        if self._runner is None:
+            raise ContainerNotStartedError()
+
+        return self._runner.wait(timeout)
+
+    def stop(self) -> None:
+        if self._runner is None:
+            return
+
+        logger.info("Stopping application container")
+        if self._async_bank_accounts is not None:
+            self._async_bank_accounts.close()
+            self._async_bank_accounts = None
+
+        self._runner.stop()
+        self._runner = None
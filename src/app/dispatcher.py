@@ -0,0 +1,138 @@
+import asyncio
+import typing
+
+from dataclasses import dataclass
+from decimal import Decimal
+from uuid import UUID
+
+from src.app.bank_accounts import TransactionOutcome
+from src.app.concurrency import RetryPolicy
+
+ApplyTransactions = typing.Callable[
+    [list[tuple[UUID, Decimal]]], typing.Awaitable[list[TransactionOutcome]]
+]
+
+
+class DispatcherStoppedError(Exception):
+    """The dispatcher stopped before a transaction's outcome was known.
+
+    A transaction already taken off its queue may have been saved.
+    """
+
+
+@dataclass(frozen=True)
+class _QueuedTransaction:
+    account_id: UUID
+    amount: Decimal
+    future: asyncio.Future
+
+
+class CommandDispatcher:
+    """Serializes transactions per account on hash-partitioned queues.
+
+    Transactions for an account always go to the same partition, and each
+    partition has one worker. The worker applies everything queued on its
+    partition with one apply_transactions() call, so a hot account gets
+    one save for many transactions instead of a storm of conflicting ones.
+    Transactions that still conflict, with writers in other processes, are
+    retried following ``retry_policy``. Only those are applied again, as
+    the rest of their batch may already be saved.
+    """
+
+    def __init__(
+        self,
+        apply_transactions: ApplyTransactions,
+        num_partitions: int,
+        retry_policy: RetryPolicy,
+        max_batch_size: int = 500,
+    ) -> None:
+        self.apply_transactions = apply_transactions
+        self.retry_policy = retry_policy
+        self.num_partitions = num_partitions
+        self.max_batch_size = max_batch_size
+        self._queues: list[asyncio.Queue[_QueuedTransaction]] = []
+        self._workers: list[asyncio.Task] = []
+        # Futures of the transactions the workers have taken off the queues.
+        self._taken: set[asyncio.Future] = set()
+
+    @property
+    def is_started(self) -> bool:
+        return bool(self._workers)
+
+    def start(self) -> None:
+        """Start the partition workers on the running event loop"""
+        if self.is_started:
+            return
+
+        self._queues = [asyncio.Queue() for _ in range(self.num_partitions)]
+        self._workers = [
+            asyncio.create_task(self._run_worker(queue)) for queue in self._queues
+        ]
+
+    def stop(self) -> None:
+        """Stop the partition workers. Transactions still queued or being
+        applied fail with DispatcherStoppedError."""
+        for worker in self._workers:
+            worker.cancel()
+
+        futures = list(self._taken)
+        for queue in self._queues:
+            while not queue.empty():
+                futures.append(queue.get_nowait().future)
+        for future in futures:
+            if not future.done():
+                future.set_exception(DispatcherStoppedError())
+
+        self._queues = []
+        self._workers = []
+        self._taken = set()
+
+    async def submit(self, account_id: UUID, amount: Decimal) -> None:
+        """Queue a transaction and wait for it to be applied"""
+        self.start()
+
+        future = asyncio.get_running_loop().create_future()
+        queue = self._queues[account_id.int % self.num_partitions]
+        await queue.put(_QueuedTransaction(account_id, amount, future))
+        await future
+
+    async def _run_worker(self, queue: asyncio.Queue[_QueuedTransaction]) -> None:
+        while True:
+            batch = [await queue.get()]
+            while len(batch) < self.max_batch_size and not queue.empty():
+                batch.append(queue.get_nowait())
+
+            futures = {item.future for item in batch}
+            self._taken |= futures
+            try:
+                await self._apply_batch(batch)
+            finally:
+                self._taken -= futures
+
+    async def _apply_batch(self, batch: list[_QueuedTransaction]) -> None:
+        for attempt in range(self.retry_policy.max_attempts):
+            try:
+                outcomes = await self.apply_transactions(
+                    [(item.account_id, item.amount) for item in batch]
+                )
+            except Exception as e:
+                # Raised before any of the batch was saved.
+                outcomes = [TransactionOutcome("failed", e)] * len(batch)
+
+            conflicted = []
+            is_last_attempt = attempt + 1 >= self.retry_policy.max_attempts
+            for item, outcome in zip(batch, outcomes):
+                if item.future.done():
+                    continue
+                if outcome.status == "conflicted" and not is_last_attempt:
+                    conflicted.append(item)
+                elif outcome.is_committed:
+                    item.future.set_result(None)
+                else:
+                    item.future.set_exception(outcome.error)
+
+            if not conflicted:
+                return
+
+            batch = conflicted
+            await asyncio.sleep(self.retry_policy.get_delay(attempt))
@@ -0,0 +1,299 @@
+import typing
+
+from dataclasses import dataclass
+from threading import Lock
+from uuid import UUID
+
+from eventsourcing.application import Cache, LocalNotificationLog, project_aggregate
+from eventsourcing.domain import DomainEventProtocol
+from eventsourcing.persistence import (
+    ApplicationRecorder,
+    Mapper,
+    Notification,
+    StoredEvent,
+)
+from eventsourcing.postgres import (
+    PostgresAggregateRecorder,
+    PostgresApplicationRecorder,
+)
+from eventsourcing.sqlite import SQLiteApplicationRecorder
+
+
+@dataclass(frozen=True)
+class CacheStats:
+    hits: int
+    misses: int
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+class CountingCache(Cache[UUID, typing.Any]):
+    """Wraps a repository's aggregate cache, counting hits and misses."""
+
+    def __init__(self, wrapped: Cache[UUID, typing.Any]) -> None:
+        self.wrapped = wrapped
+        self._hits = 0
+        self._misses = 0
+        self._lock = Lock()
+
+    @property
+    def stats(self) -> CacheStats:
+        return CacheStats(hits=self._hits, misses=self._misses)
+
+    def get(self, key: UUID, evict: bool = False) -> typing.Any:
+        try:
+            value = self.wrapped.get(key, evict)
+        except KeyError:
+            with self._lock:
+                self._misses += 1
+            raise
+
+        with self._lock:
+            self._hits += 1
+
+        return value
+
+    def put(self, key: UUID, value: typing.Any) -> typing.Any:
+        return self.wrapped.put(key, value)
+
+
+class CountingProjector:
+    """Projects aggregates like project_aggregate(), counting the events.
+
+    Passed as a repository's projector_func, it counts the events a read
+    replays, whether reconstructing an aggregate or fast-forwarding a
+    cached one.
+    """
+
+    def __init__(self) -> None:
+        self.count = 0
+
+    def __call__(
+        self, aggregate: typing.Any, events: typing.Iterable[DomainEventProtocol]
+    ) -> typing.Any:
+        return project_aggregate(aggregate, self._count(events))
+
+    def _count(
+        self, events: typing.Iterable[DomainEventProtocol]
+    ) -> typing.Iterator[DomainEventProtocol]:
+        for event in events:
+            self.count += 1
+            yield event
+
+
+def select_latest_events(
+    recorder: PostgresAggregateRecorder, originator_ids: typing.Sequence[UUID]
+) -> list[StoredEvent]:
+    """Select the latest stored event of each originator in one query."""
+    statement = (
+        f"SELECT DISTINCT ON (originator_id) * FROM {recorder.events_table_name} "
+        "WHERE originator_id = ANY(%s) "
+        "ORDER BY originator_id, originator_version DESC"
+    )
+
+    with recorder.datastore.transaction(commit=False) as curs:
+        curs.execute(statement, [list(originator_ids)])
+        return [_to_stored_event(row) for row in curs.fetchall()]
+
+
+def select_events_after(
+    recorder: PostgresAggregateRecorder, positions: typing.Mapping[UUID, int]
+) -> list[StoredEvent]:
+    """Select the stored events of many originators in one query.
+
+    Only events after the given version of each originator are selected,
+    ordered by originator and version.
+    """
+    statement = (
+        f"SELECT e.* FROM {recorder.events_table_name} e "
+        "JOIN unnest(%s::uuid[], %s::bigint[]) AS p(originator_id, gt) "
+        "ON e.originator_id = p.originator_id AND e.originator_version > p.gt "
+        "ORDER BY e.originator_id, e.originator_version"
+    )
+
+    with recorder.datastore.transaction(commit=False) as curs:
+        curs.execute(statement, [list(positions.keys()), list(positions.values())])
+        return [_to_stored_event(row) for row in curs.fetchall()]
+
+
+def _to_stored_event(row: typing.Mapping[str, typing.Any]) -> StoredEvent:
+    return StoredEvent(
+        originator_id=row["originator_id"],
+        originator_version=row["originator_version"],
+        topic=row["topic"],
+        state=bytes(row["state"]),
+    )
+
+
+def decode_event_state(mapper: Mapper, stored_event: StoredEvent) -> dict:
+    """Decode a stored event's state without constructing the event object."""
+    state = stored_event.state
+    if mapper.cipher:
+        state = mapper.cipher.decrypt(state)
+    if mapper.compressor:
+        state = mapper.compressor.decompress(state)
+    return mapper.transcoder.decode(state)
+
+
+def get_partition(originator_id: UUID, num_partitions: int) -> int:
+    """The partition of an originator's notifications.
+
+    Only the low 16 bits of the id are used, so the recorders' queries can
+    work it out from the last four hex digits.
+    """
+    return (originator_id.int & 0xFFFF) % num_partitions
+
+
+def select_notification_batches(
+    log: LocalNotificationLog,
+    batch_size: int,
+    topics: typing.Sequence[str] = (),
+    stop: int | None = None,
+    partition: int = 0,
+    num_partitions: int = 1,
+    start: int = 1,
+) -> typing.Iterator[list[Notification]]:
+    """Select a log's notifications from ``start`` up to ``stop``, ``batch_size``
+    at a time.
+
+    Unlike the log's own select(), batches may be larger than its section
+    size. With ``num_partitions``, only the notifications of originators
+    in ``partition`` are selected, filtered in the query on PostgreSQL and
+    SQLite.
+    """
+    while True:
+        if num_partitions > 1:
+            notifications = select_partition_notifications(
+                log.recorder, start, batch_size, partition, num_partitions, stop, topics
+            )
+        else:
+            notifications = log.recorder.select_notifications(
+                start=start, limit=batch_size, stop=stop, topics=topics
+            )
+        if notifications:
+            yield notifications
+        if len(notifications) < batch_size:
+            return
+        start = notifications[-1].id + 1
+
+
+def select_partition_notifications(
+    recorder: ApplicationRecorder,
+    start: int,
+    limit: int,
+    partition: int,
+    num_partitions: int,
+    stop: int | None = None,
+    topics: typing.Sequence[str] = (),
+) -> list[Notification]:
+    """Like the recorder's select_notifications(), for one partition"""
+    if isinstance(recorder, PostgresApplicationRecorder):
+        return _select_postgres_partition_notifications(
+            recorder, start, limit, partition, num_partitions, stop, topics
+        )
+    if isinstance(recorder, SQLiteApplicationRecorder):
+        return _select_sqlite_partition_notifications(
+            recorder, start, limit, partition, num_partitions, stop, topics
+        )
+
+    # In-memory recorders have nothing to save by filtering first.
+    notifications: list[Notification] = []
+    while len(notifications) < limit:
+        selected = recorder.select_notifications(
+            start=start, limit=limit, stop=stop, topics=topics
+        )
+        notifications += [
+            notification
+            for notification in selected
+            if get_partition(notification.originator_id, num_partitions) == partition
+        ]
+        if len(selected) < limit:
+            break
+        start = selected[-1].id + 1
+    return notifications[:limit]
+
+
+def _select_postgres_partition_notifications(
+    recorder: PostgresApplicationRecorder,
+    start: int,
+    limit: int,
+    partition: int,
+    num_partitions: int,
+    stop: int | None,
+    topics: typing.Sequence[str],
+) -> list[Notification]:
+    params: list[typing.Any] = [start, num_partitions, partition]
+    statement = (
+        f"SELECT * FROM {recorder.events_table_name} "
+        "WHERE notification_id >= %s "
+        "AND ('x' || right(originator_id::text, 4))::bit(16)::int %% %s = %s "
+    )
+    if stop is not None:
+        params.append(stop)
+        statement += "AND notification_id <= %s "
+    if topics:
+        params.append(list(topics))
+        statement += "AND topic = ANY(%s) "
+    params.append(limit)
+    statement += "ORDER BY notification_id LIMIT %s"
+
+    with recorder.datastore.transaction(commit=False) as curs:
+        curs.execute(statement, params)
+        return [
+            Notification(
+                id=row["notification_id"],
+                originator_id=row["originator_id"],
+                originator_version=row["originator_version"],
+                topic=row["topic"],
+                state=bytes(row["state"]),
+            )
+            for row in curs.fetchall()
+        ]
+
+
+# The low 16 bits of an originator id stored as 32 lowercase hex digits.
+_SQLITE_LOW_BITS = " + ".join(
+    f"(instr('0123456789abcdef', substr(originator_id, {position}, 1)) - 1)"
+    f" * {16 ** (32 - position)}"
+    for position in range(29, 33)
+)
+
+
+def _select_sqlite_partition_notifications(
+    recorder: SQLiteApplicationRecorder,
+    start: int,
+    limit: int,
+    partition: int,
+    num_partitions: int,
+    stop: int | None,
+    topics: typing.Sequence[str],
+) -> list[Notification]:
+    params: list[typing.Any] = [start, num_partitions, partition]
+    statement = (
+        f"SELECT rowid, * FROM {recorder.events_table_name} "
+        f"WHERE rowid >= ? AND ({_SQLITE_LOW_BITS}) % ? = ? "
+    )
+    if stop is not None:
+        params.append(stop)
+        statement += "AND rowid <= ? "
+    if topics:
+        params += list(topics)
+        statement += "AND topic IN ({}) ".format(",".join("?" * len(topics)))
+    params.append(limit)
+    statement += "ORDER BY rowid LIMIT ?"
+
+    with recorder.datastore.transaction(commit=False) as c:
+        c.execute(statement, params)
+        return [
+            Notification(
+                id=row["rowid"],
+                originator_id=UUID(row["originator_id"]),
+                originator_version=row["originator_version"],
+                topic=row["topic"],
+                state=row["state"],
+            )
+            for row in c.fetchall()
+        ]
@@ -0,0 +1,191 @@
+import logging
+import time
+import typing
+
+from threading import Condition, Event, Thread
+
+from eventsourcing.application import Application, LocalNotificationLog, TApplication
+from eventsourcing.system import (
+    Follower,
+    Leader,
+    RecordingEvent,
+    RecordingEventReceiver,
+    Runner,
+    System,
+)
+from eventsourcing.utils import EnvType
+
+logger = logging.getLogger(__name__)
+
+
+class FollowerThread(RecordingEventReceiver, Thread):
+    """Pulls and processes a follower's notifications in the background.
+
+    The thread pulls from every application the follower follows when a
+    leader prompts it, and every ``poll_interval`` seconds for events
+    recorded by other processes. Errors are logged and the pull is
+    retried after an exponential backoff of up to ``max_retry_delay``
+    seconds, from the position the follower last recorded.
+    """
+
+    def __init__(
+        self,
+        follower: Follower,
+        poll_interval: float = 1.0,
+        retry_delay: float = 0.1,
+        max_retry_delay: float = 30.0,
+    ) -> None:
+        super().__init__(daemon=True, name=f"{follower.name}Thread")
+        self.follower = follower
+        self.poll_interval = poll_interval
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        # Notification id of each leader processed up to.
+        self._positions: dict[str, int] = {}
+        self._has_processed = Condition()
+        self._is_prompted = Event()
+        self._is_stopping = Event()
+
+        # Catch up on events recorded while this process wasn't running.
+        self._is_prompted.set()
+
+    def receive_recording_event(self, recording_event: RecordingEvent) -> None:
+        self._is_prompted.set()
+
+    def run(self) -> None:
+        failures = 0
+
+        while not self._is_stopping.is_set():
+            self._is_prompted.wait(timeout=self.poll_interval)
+            self._is_prompted.clear()
+            if self._is_stopping.is_set():
+                break
+
+            try:
+                self.pull_and_process()
+            except Exception:
+                delay = min(self.max_retry_delay, self.retry_delay * 2**failures)
+                failures += 1
+                logger.exception(
+                    "%s failed to process events, retrying in %.1fs",
+                    self.follower.name,
+                    delay,
+                )
+                self._is_stopping.wait(delay)
+                self._is_prompted.set()
+            else:
+                failures = 0
+
+    def pull_and_process(self) -> None:
+        for leader_name, reader in self.follower.readers.items():
+            log = reader.notification_log
+            assert isinstance(log, LocalNotificationLog)
+            stop = log.recorder.max_notification_id()
+            if stop > self._positions.get(leader_name, 0):
+                self.follower.pull_and_process(leader_name, stop=stop)
+
+            with self._has_processed:
+                self._positions[leader_name] = stop
+                self._has_processed.notify_all()
+
+    def wait(
+        self, positions: typing.Mapping[str, int], timeout: float | None = None
+    ) -> bool:
+        """Waits until the notifications of each leader up to its position
+        have been processed. Returns False if ``timeout`` ran out first.
+        """
+        self._is_prompted.set()
+        with self._has_processed:
+            return self._has_processed.wait_for(
+                lambda: all(
+                    self._positions.get(leader_name, 0) >= position
+                    for leader_name, position in positions.items()
+                ),
+                timeout,
+            )
+
+    def stop(self) -> None:
+        self._is_stopping.set()
+        self._is_prompted.set()
+
+
+class BackgroundRunner(Runner):
+    """Runs a system with a FollowerThread for each follower.
+
+    Leaders prompt the threads after recording events, and don't wait for
+    them, so commands return once their own events are recorded, and a
+    follower's errors never come out of a leader's save().
+    """
+
+    def __init__(
+        self,
+        system: System,
+        env: EnvType | None = None,
+        poll_interval: float = 1.0,
+    ) -> None:
+        super().__init__(system=system, env=env)
+        self.poll_interval = poll_interval
+        self.apps: dict[str, Application] = {}
+        self.threads: dict[str, FollowerThread] = {}
+
+        for name in self.system.followers:
+            self.apps[name] = self.system.follower_cls(name)(env=self.env)
+        for name in self.system.leaders_only:
+            self.apps[name] = self.system.leader_cls(name)(env=self.env)
+        for name in self.system.singles:
+            self.apps[name] = self.system.get_app_cls(name)(env=self.env)
+
+    def start(self) -> None:
+        super().start()
+
+        for leader_name, follower_name in self.system.edges:
+            leader = typing.cast(Leader, self.apps[leader_name])
+            follower = typing.cast(Follower, self.apps[follower_name])
+            follower.follow(leader_name, leader.notification_log)
+
+        for follower_name in self.system.followers:
+            follower = typing.cast(Follower, self.apps[follower_name])
+            self.threads[follower_name] = FollowerThread(follower, self.poll_interval)
+
+        for leader_name, follower_name in self.system.edges:
+            leader = typing.cast(Leader, self.apps[leader_name])
+            leader.lead(self.threads[follower_name])
+
+        for thread in self.threads.values():
+            thread.start()
+
+    def wait(self, timeout: float | None = None) -> bool:
+        """Waits until the followers have processed the events recorded so
+        far. Returns False if ``timeout`` ran out first.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        positions = {
+            name: typing.cast(Leader, self.apps[name]).recorder.max_notification_id()
+            for name in self.system.leaders
+        }
+        for thread in self.threads.values():
+            remaining = None
+            if deadline is not None:
+                remaining = max(0.0, deadline - time.monotonic())
+            thread_positions = {
+                name: positions[name] for name in thread.follower.readers
+            }
+            if not thread.wait(thread_positions, remaining):
+                return False
+        return True
+
+    def stop(self) -> None:
+        for thread in self.threads.values():
+            thread.stop()
+        for thread in self.threads.values():
+            thread.join()
+        self.threads.clear()
+
+        for app in self.apps.values():
+            app.close()
+        self.apps.clear()
+
+    def get(self, cls: type[TApplication]) -> TApplication:
+        app = self.apps[cls.name]
+        assert isinstance(app, cls)
+        return app
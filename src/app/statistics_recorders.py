@@ -0,0 +1,431 @@
+import typing
+
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, fields, replace
+from decimal import Decimal
+from uuid import UUID
+
+from eventsourcing.persistence import ProcessRecorder, StoredEvent
+from eventsourcing.popo import POPOProcessRecorder
+from eventsourcing.postgres import (
+    PostgresCursor,
+    PostgresDatastore,
+    PostgresProcessRecorder,
+)
+from eventsourcing.sqlite import SQLiteCursor, SQLiteDatastore, SQLiteProcessRecorder
+
+ZERO = Decimal("0.00")
+
+
+@dataclass(frozen=True)
+class BankStatistics:
+    account_count: int = 0
+    closed_account_count: int = 0
+    overdrawn_account_count: int = 0
+    transaction_count: int = 0
+    total_deposits: Decimal = ZERO
+    total_withdrawals: Decimal = ZERO
+    # Sum of the positive balances, which the bank owes its clients.
+    total_liabilities: Decimal = ZERO
+    # Sum of the negative balances, as a positive amount.
+    total_overdrawn: Decimal = ZERO
+
+    def __add__(self, other: "BankStatistics") -> "BankStatistics":
+        return BankStatistics(
+            **{
+                field.name: getattr(self, field.name) + getattr(other, field.name)
+                for field in fields(self)
+            }
+        )
+
+    def with_transaction(self, balance: Decimal, amount: Decimal) -> "BankStatistics":
+        """The statistics after appending ``amount`` to an account's ``balance``"""
+        new_balance = balance + amount
+        return replace(
+            self,
+            overdrawn_account_count=self.overdrawn_account_count
+            + (new_balance < 0)
+            - (balance < 0),
+            transaction_count=self.transaction_count + 1,
+            total_deposits=self.total_deposits + max(amount, ZERO),
+            total_withdrawals=self.total_withdrawals - min(amount, ZERO),
+            total_liabilities=self.total_liabilities
+            + max(new_balance, ZERO)
+            - max(balance, ZERO),
+            total_overdrawn=self.total_overdrawn
+            - min(new_balance, ZERO)
+            + min(balance, ZERO),
+        )
+
+
+# Keyword arguments for passing the changed statistics and account balances
+# to insert_events(), so they are written in the same transaction as the
+# tracking record.
+STATISTICS_KWARG = "bank_statistics"
+BALANCES_KWARG = "bank_statistics_balances"
+
+
+class BankStatisticsRecorder(ProcessRecorder, ABC):
+    @abstractmethod
+    def select_statistics(self) -> BankStatistics:
+        pass
+
+    @abstractmethod
+    def select_balances(
+        self, account_ids: typing.Sequence[UUID]
+    ) -> dict[UUID, Decimal]:
+        pass
+
+    @abstractmethod
+    def replace_statistics(
+        self,
+        application_name: str,
+        statistics: BankStatistics,
+        balances: typing.Mapping[UUID, Decimal],
+        notification_id: int,
+    ) -> None:
+        """Replaces everything projected from the named application.
+
+        The tracked position is reset to ``notification_id``, or to the
+        start of the log when it's 0.
+        """
+
+
+class POPOBankStatisticsRecorder(POPOProcessRecorder, BankStatisticsRecorder):
+    def __init__(self) -> None:
+        super().__init__()
+        self._statistics = BankStatistics()
+        self._balances: dict[UUID, Decimal] = {}
+
+    def _update_table(
+        self, stored_events: list[StoredEvent], **kwargs: typing.Any
+    ) -> typing.Optional[typing.Sequence[int]]:
+        notification_ids = super()._update_table(stored_events, **kwargs)
+        if STATISTICS_KWARG in kwargs:
+            self._statistics = kwargs[STATISTICS_KWARG]
+        self._balances.update(kwargs.get(BALANCES_KWARG, {}))
+        return notification_ids
+
+    def select_statistics(self) -> BankStatistics:
+        with self._database_lock:
+            return self._statistics
+
+    def select_balances(
+        self, account_ids: typing.Sequence[UUID]
+    ) -> dict[UUID, Decimal]:
+        with self._database_lock:
+            return {i: self._balances[i] for i in account_ids if i in self._balances}
+
+    def replace_statistics(
+        self,
+        application_name: str,
+        statistics: BankStatistics,
+        balances: typing.Mapping[UUID, Decimal],
+        notification_id: int,
+    ) -> None:
+        with self._database_lock:
+            self._statistics = statistics
+            self._balances = dict(balances)
+            self._tracking_table[application_name] = (
+                {notification_id} if notification_id else set()
+            )
+            self._max_tracking_ids[application_name] = notification_id
+
+
+class SQLiteBankStatisticsRecorder(SQLiteProcessRecorder, BankStatisticsRecorder):
+    def __init__(
+        self,
+        datastore: SQLiteDatastore,
+        events_table_name: str = "stored_events",
+        statistics_table_name: str = "bank_statistics",
+        balance_table_name: str = "bank_statistics_balance",
+        # Other followers of the same application share the database, and
+        # would otherwise share the positions in the "tracking" table.
+        tracking_table_name: str = "bank_statistics_tracking",
+    ):
+        self.statistics_table_name = statistics_table_name
+        self.balance_table_name = balance_table_name
+        self.tracking_table_name = tracking_table_name
+        super().__init__(datastore, events_table_name)
+        self.insert_tracking_statement = (
+            f"INSERT INTO {self.tracking_table_name} VALUES (?,?)"
+        )
+        self.select_max_tracking_id_statement = (
+            f"SELECT MAX(notification_id) FROM {self.tracking_table_name} "
+            "WHERE application_name=?"
+        )
+        self.count_tracking_id_statement = (
+            f"SELECT COUNT(*) FROM {self.tracking_table_name} WHERE "
+            "application_name=? AND notification_id=?"
+        )
+        self.upsert_statistics_statement = (
+            f"INSERT OR REPLACE INTO {self.statistics_table_name} "
+            "VALUES (1,?,?,?,?,?,?,?,?)"
+        )
+        self.upsert_balance_statement = (
+            f"INSERT OR REPLACE INTO {self.balance_table_name} VALUES (?,?)"
+        )
+
+    def construct_create_table_statements(self) -> list[str]:
+        statements = super().construct_create_table_statements()
+        statements.extend(
+            [
+                "CREATE TABLE IF NOT EXISTS "
+                f"{self.tracking_table_name} ("
+                "application_name TEXT, "
+                "notification_id INTEGER, "
+                "PRIMARY KEY "
+                "(application_name, notification_id)) "
+                "WITHOUT ROWID",
+                "CREATE TABLE IF NOT EXISTS "
+                f"{self.statistics_table_name} ("
+                "id INTEGER PRIMARY KEY CHECK (id = 1), "
+                "account_count INTEGER, "
+                "closed_account_count INTEGER, "
+                "overdrawn_account_count INTEGER, "
+                "transaction_count INTEGER, "
+                "total_deposits TEXT, "
+                "total_withdrawals TEXT, "
+                "total_liabilities TEXT, "
+                "total_overdrawn TEXT)",
+                "CREATE TABLE IF NOT EXISTS "
+                f"{self.balance_table_name} ("
+                "id TEXT PRIMARY KEY, "
+                "balance TEXT) "
+                "WITHOUT ROWID",
+            ]
+        )
+        return statements
+
+    def _insert_events(
+        self,
+        c: SQLiteCursor,
+        stored_events: list[StoredEvent],
+        **kwargs: typing.Any,
+    ) -> typing.Optional[typing.Sequence[int]]:
+        returning = super()._insert_events(c, stored_events, **kwargs)
+        if STATISTICS_KWARG in kwargs:
+            self._upsert_statistics(c, kwargs[STATISTICS_KWARG])
+        self._upsert_balances(c, kwargs.get(BALANCES_KWARG, {}))
+        return returning
+
+    def _upsert_statistics(self, c: SQLiteCursor, statistics: BankStatistics) -> None:
+        c.execute(
+            self.upsert_statistics_statement,
+            (
+                statistics.account_count,
+                statistics.closed_account_count,
+                statistics.overdrawn_account_count,
+                statistics.transaction_count,
+                str(statistics.total_deposits),
+                str(statistics.total_withdrawals),
+                str(statistics.total_liabilities),
+                str(statistics.total_overdrawn),
+            ),
+        )
+
+    def _upsert_balances(
+        self, c: SQLiteCursor, balances: typing.Mapping[UUID, Decimal]
+    ) -> None:
+        if balances:
+            c.executemany(
+                self.upsert_balance_statement,
+                [(i.hex, str(balance)) for i, balance in balances.items()],
+            )
+
+    def select_statistics(self) -> BankStatistics:
+        with self.datastore.transaction(commit=False) as c:
+            c.execute(f"SELECT * FROM {self.statistics_table_name}")
+            row = c.fetchone()
+
+        if row is None:
+            return BankStatistics()
+
+        return BankStatistics(
+            account_count=row["account_count"],
+            closed_account_count=row["closed_account_count"],
+            overdrawn_account_count=row["overdrawn_account_count"],
+            transaction_count=row["transaction_count"],
+            total_deposits=Decimal(row["total_deposits"]),
+            total_withdrawals=Decimal(row["total_withdrawals"]),
+            total_liabilities=Decimal(row["total_liabilities"]),
+            total_overdrawn=Decimal(row["total_overdrawn"]),
+        )
+
+    def select_balances(
+        self, account_ids: typing.Sequence[UUID]
+    ) -> dict[UUID, Decimal]:
+        if not account_ids:
+            return {}
+
+        statement = (
+            f"SELECT * FROM {self.balance_table_name} "
+            f"WHERE id IN ({', '.join('?' for _ in account_ids)})"
+        )
+        with self.datastore.transaction(commit=False) as c:
+            c.execute(statement, [account_id.hex for account_id in account_ids])
+            return {UUID(row["id"]): Decimal(row["balance"]) for row in c.fetchall()}
+
+    def replace_statistics(
+        self,
+        application_name: str,
+        statistics: BankStatistics,
+        balances: typing.Mapping[UUID, Decimal],
+        notification_id: int,
+    ) -> None:
+        with self.datastore.transaction(commit=True) as c:
+            c.execute(
+                f"DELETE FROM {self.tracking_table_name} WHERE application_name=?",
+                (application_name,),
+            )
+            c.execute(f"DELETE FROM {self.balance_table_name}")
+            self._upsert_statistics(c, statistics)
+            self._upsert_balances(c, balances)
+            if notification_id:
+                c.execute(
+                    self.insert_tracking_statement, (application_name, notification_id)
+                )
+
+
+class PostgresBankStatisticsRecorder(PostgresProcessRecorder, BankStatisticsRecorder):
+    def __init__(
+        self,
+        datastore: PostgresDatastore,
+        events_table_name: str,
+        tracking_table_name: str,
+        statistics_table_name: str = "bank_statistics",
+        balance_table_name: str = "bank_statistics_balance",
+    ):
+        self.check_table_name_length(statistics_table_name, datastore.schema)
+        self.check_table_name_length(balance_table_name, datastore.schema)
+        self.statistics_table_name = statistics_table_name
+        self.balance_table_name = balance_table_name
+        super().__init__(datastore, events_table_name, tracking_table_name)
+        self.upsert_statistics_statement = (
+            f"INSERT INTO {self.statistics_table_name} "
+            "VALUES (1, %s, %s, %s, %s, %s, %s, %s, %s) "
+            "ON CONFLICT (id) DO UPDATE SET "
+            "account_count=EXCLUDED.account_count, "
+            "closed_account_count=EXCLUDED.closed_account_count, "
+            "overdrawn_account_count=EXCLUDED.overdrawn_account_count, "
+            "transaction_count=EXCLUDED.transaction_count, "
+            "total_deposits=EXCLUDED.total_deposits, "
+            "total_withdrawals=EXCLUDED.total_withdrawals, "
+            "total_liabilities=EXCLUDED.total_liabilities, "
+            "total_overdrawn=EXCLUDED.total_overdrawn"
+        )
+        self.upsert_balances_statement = (
+            f"INSERT INTO {self.balance_table_name} "
+            "SELECT * FROM unnest(%s::uuid[], %s::numeric[]) "
+            "ON CONFLICT (id) DO UPDATE SET balance=EXCLUDED.balance"
+        )
+
+    def construct_create_table_statements(self) -> list[str]:
+        statements = super().construct_create_table_statements()
+        statements.extend(
+            [
+                "CREATE TABLE IF NOT EXISTS "
+                f"{self.statistics_table_name} ("
+                "id smallint PRIMARY KEY CHECK (id = 1), "
+                "account_count bigint NOT NULL, "
+                "closed_account_count bigint NOT NULL, "
+                "overdrawn_account_count bigint NOT NULL, "
+                "transaction_count bigint NOT NULL, "
+                "total_deposits numeric NOT NULL, "
+                "total_withdrawals numeric NOT NULL, "
+                "total_liabilities numeric NOT NULL, "
+                "total_overdrawn numeric NOT NULL)",
+                "CREATE TABLE IF NOT EXISTS "
+                f"{self.balance_table_name} ("
+                "id uuid PRIMARY KEY, "
+                "balance numeric NOT NULL)",
+            ]
+        )
+        return statements
+
+    def _insert_events(
+        self,
+        c: PostgresCursor,
+        stored_events: list[StoredEvent],
+        **kwargs: typing.Any,
+    ) -> typing.Optional[typing.Sequence[int]]:
+        notification_ids = super()._insert_events(c, stored_events, **kwargs)
+        if STATISTICS_KWARG in kwargs:
+            self._upsert_statistics(c, kwargs[STATISTICS_KWARG])
+        self._upsert_balances(c, kwargs.get(BALANCES_KWARG, {}))
+        return notification_ids
+
+    def _upsert_statistics(self, c: PostgresCursor, statistics: BankStatistics) -> None:
+        c.execute(
+            self.upsert_statistics_statement,
+            (
+                statistics.account_count,
+                statistics.closed_account_count,
+                statistics.overdrawn_account_count,
+                statistics.transaction_count,
+                statistics.total_deposits,
+                statistics.total_withdrawals,
+                statistics.total_liabilities,
+                statistics.total_overdrawn,
+            ),
+        )
+
+    def _upsert_balances(
+        self, c: PostgresCursor, balances: typing.Mapping[UUID, Decimal]
+    ) -> None:
+        if balances:
+            c.execute(
+                self.upsert_balances_statement,
+                (list(balances.keys()), list(balances.values())),
+            )
+
+    def select_statistics(self) -> BankStatistics:
+        with self.datastore.transaction(commit=False) as c:
+            c.execute(f"SELECT * FROM {self.statistics_table_name}")
+            row = c.fetchone()
+
+        if row is None:
+            return BankStatistics()
+
+        return BankStatistics(
+            account_count=row["account_count"],
+            closed_account_count=row["closed_account_count"],
+            overdrawn_account_count=row["overdrawn_account_count"],
+            transaction_count=row["transaction_count"],
+            total_deposits=row["total_deposits"],
+            total_withdrawals=row["total_withdrawals"],
+            total_liabilities=row["total_liabilities"],
+            total_overdrawn=row["total_overdrawn"],
+        )
+
+    def select_balances(
+        self, account_ids: typing.Sequence[UUID]
+    ) -> dict[UUID, Decimal]:
+        if not account_ids:
+            return {}
+
+        statement = f"SELECT * FROM {self.balance_table_name} WHERE id = ANY(%s)"
+        with self.datastore.transaction(commit=False) as c:
+            c.execute(statement, [list(account_ids)])
+            return {row["id"]: row["balance"] for row in c.fetchall()}
+
+    def replace_statistics(
+        self,
+        application_name: str,
+        statistics: BankStatistics,
+        balances: typing.Mapping[UUID, Decimal],
+        notification_id: int,
+    ) -> None:
+        with self.datastore.transaction(commit=True) as c:
+            c.execute(
+                f"DELETE FROM {self.tracking_table_name} WHERE application_name = %s",
+                (application_name,),
+            )
+            c.execute(f"DELETE FROM {self.balance_table_name}")
+            self._upsert_statistics(c, statistics)
+            self._upsert_balances(c, balances)
+            if notification_id:
+                c.execute(
+                    f"INSERT INTO {self.tracking_table_name} VALUES (%s, %s)",
+                    (application_name, notification_id),
+                )
@@ -0,0 +1,435 @@
+import bisect
+import typing
+
+from abc import ABC, abstractmethod
+from collections import defaultdict
+from dataclasses import dataclass
+from decimal import Decimal
+from uuid import UUID
+
+from eventsourcing.persistence import ProcessRecorder, StoredEvent
+from eventsourcing.popo import POPOProcessRecorder
+from eventsourcing.postgres import (
+    PostgresCursor,
+    PostgresDatastore,
+    PostgresProcessRecorder,
+)
+from eventsourcing.sqlite import SQLiteCursor, SQLiteDatastore, SQLiteProcessRecorder
+
+
+@dataclass(frozen=True)
+class BankAccountSummary:
+    id: UUID
+    full_name: str
+    email_address: str
+    balance: Decimal
+    overdraft_limit: Decimal
+    is_closed: bool
+    version: int
+
+
+# Keyword argument for passing changed summaries to insert_events(), so they
+# are written in the same transaction as the tracking record.
+SUMMARIES_KWARG = "bank_account_summaries"
+
+
+class BankAccountSummaryRecorder(ProcessRecorder, ABC):
+    @abstractmethod
+    def select_summaries(
+        self, account_ids: typing.Sequence[UUID]
+    ) -> list[BankAccountSummary]:
+        pass
+
+    @abstractmethod
+    def select_summaries_by_email(self, email_address: str) -> list[BankAccountSummary]:
+        """Summaries with the email address, ignoring case"""
+
+    @abstractmethod
+    def search_summaries(
+        self, name_prefix: str, limit: int
+    ) -> list[BankAccountSummary]:
+        """Summaries whose full name starts with the prefix, ignoring case,
+        ordered by full name"""
+
+    @abstractmethod
+    def replace_summaries(
+        self,
+        application_name: str,
+        summaries: typing.Iterable[BankAccountSummary],
+        notification_id: int,
+    ) -> None:
+        """Replaces everything projected from the named application.
+
+        The tracked position is reset to ``notification_id``, or to the
+        start of the log when it's 0.
+        """
+
+
+class POPOBankAccountSummaryRecorder(POPOProcessRecorder, BankAccountSummaryRecorder):
+    def __init__(self) -> None:
+        super().__init__()
+        self._summaries: dict[UUID, BankAccountSummary] = {}
+        self._ids_by_email: dict[str, set[UUID]] = defaultdict(set)
+        # Names don't change once opened, so entries are only ever added.
+        self._names: list[tuple[str, UUID]] = []
+
+    def _update_table(
+        self, stored_events: list[StoredEvent], **kwargs: typing.Any
+    ) -> typing.Optional[typing.Sequence[int]]:
+        notification_ids = super()._update_table(stored_events, **kwargs)
+        self._put_summaries(kwargs.get(SUMMARIES_KWARG, ()))
+        return notification_ids
+
+    def _put_summaries(self, summaries: typing.Iterable[BankAccountSummary]) -> None:
+        for summary in summaries:
+            if summary.id not in self._summaries:
+                self._ids_by_email[summary.email_address.lower()].add(summary.id)
+                bisect.insort(self._names, (summary.full_name.lower(), summary.id))
+            self._summaries[summary.id] = summary
+
+    def select_summaries(
+        self, account_ids: typing.Sequence[UUID]
+    ) -> list[BankAccountSummary]:
+        with self._database_lock:
+            return [
+                self._summaries[account_id]
+                for account_id in account_ids
+                if account_id in self._summaries
+            ]
+
+    def select_summaries_by_email(self, email_address: str) -> list[BankAccountSummary]:
+        with self._database_lock:
+            account_ids = self._ids_by_email.get(email_address.lower(), ())
+            return [self._summaries[account_id] for account_id in account_ids]
+
+    def search_summaries(
+        self, name_prefix: str, limit: int
+    ) -> list[BankAccountSummary]:
+        name_prefix = name_prefix.lower()
+        with self._database_lock:
+            start = bisect.bisect_left(self._names, (name_prefix,))
+            summaries = []
+            for name, account_id in self._names[start:]:
+                if len(summaries) == limit or not name.startswith(name_prefix):
+                    break
+                summaries.append(self._summaries[account_id])
+            return summaries
+
+    def replace_summaries(
+        self,
+        application_name: str,
+        summaries: typing.Iterable[BankAccountSummary],
+        notification_id: int,
+    ) -> None:
+        with self._database_lock:
+            self._summaries = {}
+            self._ids_by_email = defaultdict(set)
+            self._names = []
+            self._put_summaries(summaries)
+            self._tracking_table[application_name] = (
+                {notification_id} if notification_id else set()
+            )
+            self._max_tracking_ids[application_name] = notification_id
+
+
+class SQLiteBankAccountSummaryRecorder(
+    SQLiteProcessRecorder, BankAccountSummaryRecorder
+):
+    def __init__(
+        self,
+        datastore: SQLiteDatastore,
+        events_table_name: str = "stored_events",
+        summary_table_name: str = "bank_account_summary",
+    ):
+        self.summary_table_name = summary_table_name
+        super().__init__(datastore, events_table_name)
+        self.upsert_summary_statement = (
+            f"INSERT INTO {self.summary_table_name} VALUES (?,?,?,?,?,?,?) "
+            "ON CONFLICT (id) DO UPDATE SET "
+            "full_name=excluded.full_name, "
+            "email_address=excluded.email_address, "
+            "balance=excluded.balance, "
+            "overdraft_limit=excluded.overdraft_limit, "
+            "is_closed=excluded.is_closed, "
+            "version=excluded.version"
+        )
+
+    def construct_create_table_statements(self) -> list[str]:
+        statements = super().construct_create_table_statements()
+        statements.extend(
+            [
+                "CREATE TABLE IF NOT EXISTS "
+                f"{self.summary_table_name} ("
+                "id TEXT PRIMARY KEY, "
+                "full_name TEXT, "
+                "email_address TEXT, "
+                "balance TEXT, "
+                "overdraft_limit TEXT, "
+                "is_closed INTEGER, "
+                "version INTEGER) "
+                "WITHOUT ROWID",
+                "CREATE INDEX IF NOT EXISTS "
+                f"{self.summary_table_name}_email_idx "
+                f"ON {self.summary_table_name} (lower(email_address))",
+                "CREATE INDEX IF NOT EXISTS "
+                f"{self.summary_table_name}_full_name_idx "
+                f"ON {self.summary_table_name} (lower(full_name))",
+            ]
+        )
+        return statements
+
+    def _insert_events(
+        self,
+        c: SQLiteCursor,
+        stored_events: list[StoredEvent],
+        **kwargs: typing.Any,
+    ) -> typing.Optional[typing.Sequence[int]]:
+        returning = super()._insert_events(c, stored_events, **kwargs)
+        self._upsert_summaries(c, kwargs.get(SUMMARIES_KWARG, ()))
+        return returning
+
+    def _upsert_summaries(
+        self, c: SQLiteCursor, summaries: typing.Iterable[BankAccountSummary]
+    ) -> None:
+        for summary in summaries:
+            c.execute(
+                self.upsert_summary_statement,
+                (
+                    summary.id.hex,
+                    summary.full_name,
+                    summary.email_address,
+                    str(summary.balance),
+                    str(summary.overdraft_limit),
+                    summary.is_closed,
+                    summary.version,
+                ),
+            )
+
+    def select_summaries(
+        self, account_ids: typing.Sequence[UUID]
+    ) -> list[BankAccountSummary]:
+        if not account_ids:
+            return []
+
+        statement = (
+            f"SELECT * FROM {self.summary_table_name} "
+            f"WHERE id IN ({', '.join('?' for _ in account_ids)})"
+        )
+        with self.datastore.transaction(commit=False) as c:
+            c.execute(statement, [account_id.hex for account_id in account_ids])
+            summaries = {
+                summary.id: summary for summary in map(self._to_summary, c.fetchall())
+            }
+        return [summaries[i] for i in account_ids if i in summaries]
+
+    def select_summaries_by_email(self, email_address: str) -> list[BankAccountSummary]:
+        statement = (
+            f"SELECT * FROM {self.summary_table_name} " "WHERE lower(email_address) = ?"
+        )
+        with self.datastore.transaction(commit=False) as c:
+            c.execute(statement, [email_address.lower()])
+            return [self._to_summary(row) for row in c.fetchall()]
+
+    def search_summaries(
+        self, name_prefix: str, limit: int
+    ) -> list[BankAccountSummary]:
+        # A range rather than LIKE, which SQLite won't use the index for.
+        name_prefix = name_prefix.lower()
+        statement = (
+            f"SELECT * FROM {self.summary_table_name} "
+            "WHERE lower(full_name) >= ? AND lower(full_name) < ? "
+            "ORDER BY lower(full_name), id LIMIT ?"
+        )
+        with self.datastore.transaction(commit=False) as c:
+            c.execute(statement, [name_prefix, name_prefix + "\U0010ffff", limit])
+            return [self._to_summary(row) for row in c.fetchall()]
+
+    def replace_summaries(
+        self,
+        application_name: str,
+        summaries: typing.Iterable[BankAccountSummary],
+        notification_id: int,
+    ) -> None:
+        with self.datastore.transaction(commit=True) as c:
+            c.execute(
+                "DELETE FROM tracking WHERE application_name=?", (application_name,)
+            )
+            c.execute(f"DELETE FROM {self.summary_table_name}")
+            self._upsert_summaries(c, summaries)
+            if notification_id:
+                c.execute(
+                    self.insert_tracking_statement, (application_name, notification_id)
+                )
+
+    @staticmethod
+    def _to_summary(row: typing.Mapping[str, typing.Any]) -> BankAccountSummary:
+        return BankAccountSummary(
+            id=UUID(row["id"]),
+            full_name=row["full_name"],
+            email_address=row["email_address"],
+            balance=Decimal(row["balance"]),
+            overdraft_limit=Decimal(row["overdraft_limit"]),
+            is_closed=bool(row["is_closed"]),
+            version=row["version"],
+        )
+
+
+class PostgresBankAccountSummaryRecorder(
+    PostgresProcessRecorder, BankAccountSummaryRecorder
+):
+    def __init__(
+        self,
+        datastore: PostgresDatastore,
+        events_table_name: str,
+        tracking_table_name: str,
+        summary_table_name: str = "bank_account_summary",
+    ):
+        self.check_table_name_length(summary_table_name, datastore.schema)
+        self.summary_table_name = summary_table_name
+        super().__init__(datastore, events_table_name, tracking_table_name)
+        self.upsert_summary_statement = (
+            f"INSERT INTO {self.summary_table_name} "
+            "VALUES (%s, %s, %s, %s, %s, %s, %s) "
+            "ON CONFLICT (id) DO UPDATE SET "
+            "full_name=EXCLUDED.full_name, "
+            "email_address=EXCLUDED.email_address, "
+            "balance=EXCLUDED.balance, "
+            "overdraft_limit=EXCLUDED.overdraft_limit, "
+            "is_closed=EXCLUDED.is_closed, "
+            "version=EXCLUDED.version"
+        )
+        self.insert_summaries_statement = (
+            f"INSERT INTO {self.summary_table_name} "
+            "SELECT * FROM unnest("
+            "%s::uuid[], %s::text[], %s::text[], %s::numeric[], "
+            "%s::numeric[], %s::boolean[], %s::bigint[])"
+        )
+
+    def construct_create_table_statements(self) -> list[str]:
+        statements = super().construct_create_table_statements()
+        statements.extend(
+            [
+                "CREATE TABLE IF NOT EXISTS "
+                f"{self.summary_table_name} ("
+                "id uuid PRIMARY KEY, "
+                "full_name text NOT NULL, "
+                "email_address text NOT NULL, "
+                "balance numeric NOT NULL, "
+                "overdraft_limit numeric NOT NULL, "
+                "is_closed boolean NOT NULL, "
+                "version bigint NOT NULL)",
+                "CREATE INDEX IF NOT EXISTS "
+                f"{self.summary_table_name}_email_idx "
+                f"ON {self.summary_table_name} (lower(email_address))",
+                # text_pattern_ops lets LIKE 'prefix%' use the index whatever
+                # the database collation.
+                "CREATE INDEX IF NOT EXISTS "
+                f"{self.summary_table_name}_full_name_idx "
+                f"ON {self.summary_table_name} (lower(full_name) text_pattern_ops)",
+            ]
+        )
+        return statements
+
+    def _insert_events(
+        self,
+        c: PostgresCursor,
+        stored_events: list[StoredEvent],
+        **kwargs: typing.Any,
+    ) -> typing.Optional[typing.Sequence[int]]:
+        notification_ids = super()._insert_events(c, stored_events, **kwargs)
+        for summary in kwargs.get(SUMMARIES_KWARG, ()):
+            c.execute(
+                self.upsert_summary_statement,
+                (
+                    summary.id,
+                    summary.full_name,
+                    summary.email_address,
+                    summary.balance,
+                    summary.overdraft_limit,
+                    summary.is_closed,
+                    summary.version,
+                ),
+            )
+        return notification_ids
+
+    def select_summaries(
+        self, account_ids: typing.Sequence[UUID]
+    ) -> list[BankAccountSummary]:
+        if not account_ids:
+            return []
+
+        statement = f"SELECT * FROM {self.summary_table_name} WHERE id = ANY(%s)"
+        with self.datastore.transaction(commit=False) as c:
+            c.execute(statement, [list(account_ids)])
+            summaries = {
+                summary.id: summary for summary in map(self._to_summary, c.fetchall())
+            }
+        return [summaries[i] for i in account_ids if i in summaries]
+
+    def select_summaries_by_email(self, email_address: str) -> list[BankAccountSummary]:
+        statement = (
+            f"SELECT * FROM {self.summary_table_name} "
+            "WHERE lower(email_address) = lower(%s)"
+        )
+        with self.datastore.transaction(commit=False) as c:
+            c.execute(statement, [email_address])
+            return [self._to_summary(row) for row in c.fetchall()]
+
+    def search_summaries(
+        self, name_prefix: str, limit: int
+    ) -> list[BankAccountSummary]:
+        pattern = (
+            name_prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        )
+        statement = (
+            f"SELECT * FROM {self.summary_table_name} "
+            "WHERE lower(full_name) LIKE lower(%s) "
+            "ORDER BY lower(full_name), id LIMIT %s"
+        )
+        with self.datastore.transaction(commit=False) as c:
+            c.execute(statement, [pattern + "%", limit])
+            return [self._to_summary(row) for row in c.fetchall()]
+
+    def replace_summaries(
+        self,
+        application_name: str,
+        summaries: typing.Iterable[BankAccountSummary],
+        notification_id: int,
+    ) -> None:
+        summaries = list(summaries)
+        with self.datastore.transaction(commit=True) as c:
+            c.execute(
+                f"DELETE FROM {self.tracking_table_name} WHERE application_name = %s",
+                (application_name,),
+            )
+            c.execute(f"DELETE FROM {self.summary_table_name}")
+            if summaries:
+                c.execute(
+                    self.insert_summaries_statement,
+                    (
+                        [summary.id for summary in summaries],
+                        [summary.full_name for summary in summaries],
+                        [summary.email_address for summary in summaries],
+                        [summary.balance for summary in summaries],
+                        [summary.overdraft_limit for summary in summaries],
+                        [summary.is_closed for summary in summaries],
+                        [summary.version for summary in summaries],
+                    ),
+                )
+            if notification_id:
+                c.execute(
+                    f"INSERT INTO {self.tracking_table_name} VALUES (%s, %s)",
+                    (application_name, notification_id),
+                )
+
+    @staticmethod
+    def _to_summary(row: typing.Mapping[str, typing.Any]) -> BankAccountSummary:
+        return BankAccountSummary(
+            id=row["id"],
+            full_name=row["full_name"],
+            email_address=row["email_address"],
+            balance=row["balance"],
+            overdraft_limit=row["overdraft_limit"],
+            is_closed=row["is_closed"],
+            version=row["version"],
+        )
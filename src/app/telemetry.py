@@ -0,0 +1,194 @@
+import contextlib
+import functools
+import threading
+import time
+import typing
+
+from bisect import bisect_left
+
+T = typing.TypeVar("T")
+
+# Upper bounds of the histogram buckets, from 50µs to 10s for durations and
+# powers of two for counts and sizes.
+DURATION_BUCKETS = (
+    0.00005,
+    0.0001,
+    0.00025,
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+SIZE_BUCKETS = tuple(float(2**exponent) for exponent in range(17))
+
+SPAN_DURATION_METRIC = "span_duration_seconds"
+
+_NO_SPAN = contextlib.nullcontext()
+
+
+class Telemetry:
+    """Records spans and histograms. This one records nothing.
+
+    Spans time a block of code under a name such as
+    ``BankAccounts.deposit_funds``, and histograms take values such as the
+    number of events replayed by a read. Callers skip spans, and work that
+    only feeds telemetry, when ``enabled`` is false, so subclasses that
+    record anything must set it.
+    """
+
+    enabled = False
+
+    def span(self, name: str) -> typing.ContextManager[None]:
+        return _NO_SPAN
+
+    def observe(self, name: str, value: float) -> None:
+        pass
+
+
+class _Histogram:
+    def __init__(self, bounds: typing.Sequence[float]) -> None:
+        self.bounds = bounds
+        # One count per bucket, and one for values above the last bound.
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+
+class _PrometheusSpan:
+    __slots__ = ("telemetry", "name", "started")
+
+    def __init__(self, telemetry: "PrometheusTelemetry", name: str) -> None:
+        self.telemetry = telemetry
+        self.name = name
+
+    def __enter__(self) -> None:
+        self.started = time.perf_counter()
+
+    def __exit__(self, *exc_info: typing.Any) -> None:
+        self.telemetry._observe(
+            SPAN_DURATION_METRIC,
+            (("span", self.name),),
+            time.perf_counter() - self.started,
+            DURATION_BUCKETS,
+        )
+
+
+class PrometheusTelemetry(Telemetry):
+    """Keeps histograms in memory and renders them for Prometheus to scrape.
+
+    Span durations go to one ``span_duration_seconds`` histogram, labelled
+    with the span name. Each observed name is a histogram of its own, so
+    names must be valid Prometheus metric names. The histograms are per
+    process, and Prometheus sums them across workers.
+    """
+
+    enabled = True
+
+    def __init__(self) -> None:
+        self._histograms: dict[tuple[str, tuple[tuple[str, str], ...]], _Histogram] = {}
+        self._lock = threading.Lock()
+
+    def span(self, name: str) -> typing.ContextManager[None]:
+        return _PrometheusSpan(self, name)
+
+    def observe(self, name: str, value: float) -> None:
+        self._observe(name, (), value, SIZE_BUCKETS)
+
+    def _observe(
+        self,
+        name: str,
+        labels: tuple[tuple[str, str], ...],
+        value: float,
+        bounds: typing.Sequence[float],
+    ) -> None:
+        key = (name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = _Histogram(bounds)
+            histogram.observe(value)
+
+    def render(self) -> str:
+        """The histograms in the Prometheus text exposition format"""
+        with self._lock:
+            histograms = sorted(
+                (key, list(histogram.counts), histogram.sum, histogram.bounds)
+                for key, histogram in self._histograms.items()
+            )
+
+        lines = []
+        previous_name = None
+        for (name, labels), counts, total, bounds in histograms:
+            if name != previous_name:
+                lines.append(f"# TYPE {name} histogram")
+                previous_name = name
+
+            cumulative = 0
+            for bound, count in zip([*bounds, float("inf")], counts):
+                cumulative += count
+                bucket_labels = _format_labels((*labels, ("le", _format_value(bound))))
+                lines.append(f"{name}_bucket{bucket_labels} {cumulative}")
+
+            lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(total)}")
+            lines.append(f"{name}_count{_format_labels(labels)} {cumulative}")
+
+        return "".join(f"{line}\n" for line in lines)
+
+
+def _format_labels(labels: typing.Iterable[tuple[str, str]]) -> str:
+    formatted = ",".join(
+        '{}="{}"'.format(
+            name,
+            value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"),
+        )
+        for name, value in labels
+    )
+    return f"{{{formatted}}}" if formatted else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value))
+
+
+_telemetry = Telemetry()
+
+
+def get_telemetry() -> Telemetry:
+    return _telemetry
+
+
+def set_telemetry(telemetry: Telemetry) -> None:
+    """Use ``telemetry`` for the spans and histograms of this process"""
+    global _telemetry
+    _telemetry = telemetry
+
+
+def traced(method: typing.Callable[..., T]) -> typing.Callable[..., T]:
+    """Record a span named after the method around each call"""
+    name = method.__qualname__
+
+    @functools.wraps(method)
+    def wrapper(*args: typing.Any, **kwargs: typing.Any) -> T:
+        telemetry = _telemetry
+        if not telemetry.enabled:
+            return method(*args, **kwargs)
+
+        with telemetry.span(name):
+            return method(*args, **kwargs)
+
+    return wrapper
@@ -0,0 +1,178 @@
+import typing
+
+from datetime import datetime
+from decimal import Decimal
+from uuid import UUID
+
+import orjson
+from eventsourcing.application import Application
+from eventsourcing.persistence import Transcoder
+from eventsourcing.utils import resolve_topic
+
+from src.domain.money import Money
+
+TRANSCODER_TOPIC = "TRANSCODER_TOPIC"
+
+# orjson writes these natively, the rest go through _encode_value().
+_NATIVE_TYPES = frozenset([str, int, float, bool, type(None)])
+
+_ENCODERS: dict[type, tuple[str, typing.Callable[[typing.Any], str]]] = {
+    UUID: ("$u", lambda value: value.hex),
+    Decimal: ("$d", str),
+    datetime: ("$t", datetime.isoformat),
+}
+
+_DECODERS: dict[str, typing.Callable[[str], typing.Any]] = {
+    "$u": UUID,
+    "$d": Decimal,
+    "$t": datetime.fromisoformat,
+    # Same as Money(*value).to_decimal(), without constructing the Money.
+    "$m": lambda value: Decimal(value[0]).scaleb(-value[1]),
+}
+
+
+class OrjsonTranscoder(Transcoder):
+    """Encodes objects as JSON with orjson.
+
+    UUID, Decimal and datetime values are written as single-key objects
+    such as ``{"$d": "5.00"}``, which are much shorter than the
+    ``{"_type_": ..., "_data_": ...}`` objects JSONTranscoder writes for
+    them. Keys of dicts that start with "$" are written with another "$"
+    in front, so a dict such as ``{"$d": "5.00"}`` is never taken for a
+    tagged value. Other registered transcodings keep the JSONTranscoder
+    format, and JSON written by JSONTranscoder can still be decoded.
+    """
+
+    options = (
+        orjson.OPT_PASSTHROUGH_DATACLASS
+        | orjson.OPT_PASSTHROUGH_DATETIME
+        | orjson.OPT_PASSTHROUGH_SUBCLASS
+    )
+
+    encoders = _ENCODERS
+
+    def encode(self, obj: typing.Any) -> bytes:
+        return orjson.dumps(
+            self._encode_value(obj), default=self._default, option=self.options
+        )
+
+    def decode(self, data: bytes) -> typing.Any:
+        return self._decode_value(orjson.loads(data))
+
+    def _encode_value(self, value: typing.Any) -> typing.Any:
+        value_type = type(value)
+
+        if value_type in _NATIVE_TYPES:
+            return value
+        if value_type is dict:
+            return {
+                ("$" + key if key[:1] == "$" else key): (
+                    item if type(item) in _NATIVE_TYPES else self._encode_value(item)
+                )
+                for key, item in value.items()
+            }
+        if value_type is list or value_type is tuple:
+            return [self._encode_value(item) for item in value]
+
+        try:
+            tag, encode = self.encoders[value_type]
+        except KeyError:
+            pass
+        else:
+            return {tag: encode(value)}
+
+        try:
+            transcoding = self.types[value_type]
+        except KeyError:
+            # Left to orjson, which calls _default() if it can't encode it.
+            return value
+        else:
+            return {
+                "_type_": transcoding.name,
+                "_data_": self._encode_value(transcoding.encode(value)),
+            }
+
+    def _default(self, value: typing.Any) -> typing.Any:
+        raise TypeError(
+            f"Object of type {type(value)} is not "
+            "serializable. Please define and register "
+            "a custom transcoding for this type."
+        )
+
+    def _decode_value(self, value: typing.Any) -> typing.Any:
+        # Containers from orjson.loads() are new, so are decoded in place.
+        value_type = type(value)
+
+        if value_type is list:
+            for index, item in enumerate(value):
+                if isinstance(item, (dict, list)):
+                    value[index] = self._decode_value(item)
+            return value
+        if value_type is not dict:
+            return value
+
+        if len(value) == 1:
+            ((key, item),) = value.items()
+            try:
+                decode = _DECODERS[key]
+            except KeyError:
+                pass
+            else:
+                return decode(item)
+
+        has_escaped_keys = False
+        for key, item in value.items():
+            if isinstance(item, (dict, list)):
+                value[key] = self._decode_value(item)
+            if key[:2] == "$$":
+                has_escaped_keys = True
+
+        if has_escaped_keys:
+            return {
+                (key[1:] if key[:2] == "$$" else key): item
+                for key, item in value.items()
+            }
+
+        if len(value) == 2 and "_type_" in value and "_data_" in value:
+            try:
+                transcoding = self.names[value["_type_"]]
+            except KeyError:
+                raise TypeError(
+                    f"Data serialized with name '{value['_type_']}' is not "
+                    "deserializable. Please register a "
+                    "custom transcoding for this type."
+                ) from None
+            return transcoding.decode(value["_data_"])
+
+        return value
+
+
+def _encode_minor_units(value: Decimal) -> list[int]:
+    money = Money.from_decimal(value)
+    return [money.minor_units, money.scale]
+
+
+class MinorUnitsTranscoder(OrjsonTranscoder):
+    """OrjsonTranscoder that writes Decimal values as integer minor units.
+
+    ``Decimal("12.34")`` is written as ``{"$m": [1234, 2]}``, so amounts are
+    stored as integers with their scale. Decoding gives back the same
+    Decimal, and OrjsonTranscoder can read either form.
+    """
+
+    encoders = {
+        **_ENCODERS,
+        Decimal: ("$m", _encode_minor_units),
+    }
+
+
+def construct_transcoder(application: Application) -> Transcoder:
+    """The transcoder named by the application's TRANSCODER_TOPIC setting"""
+    topic = application.env.get(TRANSCODER_TOPIC)
+    if topic:
+        transcoder = resolve_topic(topic)()
+    else:
+        transcoder = application.factory.transcoder()
+
+    application.register_transcodings(transcoder)
+    return transcoder
@@ -0,0 +1,26 @@
+from uuid import NAMESPACE_URL, UUID, uuid5
+
+from eventsourcing.domain import Aggregate, AggregateCreated
+
+
+class IdempotencyKeyUsed(AggregateCreated):
+    key: str
+
+
+class IdempotencyKey(Aggregate):
+    """Records that a command with a client's idempotency key was applied.
+
+    The id is derived from the key, so saving a second aggregate for the
+    same key conflicts with the first, like any other version conflict.
+    """
+
+    def __init__(self, key: str):
+        self.key = key
+
+    @staticmethod
+    def create_id(key: str) -> UUID:
+        return uuid5(NAMESPACE_URL, f"/idempotency-keys/{key}")
+
+    @classmethod
+    def use(cls, key: str) -> "IdempotencyKey":
+        return cls._create(IdempotencyKeyUsed, id=cls.create_id(key), key=key)
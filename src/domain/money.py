@@ -0,0 +1,31 @@
+from dataclasses import dataclass
+from decimal import Decimal
+
+
+@dataclass(frozen=True, slots=True)
+class Money:
+    """An amount as an integer number of minor units at a decimal scale.
+
+    ``Money(1234, 2)`` is 12.34. Conversion to and from ``Decimal`` is exact
+    and keeps the number of decimal places, so ``Decimal("5")`` and
+    ``Decimal("5.00")`` come back as they went in.
+    """
+
+    minor_units: int
+    scale: int = 2
+
+    @classmethod
+    def from_decimal(cls, amount: Decimal) -> "Money":
+        if not amount.is_finite():
+            raise ValueError(f"Not a finite amount: {amount}")
+
+        exponent = amount.as_tuple().exponent
+        assert isinstance(exponent, int)
+        scale = max(-exponent, 0)
+        return cls(int(amount.scaleb(scale)), scale)
+
+    def to_decimal(self) -> Decimal:
+        return Decimal(self.minor_units).scaleb(-self.scale)
+
+    def __str__(self) -> str:
+        return str(self.to_decimal())
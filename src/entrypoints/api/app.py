@@ -1,24 +1,61 @@
 import logging
+import typing
+
+from contextlib import asynccontextmanager
 
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse
+
+from src.app.container import Container
+from src.app.telemetry import PrometheusTelemetry, set_telemetry
 
+from .compression import CompressionMiddleware, ResponseCompressor
 from .config import settings
 from .graphql import router as graphql_router
+from .metrics import router as metrics_router
 
 logger = logging.getLogger(__name__)
 
 
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> typing.AsyncIterator[None]:
+    container = Container()
+    container.start()
+    app.state.container = container
+
+    try:
+        yield
+    finally:
+        container.stop()
+
+        compressor = getattr(app.state, "response_compressor", None)
+        if compressor is not None:
+            stats = compressor.stats
+            logger.info(
+                "Compressed %d responses, saving %d of %d bytes in %.3fs of CPU time",
+                stats.compressed,
+                stats.bytes_saved,
+                stats.bytes_in,
+                stats.cpu_seconds,
+            )
+
+
 def create_app() -> FastAPI:
     # Logging
     log_level = getattr(logging, settings.log_level.upper(), logging.INFO)
     logging.basicConfig(level=log_level)
     logger.setLevel(log_level)
 
+    # Telemetry
+    if settings.telemetry == "prometheus":
+        set_telemetry(PrometheusTelemetry())
+
     # App
     _app = FastAPI(
         title="Eventsourcing Demo API",
+        default_response_class=ORJSONResponse,
+        lifespan=lifespan,
     )
     _app.add_middleware(
         CORSMiddleware,
@@ -27,9 +64,27 @@ def create_app() -> FastAPI:
         allow_methods=["*"],
         allow_origins=["*"],
     )
-    _app.add_middleware(GZipMiddleware, minimum_size=1000)
+
+    # Compression
+    algorithms = split_setting(settings.compression_algorithms)
+    if algorithms:
+        compressor = ResponseCompressor(
+            algorithms,
+            minimum_size=settings.compression_minimum_size,
+            large_size=settings.compression_large_size,
+            exclude_paths=split_setting(settings.compression_exclude_paths),
+            exclude_clients=split_setting(settings.compression_exclude_clients),
+        )
+        _app.state.response_compressor = compressor
+        _app.add_middleware(CompressionMiddleware, compressor=compressor)
 
     # Routes
     _app.include_router(graphql_router, prefix="/graphql")
+    _app.include_router(metrics_router)
 
     return _app
+
+
+def split_setting(value: str) -> list[str]:
+    """The items of a comma-separated setting"""
+    return [item.strip() for item in value.split(",") if item.strip()]
@@ -1,3 +1,4 @@
+import datetime
 import logging
 import typing
 
@@ -6,13 +7,56 @@ from uuid import UUID
 
 import strawberry
 from strawberry import relay
-from strawberry.relay import to_base64
-
-from src.app.bank_accounts import BankAccounts
+from strawberry.dataloader import DataLoader
+from strawberry.relay import from_base64, to_base64
+
+from src.app.async_bank_accounts import AsyncBankAccounts
+from src.app.statistics_recorders import BankStatistics as BankStatisticsData
+from src.app.summary_recorders import BankAccountSummary
+from src.domain.bank_account import BankAccount as BankAccountAggregate
+from src.domain.bank_account import TransactionAppended
+from src.domain.exceptions import AccountNotFoundError
 from src.entrypoints.api.common import graphql
+from src.entrypoints.api.cost import FieldCost
 
 logger = logging.getLogger(__name__)
 
+MAX_TRANSACTIONS_PAGE_SIZE = 100
+MAX_SEARCH_RESULTS = 100
+
+# Reading or saving a bank account costs about as much as replaying it.
+ACCOUNT_COST = 10
+
+FIELD_COSTS = {
+    ("Query", "bankAccount"): FieldCost(ACCOUNT_COST),
+    ("Query", "bankAccounts"): FieldCost(ACCOUNT_COST, ("ids",)),
+    ("Query", "bankAccountAt"): FieldCost(2 * ACCOUNT_COST),
+    ("Query", "bankAccountsByEmail"): FieldCost(ACCOUNT_COST),
+    ("Query", "searchBankAccounts"): FieldCost(1, ("first",), default_size=20),
+    ("Query", "_entities"): FieldCost(ACCOUNT_COST, ("representations",)),
+    ("BankAccount", "transactions"): FieldCost(
+        1, ("first", "last"), default_size=MAX_TRANSACTIONS_PAGE_SIZE
+    ),
+    ("BankAccountMutations", "open"): FieldCost(ACCOUNT_COST),
+    ("BankAccountMutations", "depositFunds"): FieldCost(ACCOUNT_COST),
+    ("BankAccountMutations", "withdrawFunds"): FieldCost(ACCOUNT_COST),
+    ("BankAccountMutations", "transferFunds"): FieldCost(2 * ACCOUNT_COST),
+    ("BankAccountMutations", "applyTransactions"): FieldCost(ACCOUNT_COST, ("input",)),
+    ("BankAccountMutations", "setOverdraftLimit"): FieldCost(ACCOUNT_COST),
+    ("BankAccountMutations", "close"): FieldCost(ACCOUNT_COST),
+}
+
+
+def get_bank_accounts(info: strawberry.Info) -> AsyncBankAccounts:
+    return info.context["container"].async_bank_accounts
+
+
+@strawberry.input
+class ApplyTransactionInput:
+    bank_account: relay.GlobalID
+    # Negative amounts are withdrawals
+    amount: Decimal
+
 
 @strawberry.input
 class CloseBankAccountInput:
@@ -23,6 +67,8 @@ class CloseBankAccountInput:
 class DepositFundsInput:
     bank_account: relay.GlobalID
     amount: Decimal
+    # Repeating a deposit with the same key doesn't deposit again
+    idempotency_key: typing.Optional[str] = None
 
 
 @strawberry.input
@@ -42,22 +88,26 @@ class TransferBankAccountFundsInput:
     credit_bank_account: relay.GlobalID
     debit_bank_account: relay.GlobalID
     amount: Decimal
+    idempotency_key: typing.Optional[str] = None
 
 
 @strawberry.input
 class WithdrawFundsFromBankAccountInput:
     bank_account: relay.GlobalID
     amount: Decimal
+    idempotency_key: typing.Optional[str] = None
 
 
 @strawberry.type
 class BankAccountMutations:
     @strawberry.mutation
-    def open(self, input: OpenBankAccountInput) -> graphql.MutationResponse:
-        accounts = BankAccounts()
+    async def open(
+        self, info: strawberry.Info, input: OpenBankAccountInput
+    ) -> graphql.MutationResponse:
+        accounts = get_bank_accounts(info)
 
         try:
-            id = accounts.open_account(input.full_name, input.email)
+            id = await accounts.open_account(input.full_name, input.email)
 
             return graphql.Success(
                 entities=[to_base64("BankAccount", str(id))],
@@ -70,15 +120,18 @@ class BankAccountMutations:
             return graphql.Error(message=e.__class__.__name__)
 
     @strawberry.mutation
-    def deposit_funds(
+    async def deposit_funds(
         self,
+        info: strawberry.Info,
         input: DepositFundsInput,
     ) -> graphql.MutationResponse:
         account_id = input.bank_account.node_id
-        accounts = BankAccounts()
+        accounts = get_bank_accounts(info)
 
         try:
-            accounts.deposit_funds(UUID(account_id), input.amount)
+            await accounts.deposit_funds(
+                UUID(account_id), input.amount, input.idempotency_key
+            )
 
             return graphql.Success(
                 entities=[],
@@ -91,13 +144,15 @@ class BankAccountMutations:
             return graphql.Error(message=e.__class__.__name__)
 
     @strawberry.mutation
-    def withdraw_funds(
-        self, input: WithdrawFundsFromBankAccountInput
+    async def withdraw_funds(
+        self, info: strawberry.Info, input: WithdrawFundsFromBankAccountInput
     ) -> graphql.MutationResponse:
-        accounts = BankAccounts()
+        accounts = get_bank_accounts(info)
 
         try:
-            accounts.withdraw_funds(UUID(input.bank_account.node_id), input.amount)
+            await accounts.withdraw_funds(
+                UUID(input.bank_account.node_id), input.amount, input.idempotency_key
+            )
 
             return graphql.Success(
                 entities=[],
@@ -108,16 +163,17 @@ class BankAccountMutations:
             return graphql.Error(message=e.__class__.__name__)
 
     @strawberry.mutation
-    def transfer_funds(
-        self, input: TransferBankAccountFundsInput
+    async def transfer_funds(
+        self, info: strawberry.Info, input: TransferBankAccountFundsInput
     ) -> graphql.MutationResponse:
-        accounts = BankAccounts()
+        accounts = get_bank_accounts(info)
 
         try:
-            accounts.transfer_funds(
+            await accounts.transfer_funds(
                 UUID(input.debit_bank_account.node_id),
                 UUID(input.credit_bank_account.node_id),
                 input.amount,
+                input.idempotency_key,
             )
 
             return graphql.Success(
@@ -129,13 +185,42 @@ class BankAccountMutations:
             return graphql.Error(message=e.__class__.__name__)
 
     @strawberry.mutation
-    def set_overdraft_limit(
-        self, input: SetBankAccountOverdraftLimitInput
+    async def apply_transactions(
+        self, info: strawberry.Info, input: list[ApplyTransactionInput]
+    ) -> list[graphql.MutationResponse]:
+        accounts = get_bank_accounts(info)
+
+        try:
+            outcomes = await accounts.apply_transactions(
+                [(UUID(item.bank_account.node_id), item.amount) for item in input]
+            )
+        except Exception as e:
+            # Raised before any transaction was saved.
+            logger.info("Error applying transactions: %s", e)
+
+            return [graphql.Error(message=e.__class__.__name__) for _ in input]
+
+        return [
+            graphql.Success(
+                entities=[item.bank_account],
+                is_message_displayable=True,
+                message="Transaction applied",
+            )
+            if outcome.is_committed
+            else graphql.Error(message=outcome.error.__class__.__name__)
+            for item, outcome in zip(input, outcomes)
+        ]
+
+    @strawberry.mutation
+    async def set_overdraft_limit(
+        self, info: strawberry.Info, input: SetBankAccountOverdraftLimitInput
     ) -> graphql.MutationResponse:
-        accounts = BankAccounts()
+        accounts = get_bank_accounts(info)
 
         try:
-            accounts.set_overdraft_limit(UUID(input.bank_account.node_id), input.limit)
+            await accounts.set_overdraft_limit(
+                UUID(input.bank_account.node_id), input.limit
+            )
 
             return graphql.Success(
                 entities=[],
@@ -146,11 +231,13 @@ class BankAccountMutations:
             return graphql.Error(message=e.__class__.__name__)
 
     @strawberry.mutation
-    def close(self, input: CloseBankAccountInput) -> graphql.MutationResponse:
-        accounts = BankAccounts()
+    async def close(
+        self, info: strawberry.Info, input: CloseBankAccountInput
+    ) -> graphql.MutationResponse:
+        accounts = get_bank_accounts(info)
 
         try:
-            accounts.close_account(UUID(input.bank_account.node_id))
+            await accounts.close_account(UUID(input.bank_account.node_id))
 
             return graphql.Success(
                 entities=[],
@@ -168,6 +255,34 @@ class Mutation:
         return BankAccountMutations()
 
 
+@strawberry.type
+class Transaction:
+    amount: Decimal
+    timestamp: datetime.datetime
+    transaction_id: typing.Optional[UUID]
+    version: int
+
+    @classmethod
+    def from_event(cls, event: TransactionAppended) -> "Transaction":
+        return cls(
+            amount=event.amount,
+            timestamp=event.timestamp,
+            transaction_id=event.transaction_id,
+            version=event.originator_version,
+        )
+
+    @staticmethod
+    def to_cursor(version: int) -> str:
+        return to_base64("Transaction", version)
+
+    @staticmethod
+    def from_cursor(cursor: str) -> int:
+        type_name, version = from_base64(cursor)
+        if type_name != "Transaction":
+            raise ValueError(f"Invalid cursor: {cursor}")
+        return int(version)
+
+
 @strawberry.type
 class BankAccount(relay.Node):
     id: relay.NodeID[UUID]
@@ -177,35 +292,208 @@ class BankAccount(relay.Node):
     overdraft_limit: typing.Optional[Decimal] = None
 
     @classmethod
-    def resolve_nodes(
+    def from_aggregate(cls, account: BankAccountAggregate) -> "BankAccount":
+        return cls(
+            id=account.id,
+            balance=account.balance,
+            email=account.email_address,
+            full_name=account.full_name,
+            overdraft_limit=account.overdraft_limit,
+        )
+
+    @classmethod
+    def from_summary(cls, summary: BankAccountSummary) -> "BankAccount":
+        return cls(
+            id=summary.id,
+            balance=summary.balance,
+            email=summary.email_address,
+            full_name=summary.full_name,
+            overdraft_limit=summary.overdraft_limit,
+        )
+
+    @strawberry.field
+    async def transactions(
+        self,
+        info: strawberry.Info,
+        first: typing.Optional[int] = None,
+        after: typing.Optional[str] = None,
+        last: typing.Optional[int] = None,
+        before: typing.Optional[str] = None,
+    ) -> relay.Connection[Transaction]:
+        """Keyset pagination on the account's event versions"""
+        if first is not None and last is not None:
+            raise ValueError("Pass either first or last, not both")
+
+        desc = last is not None
+        limit = last if last is not None else first
+        if limit is None:
+            limit = MAX_TRANSACTIONS_PAGE_SIZE
+        if not 0 <= limit <= MAX_TRANSACTIONS_PAGE_SIZE:
+            raise ValueError(
+                f"Page size must be between 0 and {MAX_TRANSACTIONS_PAGE_SIZE}"
+            )
+
+        gt = Transaction.from_cursor(after) if after is not None else None
+        lte = Transaction.from_cursor(before) - 1 if before is not None else None
+
+        # One extra row tells whether there is another page.
+        events = await get_bank_accounts(info).get_transactions(
+            self.id, limit + 1, gt=gt, lte=lte, desc=desc
+        )
+        has_more = len(events) > limit
+        events = events[:limit]
+        if desc:
+            events.reverse()
+
+        edges = [
+            relay.Edge(
+                cursor=Transaction.to_cursor(event.originator_version),
+                node=Transaction.from_event(event),
+            )
+            for event in events
+        ]
+        page_info = relay.PageInfo(
+            has_next_page=before is not None if desc else has_more,
+            has_previous_page=has_more if desc else after is not None,
+            start_cursor=edges[0].cursor if edges else None,
+            end_cursor=edges[-1].cursor if edges else None,
+        )
+        return relay.Connection(edges=edges, page_info=page_info)
+
+    @classmethod
+    async def resolve_nodes(
         cls,
         *,
         info: strawberry.Info,
         node_ids: typing.Iterable[str],
         required: bool = False,
     ):
-        nodes = []
-        accounts = BankAccounts()
+        account_ids = []
 
         for node_id in node_ids:
             try:
-                account = accounts.get_account(UUID(node_id))
+                account_ids.append(UUID(node_id))
+            except ValueError:
+                if required:
+                    raise AccountNotFoundError(node_id)
+
+                account_ids.append(None)
+
+        # Batched with any other node lookups in this request.
+        loader = info.context["bank_account_loader"]
+        valid_ids = [i for i in account_ids if i is not None]
+        found = dict(zip(valid_ids, await loader.load_many(valid_ids)))
+
+        nodes = []
 
-                instance = BankAccount(
-                    id=account.id,
-                    balance=account.balance,
-                    email=account.email_address,
-                    full_name=account.full_name,
-                    overdraft_limit=account.overdraft_limit,
-                )
+        for account_id in account_ids:
+            node = found.get(account_id)
 
-                nodes.append(instance)
-            except Exception:
-                return None
+            if node is None and required:
+                raise AccountNotFoundError(account_id)
+
+            nodes.append(node)
 
         return nodes
 
 
+@strawberry.type
+class BankStatistics:
+    account_count: int
+    closed_account_count: int
+    overdrawn_account_count: int
+    transaction_count: int
+    total_deposits: Decimal
+    total_withdrawals: Decimal
+    total_liabilities: Decimal
+    total_overdrawn: Decimal
+
+    @classmethod
+    def from_data(cls, statistics: BankStatisticsData) -> "BankStatistics":
+        return cls(
+            account_count=statistics.account_count,
+            closed_account_count=statistics.closed_account_count,
+            overdrawn_account_count=statistics.overdrawn_account_count,
+            transaction_count=statistics.transaction_count,
+            total_deposits=statistics.total_deposits,
+            total_withdrawals=statistics.total_withdrawals,
+            total_liabilities=statistics.total_liabilities,
+            total_overdrawn=statistics.total_overdrawn,
+        )
+
+
+def create_bank_account_loader(
+    accounts: AsyncBankAccounts,
+    read_consistency: str,
+) -> DataLoader[UUID, BankAccount | None]:
+    async def load(account_ids: list[UUID]) -> list[BankAccount | None]:
+        if read_consistency == "strong":
+            aggregates = await accounts.get_accounts(account_ids)
+            found = {i: BankAccount.from_aggregate(a) for i, a in aggregates.items()}
+        else:
+            summaries = await accounts.get_summaries(account_ids)
+            found = {i: BankAccount.from_summary(s) for i, s in summaries.items()}
+
+        return [found.get(account_id) for account_id in account_ids]
+
+    return DataLoader(load_fn=load)
+
+
 @strawberry.type
 class Query:
     bankAccount: BankAccount = relay.node()
+    bankAccounts: list[typing.Optional[BankAccount]] = relay.node()
+
+    @strawberry.field
+    async def bank_accounts_by_email(
+        self, info: strawberry.Info, email: str
+    ) -> list[BankAccount]:
+        """Bank accounts opened with the email address, ignoring case"""
+        summaries = await get_bank_accounts(info).get_summaries_by_email(email)
+        return [BankAccount.from_summary(summary) for summary in summaries]
+
+    @strawberry.field
+    async def search_bank_accounts(
+        self, info: strawberry.Info, name_prefix: str, first: int = 20
+    ) -> list[BankAccount]:
+        """Bank accounts whose full name starts with the prefix, ignoring case"""
+        if not 0 <= first <= MAX_SEARCH_RESULTS:
+            raise ValueError(f"first must be between 0 and {MAX_SEARCH_RESULTS}")
+
+        summaries = await get_bank_accounts(info).search_summaries(name_prefix, first)
+        return [BankAccount.from_summary(summary) for summary in summaries]
+
+    @strawberry.field
+    async def bank_statistics(self, info: strawberry.Info) -> BankStatistics:
+        """Running totals across all bank accounts, as projected so far"""
+        statistics = await get_bank_accounts(info).get_statistics()
+        return BankStatistics.from_data(statistics)
+
+    @strawberry.field
+    async def bank_account_at(
+        self,
+        info: strawberry.Info,
+        id: relay.GlobalID,
+        version: typing.Optional[int] = None,
+        at: typing.Optional[datetime.datetime] = None,
+    ) -> typing.Optional[BankAccount]:
+        """The bank account as of an event version or a point in time"""
+        if (version is None) == (at is None):
+            raise ValueError("Pass either version or at")
+
+        try:
+            account_id = UUID(id.node_id)
+        except ValueError:
+            return None
+
+        accounts = get_bank_accounts(info)
+        try:
+            if version is not None:
+                account = await accounts.get_account(account_id, version=version)
+            else:
+                assert at is not None
+                account = await accounts.get_account_at(account_id, at)
+        except AccountNotFoundError:
+            return None
+
+        return BankAccount.from_aggregate(account)
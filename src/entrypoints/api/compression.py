@@ -0,0 +1,220 @@
+import gzip
+import importlib.util
+import logging
+import time
+import typing
+
+from dataclasses import dataclass
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from src.app.telemetry import get_telemetry
+
+logger = logging.getLogger(__name__)
+
+# Content codings, and the package each needs when it isn't in the
+# standard library.
+ALGORITHMS = {"zstd": "zstandard", "br": "brotli", "gzip": None}
+
+# Levels for responses below and from the large size. Compressing large
+# responses takes most of the CPU time, so they get the fastest levels.
+LEVELS = {"zstd": (3, 1), "br": (5, 1), "gzip": (6, 1)}
+
+
+@dataclass(frozen=True)
+class ResponseCompressionStats:
+    compressed: int
+    skipped: int
+    bytes_in: int
+    bytes_out: int
+    cpu_seconds: float
+
+    @property
+    def bytes_saved(self) -> int:
+        return self.bytes_in - self.bytes_out
+
+
+class ResponseCompressor:
+    """Chooses how to compress each response, and compresses it.
+
+    Of the content codings a client accepts, the one with the highest
+    q-value is used, ties going to the earliest in ``algorithms``.
+    Algorithms whose package isn't installed are left out. Responses
+    smaller than ``minimum_size`` are sent as they are, and those of at
+    least ``large_size`` bytes are compressed at a faster level. Responses
+    to requests for ``exclude_paths`` (and the paths below them) or from
+    ``exclude_clients`` addresses are never compressed.
+    """
+
+    def __init__(
+        self,
+        algorithms: typing.Sequence[str] = ("zstd", "br", "gzip"),
+        minimum_size: int = 1000,
+        large_size: int = 65536,
+        exclude_paths: typing.Sequence[str] = (),
+        exclude_clients: typing.Sequence[str] = (),
+    ) -> None:
+        for algorithm in algorithms:
+            if algorithm not in ALGORITHMS:
+                raise ValueError(f"Unknown compression algorithm: {algorithm}")
+
+        self.algorithms = [
+            algorithm for algorithm in algorithms if _is_available(algorithm)
+        ]
+        self.minimum_size = minimum_size
+        self.large_size = large_size
+        self.exclude_paths = [path.rstrip("/") for path in exclude_paths]
+        self.exclude_clients = set(exclude_clients)
+        self._compressed = 0
+        self._skipped = 0
+        self._bytes_in = 0
+        self._bytes_out = 0
+        self._cpu_seconds = 0.0
+
+    @property
+    def stats(self) -> ResponseCompressionStats:
+        return ResponseCompressionStats(
+            compressed=self._compressed,
+            skipped=self._skipped,
+            bytes_in=self._bytes_in,
+            bytes_out=self._bytes_out,
+            cpu_seconds=self._cpu_seconds,
+        )
+
+    def is_excluded(self, scope: Scope) -> bool:
+        client = scope.get("client")
+        if client and client[0] in self.exclude_clients:
+            return True
+
+        path = scope["path"]
+        return any(
+            path == excluded or path.startswith(f"{excluded}/")
+            for excluded in self.exclude_paths
+        )
+
+    def negotiate(self, accept_encoding: str) -> str | None:
+        """The algorithm to use for a request's Accept-Encoding header"""
+        weights = {}
+        for coding in accept_encoding.split(","):
+            name, _, parameters = coding.partition(";")
+            weight = 1.0
+            for parameter in parameters.split(";"):
+                key, _, value = parameter.strip().partition("=")
+                if key == "q":
+                    try:
+                        weight = float(value)
+                    except ValueError:
+                        weight = 0.0
+            weights[name.strip().lower()] = weight
+
+        default = weights.get("*", 0.0)
+        chosen, chosen_weight = None, 0.0
+        for algorithm in self.algorithms:
+            weight = weights.get(algorithm, default)
+            if weight > chosen_weight:
+                chosen, chosen_weight = algorithm, weight
+        return chosen
+
+    def compress(self, algorithm: str, body: bytes) -> bytes:
+        """``body`` compressed, or as it is if it's too small or doesn't shrink"""
+        compressed = body
+
+        if len(body) >= self.minimum_size:
+            small_level, large_level = LEVELS[algorithm]
+            level = large_level if len(body) >= self.large_size else small_level
+
+            started = time.thread_time()
+            with get_telemetry().span(f"ResponseCompressor.{algorithm}"):
+                compressed = _compress(algorithm, body, level)
+            self._cpu_seconds += time.thread_time() - started
+
+            if len(compressed) >= len(body):
+                compressed = body
+
+        if compressed is body:
+            self._skipped += 1
+        else:
+            self._compressed += 1
+        self._bytes_in += len(body)
+        self._bytes_out += len(compressed)
+
+        return compressed
+
+
+class CompressionMiddleware:
+    """Compresses whole response bodies with a ResponseCompressor.
+
+    Streamed responses are sent as they are, since their size isn't known
+    when the level is chosen.
+    """
+
+    def __init__(self, app: ASGIApp, compressor: ResponseCompressor) -> None:
+        self.app = app
+        self.compressor = compressor
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or self.compressor.is_excluded(scope):
+            await self.app(scope, receive, send)
+            return
+
+        algorithm = self.compressor.negotiate(
+            Headers(scope=scope).get("accept-encoding", "")
+        )
+        start: Message | None = None
+
+        async def send_compressed(message: Message) -> None:
+            nonlocal start
+
+            if message["type"] == "http.response.start":
+                # Held until the body shows whether to compress it.
+                start = message
+                return
+
+            if start is None:
+                await send(message)
+                return
+
+            headers = MutableHeaders(raw=start["headers"])
+            if (
+                message["type"] == "http.response.body"
+                and not message.get("more_body", False)
+                and "content-encoding" not in headers
+            ):
+                headers.add_vary_header("Accept-Encoding")
+                body = message.get("body", b"")
+                if algorithm is not None:
+                    compressed = self.compressor.compress(algorithm, body)
+                    if compressed is not body:
+                        headers["Content-Encoding"] = algorithm
+                        headers["Content-Length"] = str(len(compressed))
+                        message = {**message, "body": compressed}
+
+            await send(start)
+            start = None
+            await send(message)
+
+        await self.app(scope, receive, send_compressed)
+
+
+def _is_available(algorithm: str) -> bool:
+    package = ALGORITHMS[algorithm]
+    if package is None or importlib.util.find_spec(package):
+        return True
+
+    logger.warning(
+        "Not offering %s compression, which needs the %s package", algorithm, package
+    )
+    return False
+
+
+def _compress(algorithm: str, body: bytes, level: int) -> bytes:
+    if algorithm == "zstd":
+        import zstandard
+
+        return zstandard.ZstdCompressor(level=level).compress(body)
+    if algorithm == "br":
+        import brotli
+
+        return brotli.compress(body, quality=level)
+    return gzip.compress(body, compresslevel=level, mtime=0)
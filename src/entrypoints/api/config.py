@@ -1,8 +1,36 @@
+import typing
+
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
 class Settings(BaseSettings, case_sensitive=False):
     log_level: str
+    # "strong" replays bank accounts' events, "eventual" reads them from the
+    # summary projection, which may lag behind the latest commands.
+    read_consistency: typing.Literal["eventual", "strong"] = "strong"
+    # "prometheus" records spans and histograms, served on /metrics.
+    telemetry: typing.Literal["none", "prometheus"] = "none"
+    # Parsed and validated GraphQL documents kept, 0 to parse every request.
+    document_cache_maxsize: int = 1000
+    # Queries kept for automatic persisted queries, 0 to turn them off.
+    persisted_queries_maxsize: int = 10000
+    # Response compression algorithms in order of preference, "" for none.
+    compression_algorithms: str = "zstd,br,gzip"
+    compression_minimum_size: int = 1000
+    # Responses from this size are compressed at a faster level.
+    compression_large_size: int = 65536
+    # Comma-separated paths and client addresses to send uncompressed.
+    compression_exclude_paths: str = ""
+    compression_exclude_clients: str = ""
+    # Deepest field nesting allowed in an operation, 0 for no limit.
+    max_query_depth: int = 10
+    # Highest cost allowed for an operation, 0 for no limit. See FIELD_COSTS
+    # in bank_account/schema.py. Bulk reads and writes cost 10 an account.
+    max_query_cost: int = 0
+    # Query cost each client can spend per second, 0 for no limit, and the
+    # most it can spend at once.
+    client_cost_per_second: float = 0
+    client_cost_burst: int = 2000
 
     model_config = SettingsConfigDict(env_prefix="DM_")
 
@@ -0,0 +1,247 @@
+import math
+import time
+import typing
+
+from dataclasses import dataclass
+
+from eventsourcing.application import LRUCache
+from graphql import (
+    FieldNode,
+    FragmentDefinitionNode,
+    FragmentSpreadNode,
+    GraphQLError,
+    GraphQLInterfaceType,
+    GraphQLNamedType,
+    GraphQLObjectType,
+    GraphQLSchema,
+    InlineFragmentNode,
+    SelectionSetNode,
+    get_named_type,
+    is_composite_type,
+)
+from graphql import ExecutionResult as GraphQLExecutionResult
+from graphql.execution.values import get_argument_values
+from graphql.utilities import get_operation_ast
+from strawberry.extensions import SchemaExtension
+
+
+@dataclass(frozen=True)
+class FieldCost:
+    """What resolving a field costs.
+
+    ``cost`` is charged, together with the cost of the selections below
+    the field, once for each item when the field takes a list or a page
+    size. The first of ``size_arguments`` given is the number of items: a
+    list's length, or a page size. ``default_size`` is used when none is.
+    """
+
+    cost: int
+    size_arguments: tuple[str, ...] = ()
+    default_size: int = 1
+
+
+# Fields not listed cost 1 if they return objects, and nothing otherwise.
+DEFAULT_OBJECT_FIELD_COST = FieldCost(1)
+DEFAULT_LEAF_FIELD_COST = FieldCost(0)
+
+FieldCosts = typing.Mapping[tuple[str, str], FieldCost]
+
+
+def get_query_cost(
+    schema: GraphQLSchema,
+    selection_set: SelectionSetNode,
+    parent_type: GraphQLNamedType,
+    fragments: typing.Mapping[str, FragmentDefinitionNode],
+    variables: typing.Mapping[str, typing.Any],
+    field_costs: FieldCosts,
+) -> int:
+    """The cost of resolving a validated selection set.
+
+    Every selection is counted, whether or not a @skip or @include
+    directive leaves it out, so this is an upper bound.
+    """
+    cost = 0
+
+    for selection in selection_set.selections:
+        if isinstance(selection, FieldNode):
+            if not isinstance(
+                parent_type, (GraphQLObjectType, GraphQLInterfaceType)
+            ) or (selection.name.value not in parent_type.fields):
+                # Introspection, and __typename on unions.
+                continue
+
+            field = parent_type.fields[selection.name.value]
+            field_type = get_named_type(field.type)
+            field_cost = field_costs.get((parent_type.name, selection.name.value))
+            if field_cost is None:
+                field_cost = (
+                    DEFAULT_OBJECT_FIELD_COST
+                    if is_composite_type(field_type)
+                    else DEFAULT_LEAF_FIELD_COST
+                )
+
+            size = field_cost.default_size
+            if field_cost.size_arguments:
+                try:
+                    arguments = get_argument_values(field, selection, dict(variables))
+                except GraphQLError:
+                    # Left for execution to report.
+                    arguments = {}
+                for name in field_cost.size_arguments:
+                    value = arguments.get(name)
+                    if value is not None:
+                        size = len(value) if isinstance(value, list) else int(value)
+                        break
+                size = max(size, 0)
+
+            children = 0
+            if selection.selection_set is not None:
+                children = get_query_cost(
+                    schema,
+                    selection.selection_set,
+                    field_type,
+                    fragments,
+                    variables,
+                    field_costs,
+                )
+            cost += size * (field_cost.cost + children)
+
+        elif isinstance(selection, InlineFragmentNode):
+            fragment_type = parent_type
+            if selection.type_condition is not None:
+                fragment_type = schema.get_type(selection.type_condition.name.value)
+            cost += get_query_cost(
+                schema,
+                selection.selection_set,
+                fragment_type,
+                fragments,
+                variables,
+                field_costs,
+            )
+
+        elif isinstance(selection, FragmentSpreadNode):
+            fragment = fragments[selection.name.value]
+            cost += get_query_cost(
+                schema,
+                fragment.selection_set,
+                schema.get_type(fragment.type_condition.name.value),
+                fragments,
+                variables,
+                field_costs,
+            )
+
+    return cost
+
+
+class RateBudgets:
+    """Token buckets of query cost, one per client.
+
+    Each client can spend up to ``burst`` at once, and gets back
+    ``per_second``. The buckets of up to ``maxsize`` clients are kept,
+    least recently used first out, and a client without one starts full.
+    """
+
+    def __init__(self, per_second: float, burst: float, maxsize: int = 10000):
+        self.per_second = per_second
+        self.burst = burst
+        self._buckets: LRUCache[str, tuple[float, float]] = LRUCache(maxsize=maxsize)
+
+    def spend(self, client: str, cost: float) -> float | None:
+        """Spends ``cost`` of the client's budget, or returns the seconds
+        until the client can afford it.
+        """
+        now = time.monotonic()
+        try:
+            tokens, updated = self._buckets.get(client)
+        except KeyError:
+            tokens = self.burst
+        else:
+            tokens = min(self.burst, tokens + (now - updated) * self.per_second)
+
+        if cost > tokens:
+            self._buckets.put(client, (tokens, now))
+            if cost > self.burst:
+                return math.inf
+            return (cost - tokens) / self.per_second
+
+        self._buckets.put(client, (tokens - cost, now))
+        return None
+
+
+class QueryCostLimiter(SchemaExtension):
+    """Rejects operations that cost more than ``max_cost`` before executing.
+
+    The cost is worked out from the validated document and the variables,
+    with ``field_costs``. With ``rate_budgets``, each client's operations
+    are also charged to its budget, and rejected with status 429 when it
+    runs out.
+    """
+
+    def __init__(
+        self,
+        field_costs: FieldCosts,
+        max_cost: int | None = None,
+        rate_budgets: RateBudgets | None = None,
+    ) -> None:
+        self.field_costs = field_costs
+        self.max_cost = max_cost
+        self.rate_budgets = rate_budgets
+
+    def on_execute(self) -> typing.Iterator[None]:
+        execution_context = self.execution_context
+        document = execution_context.graphql_document
+        assert document is not None
+
+        operation = get_operation_ast(document, execution_context.operation_name)
+        schema = execution_context.schema._schema
+        if operation is not None:
+            root_type = schema.get_root_type(operation.operation)
+            assert root_type is not None
+            fragments = {
+                definition.name.value: definition
+                for definition in document.definitions
+                if isinstance(definition, FragmentDefinitionNode)
+            }
+            cost = get_query_cost(
+                schema,
+                operation.selection_set,
+                root_type,
+                fragments,
+                execution_context.variables or {},
+                self.field_costs,
+            )
+
+            error = self.admit(cost)
+            if error is not None:
+                execution_context.result = GraphQLExecutionResult(
+                    data=None, errors=[error]
+                )
+
+        yield
+
+    def admit(self, cost: int) -> GraphQLError | None:
+        if self.max_cost is not None and cost > self.max_cost:
+            return GraphQLError(
+                f"Query cost {cost} is over the limit of {self.max_cost}",
+                extensions={"code": "QUERY_TOO_COSTLY", "cost": cost},
+            )
+
+        context = self.execution_context.context
+        if self.rate_budgets is None or not isinstance(context, dict):
+            return None
+
+        request = context.get("request")
+        client = request.client.host if request and request.client else "unknown"
+        retry_after = self.rate_budgets.spend(client, cost)
+        if retry_after is None:
+            return None
+
+        response = context.get("response")
+        if response is not None:
+            response.status_code = 429
+            if math.isfinite(retry_after):
+                response.headers["Retry-After"] = str(math.ceil(retry_after))
+        return GraphQLError(
+            "Rate budget exceeded",
+            extensions={"code": "RATE_LIMITED", "cost": cost},
+        )
@@ -0,0 +1,56 @@
+import typing
+
+from inspect import isawaitable
+
+from graphql import GraphQLResolveInfo
+from strawberry.extensions import SchemaExtension
+from strawberry.extensions.tracing.utils import should_skip_tracing
+
+from src.app.telemetry import get_telemetry
+
+
+class TelemetryExtension(SchemaExtension):
+    """Records spans for parsing, validating and executing each operation,
+    and for each field with a resolver of its own, named after its type
+    and field, such as ``BankAccountMutations.transferFunds``.
+    """
+
+    def on_parse(self) -> typing.Iterator[None]:
+        with get_telemetry().span("graphql.parse"):
+            yield
+
+    def on_validate(self) -> typing.Iterator[None]:
+        with get_telemetry().span("graphql.validate"):
+            yield
+
+    def on_execute(self) -> typing.Iterator[None]:
+        with get_telemetry().span("graphql.execute"):
+            yield
+
+    def resolve(
+        self,
+        _next: typing.Callable,
+        root: typing.Any,
+        info: GraphQLResolveInfo,
+        *args: typing.Any,
+        **kwargs: typing.Any,
+    ) -> typing.Any:
+        # Fields resolved without a span stay synchronous.
+        if not get_telemetry().enabled or should_skip_tracing(_next, info):
+            return _next(root, info, *args, **kwargs)
+
+        return self._resolve_in_span(_next, root, info, *args, **kwargs)
+
+    async def _resolve_in_span(
+        self,
+        _next: typing.Callable,
+        root: typing.Any,
+        info: GraphQLResolveInfo,
+        *args: typing.Any,
+        **kwargs: typing.Any,
+    ) -> typing.Any:
+        with get_telemetry().span(f"{info.parent_type.name}.{info.field_name}"):
+            result = _next(root, info, *args, **kwargs)
+            if isawaitable(result):
+                result = await result
+            return result
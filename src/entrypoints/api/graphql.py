@@ -1,7 +1,18 @@
 import strawberry
-from strawberry.fastapi import GraphQLRouter
+from fastapi import Request
+from strawberry.extensions import (
+    ParserCache,
+    QueryDepthLimiter,
+    SchemaExtension,
+    ValidationCache,
+)
 
 from src.entrypoints.api.bank_account import schema as bank_account_schema
+from src.entrypoints.api.config import settings
+from src.entrypoints.api.cost import QueryCostLimiter, RateBudgets
+from src.entrypoints.api.extensions import TelemetryExtension
+from src.entrypoints.api.persisted_queries import PersistedQueryRouter
+from src.entrypoints.api.routers import OrjsonGraphQLRouter
 
 
 @strawberry.type
@@ -14,9 +25,62 @@ class Query(bank_account_schema.Query):
     ...
 
 
+async def get_context(request: Request) -> dict:
+    container = request.app.state.container
+
+    return {
+        "container": container,
+        "bank_account_loader": bank_account_schema.create_bank_account_loader(
+            container.async_bank_accounts, settings.read_consistency
+        ),
+    }
+
+
+def get_extensions() -> list[type[SchemaExtension] | SchemaExtension]:
+    extensions: list[type[SchemaExtension] | SchemaExtension] = [TelemetryExtension]
+    if settings.document_cache_maxsize > 0:
+        # Clients send the same few operations over and over.
+        extensions += [
+            ParserCache(maxsize=settings.document_cache_maxsize),
+            ValidationCache(maxsize=settings.document_cache_maxsize),
+        ]
+
+    if settings.max_query_depth > 0:
+        extensions.append(QueryDepthLimiter(max_depth=settings.max_query_depth))
+
+    # Operations are costed and admitted after validation, as the cost of
+    # some fields depends on variables such as the number of ids.
+    rate_budgets = None
+    if settings.client_cost_per_second > 0:
+        rate_budgets = RateBudgets(
+            per_second=settings.client_cost_per_second,
+            burst=settings.client_cost_burst,
+        )
+    if settings.max_query_cost > 0 or rate_budgets is not None:
+        extensions.append(
+            QueryCostLimiter(
+                bank_account_schema.FIELD_COSTS,
+                max_cost=settings.max_query_cost or None,
+                rate_budgets=rate_budgets,
+            )
+        )
+
+    return extensions
+
+
 schema = strawberry.federation.Schema(
     Query,
     Mutation,
     enable_federation_2=True,
+    extensions=get_extensions(),
 )
-router = GraphQLRouter(schema)
+
+router: OrjsonGraphQLRouter
+if settings.persisted_queries_maxsize > 0:
+    router = PersistedQueryRouter(
+        schema,
+        context_getter=get_context,
+        persisted_queries_maxsize=settings.persisted_queries_maxsize,
+    )
+else:
+    router = OrjsonGraphQLRouter(schema, context_getter=get_context)
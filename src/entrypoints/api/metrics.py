@@ -0,0 +1,15 @@
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import PlainTextResponse
+
+from src.app.telemetry import PrometheusTelemetry, get_telemetry
+
+router = APIRouter()
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def metrics() -> PlainTextResponse:
+    telemetry = get_telemetry()
+    if not isinstance(telemetry, PrometheusTelemetry):
+        raise HTTPException(status_code=404, detail="Metrics are not enabled")
+
+    return PlainTextResponse(telemetry.render(), media_type="text/plain; version=0.0.4")
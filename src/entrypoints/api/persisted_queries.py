@@ -0,0 +1,99 @@
+import hashlib
+import typing
+
+from eventsourcing.application import LRUCache
+from graphql import GraphQLError
+from strawberry.http import GraphQLRequestData, parse_request_data
+from strawberry.http.exceptions import HTTPException
+from strawberry.types import ExecutionResult
+
+from .routers import OrjsonGraphQLRouter
+
+PERSISTED_QUERY_NOT_FOUND = "PersistedQueryNotFound"
+
+
+class PersistedQueryNotFound(Exception):
+    pass
+
+
+class PersistedQueryRouter(OrjsonGraphQLRouter):
+    """Serves automatic persisted queries as well as query documents.
+
+    A request's ``extensions.persistedQuery.sha256Hash`` may be sent in
+    place of the query. An unknown hash gets a ``PersistedQueryNotFound``
+    error, and the client sends the hash again with the query, which is
+    kept for later requests. Up to ``persisted_queries_maxsize`` queries
+    are kept, least recently used first out.
+    """
+
+    def __init__(
+        self, *args: typing.Any, persisted_queries_maxsize: int, **kwargs: typing.Any
+    ) -> None:
+        super().__init__(*args, **kwargs)
+        self.persisted_queries: LRUCache[str, str] = LRUCache(
+            maxsize=persisted_queries_maxsize
+        )
+
+    def should_render_graphql_ide(self, request: typing.Any) -> bool:
+        # GET requests for persisted queries have no query either.
+        return "extensions" not in request.query_params and (
+            super().should_render_graphql_ide(request)
+        )
+
+    async def parse_http_body(self, request: typing.Any) -> GraphQLRequestData:
+        content_type = request.content_type or ""
+
+        if request.method == "GET":
+            data = self.parse_query_params(request.query_params)
+            if isinstance(data.get("extensions"), str):
+                data["extensions"] = self.parse_json(data["extensions"])
+        elif "application/json" in content_type:
+            data = self.parse_json(await request.get_body())
+        else:
+            return await super().parse_http_body(request)
+
+        request_data = parse_request_data(data)
+        persisted_query = (data.get("extensions") or {}).get("persistedQuery")
+        if persisted_query is not None:
+            request_data.query = self.get_persisted_query(
+                persisted_query, request_data.query
+            )
+        return request_data
+
+    def get_persisted_query(
+        self, persisted_query: typing.Mapping[str, typing.Any], query: str | None
+    ) -> str:
+        if persisted_query.get("version") != 1:
+            raise HTTPException(400, "Unsupported persisted query version")
+
+        sha256_hash = persisted_query.get("sha256Hash")
+        if not isinstance(sha256_hash, str):
+            raise HTTPException(400, "Persisted query has no sha256Hash")
+
+        if query is None:
+            try:
+                return self.persisted_queries.get(sha256_hash)
+            except KeyError:
+                raise PersistedQueryNotFound(sha256_hash)
+
+        if hashlib.sha256(query.encode()).hexdigest() != sha256_hash:
+            raise HTTPException(400, "Provided sha256Hash does not match query")
+
+        self.persisted_queries.put(sha256_hash, query)
+        return query
+
+    async def execute_operation(
+        self, request: typing.Any, context: typing.Any, root_value: typing.Any
+    ) -> ExecutionResult:
+        try:
+            return await super().execute_operation(request, context, root_value)
+        except PersistedQueryNotFound:
+            return ExecutionResult(
+                data=None,
+                errors=[
+                    GraphQLError(
+                        PERSISTED_QUERY_NOT_FOUND,
+                        extensions={"code": "PERSISTED_QUERY_NOT_FOUND"},
+                    )
+                ],
+            )
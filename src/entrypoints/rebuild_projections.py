@@ -0,0 +1,85 @@
+"""Rebuilds projections of the bank accounts from the start of the event log.
+
+Run with ``python -m src.entrypoints.rebuild_projections`` and the same
+persistence settings as the API, optionally naming the projections to
+rebuild. The API can keep running: its projections wait while the rebuilt
+state is saved, then carry on from the position the rebuild read up to.
+
+With ``--processes N``, the accounts are split into N partitions folded by
+a pool of processes, which needs SQLite or Postgres. Each partition's
+progress is recorded, so a rebuild that fails resumes where it got to when
+run again with the same number of processes.
+"""
+
+import argparse
+
+from eventsourcing.system import SingleThreadedRunner
+
+from src.app.bank_account_statistics import BankAccountStatistics
+from src.app.bank_account_summaries import BankAccountSummaries
+from src.app.bank_accounts import BankAccounts
+from src.app.catchup import CatchUpProgress, catch_up_in_parallel
+from src.app.container import system
+
+PROJECTIONS = {
+    "summaries": BankAccountSummaries,
+    "statistics": BankAccountStatistics,
+}
+
+
+def print_progress(progress: CatchUpProgress) -> None:
+    read = progress.position / progress.stop if progress.stop else 1
+    print(
+        f"  partition {progress.partition}: "
+        f"{read:.0%} of the log read, "
+        f"{progress.events:,} events folded"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("projections", nargs="*", help=" or ".join(PROJECTIONS))
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--processes", type=int, default=1)
+    args = parser.parse_args()
+    projections = args.projections or list(PROJECTIONS)
+    for projection in projections:
+        if projection not in PROJECTIONS:
+            parser.error(f"unknown projection: {projection}")
+
+    if args.processes > 1:
+        for projection in projections:
+            print(f"Rebuilding {projection}")
+            position = catch_up_in_parallel(
+                PROJECTIONS[projection],
+                BankAccounts,
+                args.processes,
+                batch_size=args.batch_size,
+                on_progress=print_progress,
+            )
+            print(f"Rebuilt {projection} up to notification {position:,}")
+        return
+
+    runner = SingleThreadedRunner(system)
+    runner.start()
+    try:
+        if "summaries" in projections:
+            count = runner.get(BankAccountSummaries).rebuild(
+                BankAccounts.name, batch_size=args.batch_size
+            )
+            print(f"Rebuilt summaries of {count:,} accounts")
+
+        if "statistics" in projections:
+            statistics = runner.get(BankAccountStatistics).rebuild(
+                BankAccounts.name, batch_size=args.batch_size
+            )
+            print(
+                f"Rebuilt statistics of {statistics.account_count:,} accounts "
+                f"and {statistics.transaction_count:,} transactions"
+            )
+    finally:
+        runner.stop()
+
+
+if __name__ == "__main__":
+    main()
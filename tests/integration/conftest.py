@@ -1,13 +1,17 @@
+import asyncio
+import gc
 import os
 import typing
 
 import psycopg2
 import pytest
 from contextlib import contextmanager
+from fastapi import FastAPI
 from httpx import AsyncClient
 from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
 
 from .utils import get_test_client
+from src.app.telemetry import PrometheusTelemetry, get_telemetry, set_telemetry
 from src.entrypoints.api.app import create_app as create_api_app
 
 DB_NAME = os.getenv("POSTGRES_DBNAME")
@@ -45,17 +49,45 @@ def pytest_configure(config) -> None:
 
 
 def pytest_unconfigure(config) -> None:
+    # Applications that tests don't close keep their connections until
+    # they're collected.
+    gc.collect()
     run_db_statement(f"DROP DATABASE {DB_NAME}")
 
 
 @pytest.fixture
-async def api_client() -> AsyncClient:
-    api_app = create_api_app()
+def prometheus_telemetry() -> typing.Iterator[PrometheusTelemetry]:
+    telemetry = get_telemetry()
+    prometheus_telemetry = PrometheusTelemetry()
+    set_telemetry(prometheus_telemetry)
+    try:
+        yield prometheus_telemetry
+    finally:
+        set_telemetry(telemetry)
+
+
+@pytest.fixture
+def api_app() -> FastAPI:
+    return create_api_app()
+
 
+@pytest.fixture
+async def api_client(api_app) -> AsyncClient:
     async for client in get_test_client(api_app):
         yield client
 
 
+@pytest.fixture
+def wait_for_projections(api_app):
+    """Waits until the projections have processed the commands sent so far"""
+
+    async def _wait_for_projections() -> None:
+        container = api_app.state.container
+        assert await asyncio.to_thread(container.wait_for_projections, 10)
+
+    return _wait_for_projections
+
+
 @pytest.fixture
 def graphql_test_client(api_client):
     async def _wrapped_test_client(
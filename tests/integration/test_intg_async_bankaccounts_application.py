@@ -0,0 +1,171 @@
+import asyncio
+from decimal import Decimal
+from uuid import uuid4
+
+import pytest
+
+from src.app.async_bank_accounts import AsyncBankAccounts
+from src.app.bank_accounts import BankAccounts
+from src.app.concurrency import RecordingConflict, RetryPolicy
+from src.app.dispatcher import CommandDispatcher, DispatcherStoppedError
+from src.domain.exceptions import AccountClosedError, InsufficientFundsError
+
+
+@pytest.fixture
+def async_accounts():
+    accounts = BankAccounts()
+    async_accounts = AsyncBankAccounts(accounts)
+
+    yield async_accounts
+
+    async_accounts.close()
+    accounts.close()
+
+
+async def test_async_bank_accounts(async_accounts):
+    account_id1 = await async_accounts.open_account("Alice", "alice@example.com")
+    account_id2 = await async_accounts.open_account("Bob", "bob@example.com")
+
+    # Concurrent calls run on the worker pool.
+    await asyncio.gather(
+        async_accounts.deposit_funds(account_id1, Decimal("50.00")),
+        async_accounts.deposit_funds(account_id2, Decimal("5.00")),
+    )
+    assert await async_accounts.get_balance(account_id1) == Decimal("50.00")
+
+    await async_accounts.withdraw_funds(account_id1, Decimal("20.00"))
+    await async_accounts.transfer_funds(account_id1, account_id2, Decimal("30.00"))
+
+    account = await async_accounts.get_account(account_id2)
+    assert account.balance == Decimal("35.00")
+
+    with pytest.raises(InsufficientFundsError):
+        await async_accounts.withdraw_funds(account_id1, Decimal("1.00"))
+
+    await async_accounts.set_overdraft_limit(account_id1, Decimal("100.00"))
+    assert await async_accounts.get_overdraft_limit(account_id1) == Decimal("100.00")
+
+    await async_accounts.close_account(account_id1)
+
+    with pytest.raises(AccountClosedError):
+        await async_accounts.deposit_funds(account_id1, Decimal("1.00"))
+
+
+def test_async_bank_accounts_max_workers():
+    accounts = BankAccounts(env={"POSTGRES_POOL_SIZE": "3"})
+    assert AsyncBankAccounts(accounts).max_workers == 13
+
+    accounts = BankAccounts(env={"BANK_ACCOUNTS_MAX_WORKERS": "4"})
+    assert AsyncBankAccounts(accounts).max_workers == 4
+
+
+async def test_async_bank_accounts_command_dispatcher(monkeypatch):
+    accounts = BankAccounts(env={"COMMAND_DISPATCHER_PARTITIONS": "4"})
+    async_accounts = AsyncBankAccounts(accounts)
+    assert async_accounts.dispatcher is not None
+
+    apply_calls = 0
+    apply_transactions = accounts.apply_transactions
+
+    def counting_apply_transactions(transactions):
+        nonlocal apply_calls
+        apply_calls += 1
+        return apply_transactions(transactions)
+
+    monkeypatch.setattr(accounts, "apply_transactions", counting_apply_transactions)
+
+    try:
+        account_id = await async_accounts.open_account("Alice", "alice@example.com")
+
+        # Concurrent deposits to one account are batched instead of conflicting.
+        await asyncio.gather(
+            *(
+                async_accounts.deposit_funds(account_id, Decimal("1.00"))
+                for _ in range(50)
+            )
+        )
+        account = await async_accounts.get_account(account_id)
+        assert account.balance == Decimal("50.00")
+        assert account.version == 51
+        assert apply_calls < 50
+        assert accounts.conflict_stats.conflicts == 0
+
+        # Each caller gets its own result.
+        results = await asyncio.gather(
+            async_accounts.withdraw_funds(account_id, Decimal("30.00")),
+            async_accounts.withdraw_funds(account_id, Decimal("30.00")),
+            return_exceptions=True,
+        )
+        assert results.count(None) == 1
+        assert any(isinstance(r, InsufficientFundsError) for r in results)
+        assert await async_accounts.get_balance(account_id) == Decimal("20.00")
+    finally:
+        async_accounts.close()
+        accounts.close()
+
+
+async def test_async_bank_accounts_command_dispatcher_partial_conflict(monkeypatch):
+    accounts = BankAccounts(
+        env={"COMMAND_DISPATCHER_PARTITIONS": "1", "COMMAND_RETRY_BASE_DELAY": "0"}
+    )
+    accounts.apply_transactions_chunk_size = 1
+    async_accounts = AsyncBankAccounts(accounts)
+
+    save = accounts.save
+    saves = 0
+
+    def save_conflicting_once(*objs, **kwargs):
+        nonlocal saves
+        saves += 1
+        if saves == 2:
+            raise RecordingConflict("Conflict")
+        return save(*objs, **kwargs)
+
+    try:
+        alice_id = await async_accounts.open_account("Alice", "alice@example.com")
+        bob_id = await async_accounts.open_account("Bob", "bob@example.com")
+        monkeypatch.setattr(accounts, "save", save_conflicting_once)
+
+        # One batch, whose first chunk is saved and second conflicts.
+        results = await asyncio.gather(
+            async_accounts.deposit_funds(alice_id, Decimal("1.00")),
+            async_accounts.deposit_funds(bob_id, Decimal("2.00")),
+            async_accounts.withdraw_funds(alice_id, Decimal("5.00")),
+            return_exceptions=True,
+        )
+
+        assert results[:2] == [None, None]
+        assert isinstance(results[2], InsufficientFundsError)
+        # Only the conflicted deposit is applied again.
+        assert saves == 3
+        assert await async_accounts.get_balance(alice_id) == Decimal("1.00")
+        assert await async_accounts.get_balance(bob_id) == Decimal("2.00")
+    finally:
+        async_accounts.close()
+        accounts.close()
+
+
+async def test_command_dispatcher_stop_fails_outstanding_transactions():
+    is_applying = asyncio.Event()
+
+    async def apply_transactions(transactions):
+        is_applying.set()
+        await asyncio.Event().wait()
+
+    dispatcher = CommandDispatcher(
+        apply_transactions,
+        num_partitions=1,
+        retry_policy=RetryPolicy(max_attempts=1, base_delay=0, max_delay=0),
+    )
+    applying = asyncio.create_task(dispatcher.submit(uuid4(), Decimal("1.00")))
+    await is_applying.wait()
+    queued = asyncio.create_task(dispatcher.submit(uuid4(), Decimal("2.00")))
+    await asyncio.sleep(0)
+
+    dispatcher.stop()
+
+    # Neither is left waiting forever.
+    results = await asyncio.wait_for(
+        asyncio.gather(applying, queued, return_exceptions=True), timeout=5
+    )
+    assert [type(result) for result in results] == [DispatcherStoppedError] * 2
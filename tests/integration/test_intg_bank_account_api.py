@@ -1,3 +1,22 @@
+import hashlib
+import json
+
+from datetime import datetime, timezone
+from decimal import Decimal
+from uuid import uuid4
+
+import pytest
+from strawberry.relay import to_base64
+
+from src.entrypoints.api.app import create_app
+from src.entrypoints.api.bank_account.schema import FIELD_COSTS
+from src.entrypoints.api.config import settings
+from src.entrypoints.api.cost import QueryCostLimiter, RateBudgets
+from src.entrypoints.api.graphql import schema
+
+from .utils import get_test_client
+
+
 async def test_bank_account_open_and_deposit_funds(fake, graphql_test_client):
     # Open bank account
     input_data = {
@@ -473,3 +492,880 @@ async def test_bank_account_close(fake, graphql_test_client):
     data = response.json()["data"]["bankAccount"]["close"]
 
     assert data["message"] == "Bank account closed"
+
+
+async def test_bank_accounts_query(fake, graphql_test_client):
+    # Open bank accounts
+    bank_account_global_ids = []
+
+    for _ in range(3):
+        input_data = {
+            "email": fake.email(),
+            "fullName": fake.name(),
+        }
+
+        response = await graphql_test_client(
+            """
+            mutation ($input: OpenBankAccountInput!) {
+                bankAccount {
+                    open(input: $input) {
+                        ... on Success {
+                            entities
+                        }
+                        ... on Error {
+                            message
+                        }
+                    }
+                }
+            }
+            """,
+            variables={"input": input_data},
+        )
+
+        data = response.json()["data"]["bankAccount"]["open"]
+        bank_account_global_ids.append(data["entities"][0])
+
+    # Query for bank accounts, including one that doesn't exist
+    missing_global_id = to_base64("BankAccount", str(uuid4()))
+
+    response = await graphql_test_client(
+        """
+        query ($ids: [GlobalID!]!) {
+            bankAccounts(ids: $ids) {
+                id
+                balance
+            }
+        }
+        """,
+        variables={"ids": [*bank_account_global_ids, missing_global_id]},
+    )
+
+    data = response.json()["data"]["bankAccounts"]
+
+    expected_data = [
+        *[{"id": id, "balance": "0.00"} for id in bank_account_global_ids],
+        None,
+    ]
+
+    assert data == expected_data
+
+
+async def test_bank_account_apply_transactions(fake, graphql_test_client):
+    # Open bank account
+    input_data = {
+        "email": fake.email(),
+        "fullName": fake.name(),
+    }
+
+    response = await graphql_test_client(
+        """
+        mutation ($input: OpenBankAccountInput!) {
+            bankAccount {
+                open(input: $input) {
+                    ... on Success {
+                        entities
+                    }
+                    ... on Error {
+                        message
+                    }
+                }
+            }
+        }
+        """,
+        variables={"input": input_data},
+    )
+
+    data = response.json()["data"]["bankAccount"]["open"]
+    bank_account_global_id = data["entities"][0]
+
+    # Apply transactions
+    input_data = [
+        {"bankAccount": bank_account_global_id, "amount": "100.00"},
+        {"bankAccount": bank_account_global_id, "amount": "-150.00"},
+        {"bankAccount": bank_account_global_id, "amount": "-40.00"},
+    ]
+
+    response = await graphql_test_client(
+        """
+        mutation ($input: [ApplyTransactionInput!]!) {
+            bankAccount {
+                applyTransactions(input: $input) {
+                    ... on Success {
+                        message
+                    }
+                    ... on Error {
+                        message
+                    }
+                }
+            }
+        }
+        """,
+        variables={"input": input_data},
+    )
+
+    data = response.json()["data"]["bankAccount"]["applyTransactions"]
+
+    assert data == [
+        {"message": "Transaction applied"},
+        {"message": "InsufficientFundsError"},
+        {"message": "Transaction applied"},
+    ]
+
+    # Query bank account
+    response = await graphql_test_client(
+        """
+        query ($id: GlobalID!) {
+            bankAccount(id: $id) {
+                balance
+            }
+        }
+        """,
+        variables={"id": bank_account_global_id},
+    )
+
+    data = response.json()["data"]["bankAccount"]
+
+    expected_data = {
+        "balance": "60.00",
+    }
+
+    assert data == expected_data
+
+
+async def test_bank_account_transactions(fake, graphql_test_client):
+    # Open bank account
+    input_data = {
+        "email": fake.email(),
+        "fullName": fake.name(),
+    }
+
+    response = await graphql_test_client(
+        """
+        mutation ($input: OpenBankAccountInput!) {
+            bankAccount {
+                open(input: $input) {
+                    ... on Success {
+                        entities
+                    }
+                    ... on Error {
+                        message
+                    }
+                }
+            }
+        }
+        """,
+        variables={"input": input_data},
+    )
+
+    data = response.json()["data"]["bankAccount"]["open"]
+    bank_account_global_id = data["entities"][0]
+
+    # Apply transactions
+    input_data = [
+        {"bankAccount": bank_account_global_id, "amount": f"{amount}.00"}
+        for amount in range(1, 6)
+    ]
+
+    await graphql_test_client(
+        """
+        mutation ($input: [ApplyTransactionInput!]!) {
+            bankAccount {
+                applyTransactions(input: $input) {
+                    ... on Success {
+                        message
+                    }
+                }
+            }
+        }
+        """,
+        variables={"input": input_data},
+    )
+
+    # Page through the transactions
+    async def get_transactions(**arguments):
+        response = await graphql_test_client(
+            """
+            query (
+                $id: GlobalID!
+                $first: Int
+                $after: String
+                $last: Int
+                $before: String
+            ) {
+                bankAccount(id: $id) {
+                    transactions(
+                        first: $first
+                        after: $after
+                        last: $last
+                        before: $before
+                    ) {
+                        edges {
+                            node {
+                                amount
+                                version
+                            }
+                        }
+                        pageInfo {
+                            hasNextPage
+                            hasPreviousPage
+                            startCursor
+                            endCursor
+                        }
+                    }
+                }
+            }
+            """,
+            variables={"id": bank_account_global_id, **arguments},
+        )
+        return response.json()["data"]["bankAccount"]["transactions"]
+
+    def get_amounts(connection):
+        return [edge["node"]["amount"] for edge in connection["edges"]]
+
+    page = await get_transactions(first=2)
+    assert get_amounts(page) == ["1.00", "2.00"]
+    assert page["edges"][0]["node"]["version"] == 2
+    assert page["pageInfo"]["hasNextPage"] is True
+    assert page["pageInfo"]["hasPreviousPage"] is False
+
+    page = await get_transactions(first=10, after=page["pageInfo"]["endCursor"])
+    assert get_amounts(page) == ["3.00", "4.00", "5.00"]
+    assert page["pageInfo"]["hasNextPage"] is False
+    assert page["pageInfo"]["hasPreviousPage"] is True
+
+    page = await get_transactions(last=2)
+    assert get_amounts(page) == ["4.00", "5.00"]
+    assert page["pageInfo"]["hasPreviousPage"] is True
+
+    page = await get_transactions(last=2, before=page["pageInfo"]["startCursor"])
+    assert get_amounts(page) == ["2.00", "3.00"]
+    assert page["pageInfo"]["hasNextPage"] is True
+
+
+async def test_bank_account_at(fake, graphql_test_client):
+    # Open bank account
+    input_data = {
+        "email": fake.email(),
+        "fullName": fake.name(),
+    }
+
+    response = await graphql_test_client(
+        """
+        mutation ($input: OpenBankAccountInput!) {
+            bankAccount {
+                open(input: $input) {
+                    ... on Success {
+                        entities
+                    }
+                    ... on Error {
+                        message
+                    }
+                }
+            }
+        }
+        """,
+        variables={"input": input_data},
+    )
+
+    data = response.json()["data"]["bankAccount"]["open"]
+    bank_account_global_id = data["entities"][0]
+
+    # Deposit funds twice
+    for _ in range(2):
+        await graphql_test_client(
+            """
+            mutation ($input: DepositFundsInput!) {
+                bankAccount {
+                    depositFunds(input: $input) {
+                        ... on Success {
+                            message
+                        }
+                    }
+                }
+            }
+            """,
+            variables={
+                "input": {"bankAccount": bank_account_global_id, "amount": "5.00"}
+            },
+        )
+
+    # Query bank account as of version 2, and as of now
+    query = """
+        query ($id: GlobalID!, $version: Int, $at: DateTime) {
+            bankAccountAt(id: $id, version: $version, at: $at) {
+                balance
+            }
+        }
+    """
+
+    response = await graphql_test_client(
+        query, variables={"id": bank_account_global_id, "version": 2}
+    )
+
+    assert response.json()["data"]["bankAccountAt"] == {"balance": "5.00"}
+
+    response = await graphql_test_client(
+        query,
+        variables={
+            "id": bank_account_global_id,
+            "at": datetime.now(timezone.utc).isoformat(),
+        },
+    )
+
+    assert response.json()["data"]["bankAccountAt"] == {"balance": "10.00"}
+
+    # Before the account was opened
+    response = await graphql_test_client(
+        query,
+        variables={"id": bank_account_global_id, "at": "2000-01-01T00:00:00Z"},
+    )
+
+    assert response.json()["data"]["bankAccountAt"] is None
+
+
+async def test_bank_statistics(fake, graphql_test_client, wait_for_projections):
+    query = """
+        query {
+            bankStatistics {
+                accountCount
+                closedAccountCount
+                overdrawnAccountCount
+                transactionCount
+                totalDeposits
+                totalWithdrawals
+                totalLiabilities
+                totalOverdrawn
+            }
+        }
+    """
+
+    await wait_for_projections()
+    response = await graphql_test_client(query)
+    before = response.json()["data"]["bankStatistics"]
+
+    # Open bank account
+    response = await graphql_test_client(
+        """
+        mutation ($input: OpenBankAccountInput!) {
+            bankAccount {
+                open(input: $input) {
+                    ... on Success {
+                        entities
+                    }
+                }
+            }
+        }
+        """,
+        variables={"input": {"email": fake.email(), "fullName": fake.name()}},
+    )
+
+    bank_account_global_id = response.json()["data"]["bankAccount"]["open"]["entities"][
+        0
+    ]
+
+    # Deposit funds
+    await graphql_test_client(
+        """
+        mutation ($input: DepositFundsInput!) {
+            bankAccount {
+                depositFunds(input: $input) {
+                    ... on Success {
+                        message
+                    }
+                }
+            }
+        }
+        """,
+        variables={"input": {"bankAccount": bank_account_global_id, "amount": "7.50"}},
+    )
+
+    await wait_for_projections()
+    response = await graphql_test_client(query)
+    after = response.json()["data"]["bankStatistics"]
+
+    assert after["accountCount"] == before["accountCount"] + 1
+    assert after["transactionCount"] == before["transactionCount"] + 1
+    assert Decimal(after["totalDeposits"]) == Decimal(
+        before["totalDeposits"]
+    ) + Decimal("7.50")
+    assert Decimal(after["totalLiabilities"]) == (
+        Decimal(before["totalLiabilities"]) + Decimal("7.50")
+    )
+    assert after["overdrawnAccountCount"] == before["overdrawnAccountCount"]
+
+
+async def test_bank_accounts_by_email_and_search(
+    fake, graphql_test_client, wait_for_projections
+):
+    full_name = f"{uuid4().hex} {fake.name()}"
+    email = fake.email()
+
+    response = await graphql_test_client(
+        """
+        mutation ($input: OpenBankAccountInput!) {
+            bankAccount {
+                open(input: $input) {
+                    ... on Success {
+                        entities
+                    }
+                }
+            }
+        }
+        """,
+        variables={"input": {"email": email, "fullName": full_name}},
+    )
+
+    bank_account_global_id = response.json()["data"]["bankAccount"]["open"]["entities"][
+        0
+    ]
+
+    await wait_for_projections()
+    response = await graphql_test_client(
+        """
+        query ($email: String!) {
+            bankAccountsByEmail(email: $email) {
+                id
+                email
+            }
+        }
+        """,
+        variables={"email": email.upper()},
+    )
+
+    assert {"id": bank_account_global_id, "email": email} in response.json()["data"][
+        "bankAccountsByEmail"
+    ]
+
+    query = """
+        query ($namePrefix: String!, $first: Int!) {
+            searchBankAccounts(namePrefix: $namePrefix, first: $first) {
+                id
+                fullName
+            }
+        }
+    """
+
+    response = await graphql_test_client(
+        query, variables={"namePrefix": full_name[:12], "first": 5}
+    )
+
+    assert response.json()["data"]["searchBankAccounts"] == [
+        {"id": bank_account_global_id, "fullName": full_name}
+    ]
+
+    response = await graphql_test_client(
+        query, variables={"namePrefix": full_name[:12], "first": 1000}
+    )
+
+    assert response.json()["errors"]
+
+
+async def test_bank_account_idempotent_deposit(fake, graphql_test_client):
+    response = await graphql_test_client(
+        """
+        mutation ($input: OpenBankAccountInput!) {
+            bankAccount {
+                open(input: $input) {
+                    ... on Success {
+                        entities
+                    }
+                }
+            }
+        }
+        """,
+        variables={"input": {"email": fake.email(), "fullName": fake.name()}},
+    )
+
+    bank_account_global_id = response.json()["data"]["bankAccount"]["open"]["entities"][
+        0
+    ]
+
+    # Deposit funds, retrying with the same key
+    idempotency_key = str(uuid4())
+    for _ in range(2):
+        response = await graphql_test_client(
+            """
+            mutation ($input: DepositFundsInput!) {
+                bankAccount {
+                    depositFunds(input: $input) {
+                        ... on Success {
+                            message
+                        }
+                    }
+                }
+            }
+            """,
+            variables={
+                "input": {
+                    "bankAccount": bank_account_global_id,
+                    "amount": "10.00",
+                    "idempotencyKey": idempotency_key,
+                }
+            },
+        )
+
+        assert response.json()["data"]["bankAccount"]["depositFunds"] == {
+            "message": "Funds deposited"
+        }
+
+    response = await graphql_test_client(
+        """
+        query ($id: GlobalID!) {
+            bankAccount(id: $id) {
+                balance
+            }
+        }
+        """,
+        variables={"id": bank_account_global_id},
+    )
+
+    assert response.json()["data"]["bankAccount"] == {"balance": "10.00"}
+
+
+async def test_metrics(fake, api_client, graphql_test_client, prometheus_telemetry):
+    response = await graphql_test_client(
+        """
+        mutation ($input: OpenBankAccountInput!) {
+            bankAccount {
+                open(input: $input) {
+                    ... on Success {
+                        entities
+                    }
+                }
+            }
+        }
+        """,
+        variables={"input": {"email": fake.email(), "fullName": fake.name()}},
+    )
+    assert response.json()["data"]["bankAccount"]["open"]["entities"]
+
+    response = await api_client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+
+    metrics = response.text
+    assert "# TYPE span_duration_seconds histogram" in metrics
+    for span in [
+        "graphql.parse",
+        "graphql.validate",
+        "graphql.execute",
+        "BankAccountMutations.open",
+        "BankAccounts.open_account",
+        "BankAccounts.save",
+    ]:
+        assert f'span_duration_seconds_count{{span="{span}"}} 1' in metrics
+    # Fields without resolvers of their own have no spans.
+    assert 'span="Success.entities"' not in metrics
+
+
+async def test_metrics_not_enabled(api_client):
+    response = await api_client.get("/metrics")
+    assert response.status_code == 404
+
+
+async def test_persisted_queries(api_client, wait_for_projections):
+    await wait_for_projections()
+    query = "query PersistedQueryTest { bankStatistics { accountCount } }"
+    extensions = {
+        "persistedQuery": {
+            "version": 1,
+            "sha256Hash": hashlib.sha256(query.encode()).hexdigest(),
+        }
+    }
+
+    # The server doesn't know the hash yet.
+    response = await api_client.post("/graphql", json={"extensions": extensions})
+    assert response.status_code == 200
+    assert response.json()["errors"] == [
+        {
+            "message": "PersistedQueryNotFound",
+            "extensions": {"code": "PERSISTED_QUERY_NOT_FOUND"},
+        }
+    ]
+
+    # Sent with the query, it's kept for later requests.
+    response = await api_client.post(
+        "/graphql", json={"query": query, "extensions": extensions}
+    )
+    account_count = response.json()["data"]["bankStatistics"]["accountCount"]
+
+    response = await api_client.post("/graphql", json={"extensions": extensions})
+    assert response.json() == {
+        "data": {"bankStatistics": {"accountCount": account_count}}
+    }
+
+    response = await api_client.get(
+        "/graphql", params={"extensions": json.dumps(extensions)}
+    )
+    assert response.json() == {
+        "data": {"bankStatistics": {"accountCount": account_count}}
+    }
+
+    # The hash must match the query.
+    response = await api_client.post(
+        "/graphql",
+        json={
+            "query": "{ bankStatistics { transactionCount } }",
+            "extensions": extensions,
+        },
+    )
+    assert response.status_code == 400
+
+
+async def test_bank_account_response_encoding(graphql_test_client):
+    response = await graphql_test_client(
+        """
+        mutation ($input: OpenBankAccountInput!) {
+            bankAccount {
+                open(input: $input) {
+                    ... on Success {
+                        entities
+                    }
+                }
+            }
+        }
+        """,
+        variables={"input": {"email": "zoe@example.com", "fullName": "Zoe Angstrom"}},
+    )
+    bank_account_global_id = response.json()["data"]["bankAccount"]["open"]["entities"][
+        0
+    ]
+
+    response = await graphql_test_client(
+        """
+        query ($id: GlobalID!) {
+            bankAccount(id: $id) {
+                id
+                balance
+                fullName
+            }
+        }
+        """,
+        variables={"id": bank_account_global_id},
+    )
+
+    assert response.headers["content-type"] == "application/json"
+    assert json.loads(response.content) == {
+        "data": {
+            "bankAccount": {
+                "id": bank_account_global_id,
+                "balance": "0.00",
+                "fullName": "Zoe Angstrom",
+            }
+        }
+    }
+
+
+GET_BANK_ACCOUNTS = """
+query ($ids: [GlobalID!]!) {
+    bankAccounts(ids: $ids) {
+        id
+        balance
+        email
+        fullName
+    }
+}
+"""
+
+
+async def open_bank_account(fake, api_client) -> str:
+    response = await api_client.post(
+        "/graphql",
+        json={
+            "query": """
+            mutation ($input: OpenBankAccountInput!) {
+                bankAccount {
+                    open(input: $input) {
+                        ... on Success {
+                            entities
+                        }
+                    }
+                }
+            }
+            """,
+            "variables": {"input": {"email": fake.email(), "fullName": fake.name()}},
+        },
+    )
+    return response.json()["data"]["bankAccount"]["open"]["entities"][0]
+
+
+@pytest.mark.parametrize(
+    "accept_encoding, content_encoding",
+    [
+        ("gzip", "gzip"),
+        ("gzip, zstd", "zstd"),
+        ("gzip;q=1.0, zstd;q=0.5", "gzip"),
+        ("*", "zstd"),
+        ("identity", None),
+    ],
+)
+async def test_response_compression(
+    fake, api_client, accept_encoding, content_encoding
+):
+    if content_encoding == "zstd":
+        zstandard = pytest.importorskip("zstandard")
+
+    bank_account_global_id = await open_bank_account(fake, api_client)
+    request = {
+        "query": GET_BANK_ACCOUNTS,
+        "variables": {"ids": [bank_account_global_id] * 20},
+    }
+
+    response = await api_client.post(
+        "/graphql", json=request, headers={"Accept-Encoding": accept_encoding}
+    )
+
+    assert response.headers.get("content-encoding") == content_encoding
+    assert response.headers["vary"] == "Accept-Encoding"
+    content = response.content
+    if content_encoding == "zstd":
+        # httpx doesn't decode zstd.
+        content = zstandard.ZstdDecompressor().decompressobj().decompress(content)
+    assert len(json.loads(content)["data"]["bankAccounts"]) == 20
+
+    # Small responses aren't compressed.
+    request["variables"] = {"ids": [bank_account_global_id]}
+    response = await api_client.post(
+        "/graphql", json=request, headers={"Accept-Encoding": accept_encoding}
+    )
+    assert "content-encoding" not in response.headers
+
+
+async def test_response_compression_excluded_clients(fake, monkeypatch):
+    monkeypatch.setattr(settings, "compression_exclude_clients", "127.0.0.1")
+
+    async for api_client in get_test_client(create_app()):
+        bank_account_global_id = await open_bank_account(fake, api_client)
+        response = await api_client.post(
+            "/graphql",
+            json={
+                "query": GET_BANK_ACCOUNTS,
+                "variables": {"ids": [bank_account_global_id] * 20},
+            },
+            headers={"Accept-Encoding": "gzip"},
+        )
+
+        assert "content-encoding" not in response.headers
+        assert len(response.json()["data"]["bankAccounts"]) == 20
+
+
+async def test_no_query_cost_limit_by_default(fake, api_client):
+    bank_account_global_id = await open_bank_account(fake, api_client)
+
+    # Bulk reads and writes of hundreds of accounts go through.
+    response = await api_client.post(
+        "/graphql",
+        json={
+            "query": GET_BANK_ACCOUNTS,
+            "variables": {"ids": [bank_account_global_id] * 500},
+        },
+    )
+    assert len(response.json()["data"]["bankAccounts"]) == 500
+
+
+@pytest.fixture
+def query_cost_limiter(monkeypatch) -> QueryCostLimiter:
+    # Neither the cost limit nor rate budgets are on by default.
+    limiter = QueryCostLimiter(FIELD_COSTS)
+    monkeypatch.setattr(schema, "extensions", [*schema.extensions, limiter])
+    return limiter
+
+
+async def test_query_cost_limit(fake, api_client, query_cost_limiter):
+    query_cost_limiter.max_cost = 1000
+    bank_account_global_id = await open_bank_account(fake, api_client)
+
+    response = await api_client.post(
+        "/graphql",
+        json={
+            "query": GET_BANK_ACCOUNTS,
+            "variables": {"ids": [bank_account_global_id] * 100},
+        },
+    )
+    assert len(response.json()["data"]["bankAccounts"]) == 100
+
+    # Each account costs 10.
+    response = await api_client.post(
+        "/graphql",
+        json={
+            "query": GET_BANK_ACCOUNTS,
+            "variables": {"ids": [bank_account_global_id] * 101},
+        },
+    )
+    assert response.json() == {
+        "data": None,
+        "errors": [
+            {
+                "message": "Query cost 1010 is over the limit of 1000",
+                "extensions": {"code": "QUERY_TOO_COSTLY", "cost": 1010},
+            }
+        ],
+    }
+
+    # Each page of transactions costs its size.
+    response = await api_client.post(
+        "/graphql",
+        json={
+            "query": """
+            query ($ids: [GlobalID!]!) {
+                bankAccounts(ids: $ids) {
+                    ...Transactions
+                }
+            }
+
+            fragment Transactions on BankAccount {
+                transactions(first: 100) {
+                    edges {
+                        node {
+                            amount
+                        }
+                    }
+                }
+            }
+            """,
+            "variables": {"ids": [bank_account_global_id] * 4},
+        },
+    )
+    assert response.json()["errors"][0]["extensions"] == {
+        "code": "QUERY_TOO_COSTLY",
+        "cost": 4 * (10 + 100 * (1 + 1 + 1)),
+    }
+
+
+async def test_query_depth_limit(graphql_test_client):
+    # No valid query is this deep, but the depth is checked regardless.
+    query = "amount"
+    for _ in range(10):
+        query = f"nested {{ {query} }}"
+
+    response = await graphql_test_client(
+        f"query {{ bankAccounts(ids: []) {{ {query} }} }}"
+    )
+
+    assert "'anonymous' exceeds maximum operation depth of 10" in [
+        error["message"] for error in response.json()["errors"]
+    ]
+
+
+async def test_client_rate_budgets(fake, api_client, query_cost_limiter):
+    query_cost_limiter.rate_budgets = RateBudgets(per_second=1, burst=25)
+
+    bank_account_global_id = await open_bank_account(fake, api_client)
+    request = {
+        "query": GET_BANK_ACCOUNTS,
+        "variables": {"ids": [bank_account_global_id]},
+    }
+
+    response = await api_client.post("/graphql", json=request)
+    assert response.status_code == 200
+    assert response.json()["data"]["bankAccounts"][0]["id"] == bank_account_global_id
+
+    # Opening the account cost 11 and the query 10, of the burst of 25, and
+    # the budget comes back at 1 a second.
+    response = await api_client.post("/graphql", json=request)
+    assert response.status_code == 429
+    assert 0 < int(response.headers["retry-after"]) <= 6
+    assert response.json()["errors"][0]["extensions"] == {
+        "code": "RATE_LIMITED",
+        "cost": 10,
+    }
@@ -0,0 +1,108 @@
+from dataclasses import replace
+from decimal import Decimal
+
+from eventsourcing.system import SingleThreadedRunner
+
+from src.app.bank_account_statistics import BankAccountStatistics
+from src.app.bank_account_summaries import BankAccountSummaries
+from src.app.bank_accounts import BankAccounts
+from src.app.container import system
+from src.app.statistics_recorders import BankStatistics
+
+
+def test_bank_account_statistics():
+    runner = SingleThreadedRunner(system)
+    runner.start()
+
+    try:
+        accounts = runner.get(BankAccounts)
+        statistics = runner.get(BankAccountStatistics)
+        statistics.pull_and_process(BankAccounts.name)
+        before = statistics.get_statistics()
+
+        alice_id = accounts.open_account(
+            full_name="Alice",
+            email_address="alice@example.com",
+        )
+        bob_id = accounts.open_account(
+            full_name="Bob",
+            email_address="bob@example.com",
+        )
+        accounts.deposit_funds(alice_id, Decimal("200.00"))
+        accounts.set_overdraft_limit(bob_id, Decimal("100.00"))
+        accounts.withdraw_funds(bob_id, Decimal("30.00"))
+        accounts.transfer_funds(alice_id, bob_id, Decimal("50.00"))
+        accounts.close_account(alice_id)
+
+        after = statistics.get_statistics()
+        assert after == replace(
+            before,
+            account_count=before.account_count + 2,
+            closed_account_count=before.closed_account_count + 1,
+            transaction_count=before.transaction_count + 4,
+            total_deposits=before.total_deposits + Decimal("250.00"),
+            total_withdrawals=before.total_withdrawals + Decimal("80.00"),
+            total_liabilities=before.total_liabilities + Decimal("170.00"),
+        )
+
+        # Overdrawn.
+        accounts.withdraw_funds(bob_id, Decimal("40.00"))
+        after = statistics.get_statistics()
+        assert after.overdrawn_account_count == before.overdrawn_account_count + 1
+        assert after.total_overdrawn == before.total_overdrawn + Decimal("20.00")
+        assert after.total_liabilities == before.total_liabilities + Decimal("150.00")
+
+        # Rebuilding gives the same totals, and processing carries on after.
+        assert statistics.rebuild(BankAccounts.name, batch_size=2) == after
+        assert statistics.get_statistics() == after
+
+        accounts.deposit_funds(bob_id, Decimal("20.00"))
+        after = statistics.get_statistics()
+        assert after.overdrawn_account_count == before.overdrawn_account_count
+        assert after.total_overdrawn == before.total_overdrawn
+        assert after.transaction_count == before.transaction_count + 6
+    finally:
+        runner.stop()
+
+
+def test_bank_account_statistics_rebuild(tmp_path):
+    env = {
+        "PERSISTENCE_MODULE": "eventsourcing.sqlite",
+        "SQLITE_DBNAME": str(tmp_path / "bank.db"),
+    }
+
+    # Events recorded before the projection existed.
+    accounts = BankAccounts(env=env)
+    account_ids = [
+        accounts.open_account(full_name=f"Client {i}", email_address=f"{i}@x.com")
+        for i in range(5)
+    ]
+    for account_id in account_ids:
+        accounts.deposit_funds(account_id, Decimal("10.00"))
+    accounts.close()
+
+    runner = SingleThreadedRunner(system, env=env)
+    runner.start()
+
+    try:
+        statistics = runner.get(BankAccountStatistics)
+        assert statistics.get_statistics() == BankStatistics()
+
+        # More than the log's section size at a time.
+        rebuilt = statistics.rebuild(BankAccounts.name, batch_size=20)
+        assert rebuilt.account_count == 5
+        assert rebuilt.total_liabilities == Decimal("50.00")
+        assert statistics.get_statistics() == rebuilt
+        assert statistics.recorder.max_tracking_id(BankAccounts.name) == 10
+
+        # Followers of the same application in the same database keep
+        # separate positions.
+        summaries = runner.get(BankAccountSummaries)
+        assert summaries.recorder.max_tracking_id(BankAccounts.name) == 0
+        summaries.pull_and_process(BankAccounts.name)
+        assert summaries.get_summary(account_ids[0]).balance == Decimal("10.00")
+
+        runner.get(BankAccounts).deposit_funds(account_ids[0], Decimal("5.00"))
+        assert statistics.get_statistics().total_deposits == Decimal("55.00")
+    finally:
+        runner.stop()
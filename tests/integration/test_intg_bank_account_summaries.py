@@ -0,0 +1,179 @@
+from decimal import Decimal
+from uuid import uuid4
+
+import pytest
+from eventsourcing.system import SingleThreadedRunner
+
+from src.app.bank_account_summaries import BankAccountSummaries
+from src.app.bank_accounts import BankAccounts
+from src.app.container import system
+from src.domain.exceptions import AccountNotFoundError
+
+
+def test_bank_account_summaries():
+    runner = SingleThreadedRunner(system)
+    runner.start()
+
+    try:
+        accounts = runner.get(BankAccounts)
+        summaries = runner.get(BankAccountSummaries)
+
+        account_id = accounts.open_account(
+            full_name="Alice",
+            email_address="alice@example.com",
+        )
+        accounts.deposit_funds(account_id, Decimal("200.00"))
+        accounts.withdraw_funds(account_id, Decimal("50.00"))
+        accounts.set_overdraft_limit(account_id, Decimal("100.00"))
+
+        summary = summaries.get_summary(account_id)
+        assert summary.full_name == "Alice"
+        assert summary.email_address == "alice@example.com"
+        assert summary.balance == Decimal("150.00")
+        assert summary.overdraft_limit == Decimal("100.00")
+        assert summary.is_closed is False
+        assert summary.version == 4
+
+        accounts.close_account(account_id)
+        assert summaries.get_summary(account_id).is_closed is True
+
+        with pytest.raises(AccountNotFoundError):
+            summaries.get_summary(uuid4())
+
+        assert list(summaries.get_summaries([uuid4(), account_id])) == [account_id]
+    finally:
+        runner.stop()
+
+
+def test_bank_account_summaries_resume(tmp_path):
+    env = {
+        "PERSISTENCE_MODULE": "eventsourcing.sqlite",
+        "SQLITE_DBNAME": str(tmp_path / "bank.db"),
+    }
+
+    runner = SingleThreadedRunner(system, env=env)
+    runner.start()
+    account_id = runner.get(BankAccounts).open_account(
+        full_name="Alice",
+        email_address="alice@example.com",
+    )
+    runner.stop()
+
+    # Events recorded while the projection isn't running.
+    accounts = BankAccounts(env=env)
+    accounts.deposit_funds(account_id, Decimal("25.00"))
+    accounts.close()
+
+    runner = SingleThreadedRunner(system, env=env)
+    runner.start()
+
+    try:
+        summaries = runner.get(BankAccountSummaries)
+        assert summaries.get_summary(account_id).balance == Decimal("0.00")
+
+        # Resumes from the tracked position.
+        summaries.pull_and_process(BankAccounts.name)
+        assert summaries.get_summary(account_id).balance == Decimal("25.00")
+        assert summaries.recorder.max_tracking_id(BankAccounts.name) == 2
+    finally:
+        runner.stop()
+
+
+def test_bank_account_summaries_compressed_events():
+    runner = SingleThreadedRunner(
+        system, env={"COMPRESSION_ALGORITHM": "zlib", "COMPRESSION_MIN_SIZE": "0"}
+    )
+    runner.start()
+
+    try:
+        accounts = runner.get(BankAccounts)
+        account_id = accounts.open_account(
+            full_name="Alice",
+            email_address="alice@example.com",
+        )
+        accounts.deposit_funds(account_id, Decimal("25.00"))
+        assert accounts.compression_stats.compressed == 2
+
+        summary = runner.get(BankAccountSummaries).get_summary(account_id)
+        assert summary.balance == Decimal("25.00")
+    finally:
+        runner.stop()
+
+
+def test_bank_account_summaries_lookup():
+    runner = SingleThreadedRunner(system)
+    runner.start()
+
+    try:
+        accounts = runner.get(BankAccounts)
+        summaries = runner.get(BankAccountSummaries)
+
+        # Unique across test runs against the same database.
+        suffix = uuid4().hex
+        email = f"Alice.{suffix}@Example.com"
+        alice_ids = [
+            accounts.open_account(full_name=f"{suffix} Alice {i}", email_address=email)
+            for i in range(3)
+        ]
+        bob_id = accounts.open_account(
+            full_name=f"{suffix} bob", email_address=f"bob.{suffix}@example.com"
+        )
+
+        found = summaries.get_summaries_by_email(email.lower())
+        assert sorted(summary.id for summary in found) == sorted(alice_ids)
+        assert summaries.get_summaries_by_email(f"nobody.{suffix}@example.com") == []
+
+        found = summaries.search_summaries(f"{suffix} A", limit=2)
+        assert [summary.id for summary in found] == alice_ids[:2]
+        found = summaries.search_summaries(suffix.upper(), limit=10)
+        assert [summary.id for summary in found] == [*alice_ids, bob_id]
+        assert summaries.search_summaries(f"{suffix}%", limit=10) == []
+    finally:
+        runner.stop()
+
+
+def test_bank_account_summaries_rebuild(tmp_path):
+    env = {
+        "PERSISTENCE_MODULE": "eventsourcing.sqlite",
+        "SQLITE_DBNAME": str(tmp_path / "bank.db"),
+    }
+
+    # Events recorded before the projection existed.
+    accounts = BankAccounts(env=env)
+    alice_id = accounts.open_account(
+        full_name="Alice",
+        email_address="alice@example.com",
+    )
+    bob_id = accounts.open_account(
+        full_name="Bob",
+        email_address="bob@example.com",
+    )
+    accounts.deposit_funds(alice_id, Decimal("25.00"))
+    accounts.set_overdraft_limit(bob_id, Decimal("10.00"))
+    accounts.close_account(bob_id)
+    accounts.close()
+
+    runner = SingleThreadedRunner(system, env=env)
+    runner.start()
+
+    try:
+        summaries = runner.get(BankAccountSummaries)
+        assert summaries.get_summaries_by_email("alice@example.com") == []
+
+        assert summaries.rebuild(BankAccounts.name, batch_size=2) == 2
+        assert summaries.rebuild(BankAccounts.name) == 2
+        assert summaries.recorder.max_tracking_id(BankAccounts.name) == 5
+
+        alice = summaries.get_summaries_by_email("ALICE@example.com")[0]
+        assert alice.balance == Decimal("25.00")
+        assert alice.version == 2
+        bob = summaries.get_summary(bob_id)
+        assert bob.overdraft_limit == Decimal("10.00")
+        assert bob.is_closed is True
+        assert [s.id for s in summaries.search_summaries("b", limit=5)] == [bob_id]
+
+        # Processing carries on after the rebuilt position.
+        runner.get(BankAccounts).deposit_funds(alice_id, Decimal("5.00"))
+        assert summaries.get_summary(alice_id).balance == Decimal("30.00")
+    finally:
+        runner.stop()
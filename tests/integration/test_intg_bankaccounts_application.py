@@ -1,14 +1,18 @@
+from datetime import datetime, timezone
 from decimal import Decimal
 from uuid import uuid4
 
 import pytest
+from eventsourcing.persistence import IntegrityError
 
-from src.app.bank_accounts import BankAccounts
+from src.app.bank_accounts import BankAccounts, get_transaction_id
+from src.app.concurrency import RecordingConflict
 from src.domain.exceptions import (
     AccountClosedError,
     AccountNotFoundError,
     InsufficientFundsError,
 )
+from src.domain.idempotency_key import IdempotencyKey
 
 
 def test_bank_accounts():
@@ -161,3 +165,590 @@ def test_bank_accounts():
             account_id=account_id1,
             overdraft_limit=Decimal("500.00"),
         )
+
+
+def test_bank_accounts_snapshotting():
+    accounts = BankAccounts(env={"BANK_ACCOUNT_SNAPSHOTTING_INTERVAL": "5"})
+
+    account_id = accounts.open_account(
+        full_name="Alice",
+        email_address="alice@example.com",
+    )
+
+    for _ in range(11):
+        accounts.deposit_funds(
+            credit_account_id=account_id,
+            amount=Decimal("10.00"),
+        )
+
+    # Snapshots are taken at versions 5 and 10.
+    snapshots = list(accounts.snapshots.get(account_id))
+    assert [s.originator_version for s in snapshots] == [5, 10]
+
+    # Reads start from the latest snapshot and replay the rest.
+    account = accounts.get_account(account_id)
+    assert account.version == 12
+    assert account.balance == Decimal("110.00")
+
+
+def test_bank_accounts_snapshotting_disabled():
+    accounts = BankAccounts(env={"IS_SNAPSHOTTING_ENABLED": "n"})
+
+    account_id = accounts.open_account(
+        full_name="Alice",
+        email_address="alice@example.com",
+    )
+
+    for _ in range(200):
+        accounts.deposit_funds(
+            credit_account_id=account_id,
+            amount=Decimal("1.00"),
+        )
+
+    assert accounts.snapshots is None
+    assert accounts.get_balance(account_id) == Decimal("200.00")
+
+
+def test_bank_accounts_aggregate_cache():
+    accounts = BankAccounts(env={"AGGREGATE_CACHE_MAXSIZE": "2"})
+
+    account_id1 = accounts.open_account(
+        full_name="Alice",
+        email_address="alice@example.com",
+    )
+
+    # Saved aggregates are written through to the cache.
+    assert accounts.get_balance(account_id1) == Decimal("0.00")
+    assert accounts.cache_stats.hits == 1
+    assert accounts.cache_stats.misses == 0
+
+    accounts.deposit_funds(
+        credit_account_id=account_id1,
+        amount=Decimal("10.00"),
+    )
+    assert accounts.get_balance(account_id1) == Decimal("10.00")
+    assert accounts.cache_stats.hits == 3
+
+    # Opening more accounts evicts the least recently used one.
+    accounts.open_account(full_name="Bob", email_address="bob@example.com")
+    accounts.open_account(full_name="Carol", email_address="carol@example.com")
+
+    assert accounts.get_balance(account_id1) == Decimal("10.00")
+    assert accounts.cache_stats.misses == 1
+    assert accounts.cache_stats.hit_rate == 0.75
+
+
+def test_bank_accounts_aggregate_cache_fastforward(tmp_path):
+    env = {
+        "PERSISTENCE_MODULE": "eventsourcing.sqlite",
+        "SQLITE_DBNAME": str(tmp_path / "bank.db"),
+    }
+    worker1 = BankAccounts(env=env)
+    worker2 = BankAccounts(env=env)
+
+    account_id = worker1.open_account(
+        full_name="Alice",
+        email_address="alice@example.com",
+    )
+    assert worker2.get_balance(account_id) == Decimal("0.00")
+
+    # Worker 2's cached account is brought up to date on the next read.
+    worker1.deposit_funds(
+        credit_account_id=account_id,
+        amount=Decimal("25.00"),
+    )
+    assert worker2.get_balance(account_id) == Decimal("25.00")
+    assert worker2.cache_stats.hits == 1
+
+    # Cache can be disabled.
+    accounts = BankAccounts(env={**env, "AGGREGATE_CACHE_MAXSIZE": ""})
+    assert accounts.cache_stats is None
+    assert accounts.get_balance(account_id) == Decimal("25.00")
+
+
+def test_bank_accounts_get_accounts():
+    accounts = BankAccounts(env={"BANK_ACCOUNT_SNAPSHOTTING_INTERVAL": "3"})
+
+    account_id1 = accounts.open_account(
+        full_name="Alice",
+        email_address="alice@example.com",
+    )
+    account_id2 = accounts.open_account(
+        full_name="Bob",
+        email_address="bob@example.com",
+    )
+
+    # Account 1 has a snapshot at version 3, account 2 has none.
+    for _ in range(4):
+        accounts.deposit_funds(
+            credit_account_id=account_id1,
+            amount=Decimal("10.00"),
+        )
+
+    missing_id = uuid4()
+    found = accounts.get_accounts([account_id1, missing_id, account_id2, account_id1])
+
+    assert list(found) == [account_id1, account_id2]
+    assert found[account_id1].version == 5
+    assert found[account_id1].balance == Decimal("40.00")
+    assert found[account_id2].full_name == "Bob"
+    assert accounts.get_accounts([]) == {}
+
+
+def test_bank_accounts_apply_transactions():
+    accounts = BankAccounts()
+    accounts.apply_transactions_chunk_size = 2
+
+    account_ids = [
+        accounts.open_account(full_name=name, email_address=f"{name}@example.com")
+        for name in ("alice", "bob", "carol")
+    ]
+    accounts.close_account(account_ids[2])
+    missing_id = uuid4()
+
+    outcomes = accounts.apply_transactions(
+        [
+            (account_ids[0], Decimal("100.00")),
+            (account_ids[1], Decimal("20.00")),
+            (account_ids[0], Decimal("-30.00")),
+            (account_ids[1], Decimal("-50.00")),
+            (account_ids[2], Decimal("10.00")),
+            (missing_id, Decimal("10.00")),
+            (account_ids[0], Decimal("5.00")),
+        ]
+    )
+
+    assert [(outcome.status, type(outcome.error)) for outcome in outcomes] == [
+        ("committed", type(None)),
+        ("committed", type(None)),
+        ("committed", type(None)),
+        ("failed", InsufficientFundsError),
+        ("failed", AccountClosedError),
+        ("failed", AccountNotFoundError),
+        ("committed", type(None)),
+    ]
+    assert accounts.get_balance(account_ids[0]) == Decimal("75.00")
+    assert accounts.get_balance(account_ids[1]) == Decimal("20.00")
+    assert accounts.get_balance(account_ids[2]) == Decimal("0.00")
+
+
+def test_bank_accounts_apply_transactions_partly_applied(monkeypatch):
+    accounts = BankAccounts()
+    accounts.apply_transactions_chunk_size = 1
+
+    account_ids = [
+        accounts.open_account(full_name=name, email_address=f"{name}@example.com")
+        for name in ("alice", "bob", "carol")
+    ]
+
+    save = accounts.save
+    saves = 0
+
+    def save_failing_second_and_third(*objs, **kwargs):
+        nonlocal saves
+        saves += 1
+        if saves == 2:
+            raise RecordingConflict("Conflict")
+        if saves == 3:
+            raise OSError("Connection lost")
+        return save(*objs, **kwargs)
+
+    monkeypatch.setattr(accounts, "save", save_failing_second_and_third)
+
+    outcomes = accounts.apply_transactions(
+        [(account_id, Decimal("10.00")) for account_id in account_ids]
+    )
+
+    # Chunks after a failed one are still saved.
+    assert [outcome.status for outcome in outcomes] == [
+        "committed",
+        "conflicted",
+        "failed",
+    ]
+    assert isinstance(outcomes[2].error, OSError)
+    assert [accounts.get_balance(account_id) for account_id in account_ids] == [
+        Decimal("10.00"),
+        Decimal("0.00"),
+        Decimal("0.00"),
+    ]
+
+
+def test_bank_accounts_retry_on_conflict(monkeypatch):
+    accounts = BankAccounts(env={"COMMAND_RETRY_BASE_DELAY": "0"})
+
+    account_id = accounts.open_account(
+        full_name="Alice",
+        email_address="alice@example.com",
+    )
+
+    # Simulate another worker saving between this worker's load and save.
+    stale_accounts = [accounts.get_account(account_id)]
+    accounts.deposit_funds(credit_account_id=account_id, amount=Decimal("10.00"))
+
+    get_account = accounts.get_account
+    monkeypatch.setattr(
+        accounts,
+        "get_account",
+        lambda account_id: stale_accounts.pop()
+        if stale_accounts
+        else get_account(account_id),
+    )
+
+    # Conflict is retried with the reloaded account.
+    accounts.deposit_funds(credit_account_id=account_id, amount=Decimal("5.00"))
+
+    assert accounts.get_balance(account_id) == Decimal("15.00")
+    assert accounts.conflict_stats.conflicts == 1
+    assert accounts.conflict_stats.attempts == 3
+    assert accounts.conflict_stats.hot_accounts() == [(account_id, 1)]
+
+
+def test_bank_accounts_retry_on_conflict_max_attempts(monkeypatch):
+    accounts = BankAccounts(env={"COMMAND_MAX_ATTEMPTS": "1"})
+
+    account_id = accounts.open_account(
+        full_name="Alice",
+        email_address="alice@example.com",
+    )
+
+    stale_account = accounts.get_account(account_id)
+    accounts.deposit_funds(credit_account_id=account_id, amount=Decimal("10.00"))
+    monkeypatch.setattr(accounts, "get_account", lambda account_id: stale_account)
+
+    with pytest.raises(IntegrityError):
+        accounts.deposit_funds(credit_account_id=account_id, amount=Decimal("5.00"))
+
+    assert accounts.conflict_stats.conflict_rate == 0.5
+
+
+def test_bank_accounts_no_retry_after_recording(monkeypatch):
+    accounts = BankAccounts(env={"COMMAND_RETRY_BASE_DELAY": "0"})
+
+    account_id = accounts.open_account(
+        full_name="Alice",
+        email_address="alice@example.com",
+    )
+
+    # Fail after the deposit's events are recorded.
+    notify = accounts.notify
+    failures = []
+
+    def notify_failing_once(new_events):
+        if not failures:
+            failures.append(new_events)
+            raise IntegrityError("Unique violation")
+        notify(new_events)
+
+    monkeypatch.setattr(accounts, "notify", notify_failing_once)
+
+    with pytest.raises(IntegrityError):
+        accounts.deposit_funds(credit_account_id=account_id, amount=Decimal("10.00"))
+
+    # The deposit isn't applied again.
+    assert accounts.get_balance(account_id) == Decimal("10.00")
+    assert accounts.conflict_stats.conflicts == 0
+
+
+def test_bank_accounts_get_transactions():
+    accounts = BankAccounts()
+
+    account_id = accounts.open_account(
+        full_name="Alice",
+        email_address="alice@example.com",
+    )
+
+    # Versions 2 and 3 are transactions, 4 isn't, 5 to 7 are.
+    for amount in ["1.00", "2.00"]:
+        accounts.deposit_funds(credit_account_id=account_id, amount=Decimal(amount))
+    accounts.set_overdraft_limit(account_id=account_id, overdraft_limit=Decimal("10"))
+    for amount in ["3.00", "4.00", "5.00"]:
+        accounts.deposit_funds(credit_account_id=account_id, amount=Decimal(amount))
+
+    def get_amounts(*args, **kwargs):
+        transactions = accounts.get_transactions(account_id, *args, **kwargs)
+        return [str(transaction.amount) for transaction in transactions]
+
+    assert get_amounts(3) == ["1.00", "2.00", "3.00"]
+    assert get_amounts(2, gt=3) == ["3.00", "4.00"]
+    assert get_amounts(10, gt=5) == ["4.00", "5.00"]
+    assert get_amounts(2, desc=True) == ["5.00", "4.00"]
+    assert get_amounts(2, lte=5, desc=True) == ["3.00", "2.00"]
+    assert get_amounts(10, gt=2, lte=5) == ["2.00", "3.00"]
+    assert accounts.get_transactions(uuid4(), 10) == []
+
+
+def test_bank_accounts_point_in_time():
+    accounts = BankAccounts(env={"BANK_ACCOUNT_SNAPSHOTTING_INTERVAL": "3"})
+    before_opened = datetime.now(timezone.utc)
+
+    account_id = accounts.open_account(
+        full_name="Alice",
+        email_address="alice@example.com",
+    )
+
+    # Balance after each version, with snapshots at versions 3 and 6.
+    times = []
+    for _ in range(6):
+        accounts.deposit_funds(credit_account_id=account_id, amount=Decimal("10.00"))
+        times.append(datetime.now(timezone.utc))
+
+    assert accounts.get_account(account_id, version=1).balance == Decimal("0.00")
+    assert accounts.get_account(account_id, version=5).balance == Decimal("40.00")
+    assert accounts.get_account(account_id, version=99).version == 7
+
+    for i, at in enumerate(times):
+        assert accounts.get_balance_at(account_id, at) == Decimal(10 * (i + 1))
+
+    account = accounts.get_account_at(account_id, times[3].replace(tzinfo=None))
+    assert account.version == 5
+
+    with pytest.raises(AccountNotFoundError):
+        accounts.get_account_at(account_id, before_opened)
+
+    with pytest.raises(AccountNotFoundError):
+        accounts.get_account(account_id, version=0)
+
+    with pytest.raises(AccountNotFoundError):
+        accounts.get_balance_at(uuid4(), times[0])
+
+
+def test_bank_accounts_reads_json_transcoded_events(tmp_path):
+    env = {
+        "PERSISTENCE_MODULE": "eventsourcing.sqlite",
+        "SQLITE_DBNAME": str(tmp_path / "bank.db"),
+    }
+
+    # Events written before the orjson transcoder was the default.
+    accounts = BankAccounts(
+        env={**env, "TRANSCODER_TOPIC": "eventsourcing.persistence:JSONTranscoder"}
+    )
+    account_id = accounts.open_account(
+        full_name="Alice",
+        email_address="alice@example.com",
+    )
+    accounts.deposit_funds(credit_account_id=account_id, amount=Decimal("10.00"))
+    accounts.close()
+
+    accounts = BankAccounts(env=env)
+    accounts.deposit_funds(credit_account_id=account_id, amount=Decimal("5.00"))
+
+    account = accounts.get_account(account_id)
+    assert account.balance == Decimal("15.00")
+    assert account.email_address == "alice@example.com"
+
+    stored_events = accounts.recorder.select_events(account_id)
+    assert b"_type_" in stored_events[1].state
+    assert b"_type_" not in stored_events[2].state
+    assert len(stored_events[2].state) < len(stored_events[1].state)
+    accounts.close()
+
+
+@pytest.mark.parametrize("algorithm", ["zlib", "zstd"])
+def test_bank_accounts_compression(tmp_path, algorithm):
+    if algorithm == "zstd":
+        pytest.importorskip("zstandard")
+
+    env = {
+        "PERSISTENCE_MODULE": "eventsourcing.sqlite",
+        "SQLITE_DBNAME": str(tmp_path / "bank.db"),
+        "BANK_ACCOUNT_SNAPSHOTTING_INTERVAL": "2",
+    }
+
+    # An event recorded before compression was switched on.
+    accounts = BankAccounts(env=env)
+    assert accounts.compression_stats is None
+    account_id = accounts.open_account(
+        full_name="Alice",
+        email_address="alice@example.com",
+    )
+    accounts.close()
+
+    accounts = BankAccounts(
+        env={
+            **env,
+            "COMPRESSION_ALGORITHM": algorithm,
+            "COMPRESSION_MIN_SIZE": "60",
+        }
+    )
+    accounts.deposit_funds(credit_account_id=account_id, amount=Decimal("10.00"))
+    accounts.close_account(account_id=account_id)
+
+    # The deposit and snapshot are compressed, the small Closed event isn't.
+    stats = accounts.compression_stats
+    assert (stats.compressed, stats.skipped) == (2, 1)
+    assert stats.bytes_saved > 0
+
+    stored_events = accounts.recorder.select_events(account_id)
+    assert stored_events[0].state.startswith(b"{")
+    assert not stored_events[1].state.startswith(b"{")
+    assert stored_events[2].state.startswith(b"{")
+    accounts.close()
+
+    # Readable after compression is switched off again.
+    accounts = BankAccounts(env={**env, "AGGREGATE_CACHE_MAXSIZE": ""})
+    account = accounts.get_account(account_id)
+    assert account.balance == Decimal("10.00")
+    assert account.is_closed
+    accounts.close()
+
+
+@pytest.mark.parametrize("snapshotting", ["y", "n"])
+def test_bank_accounts_fold_balance(snapshotting):
+    accounts = BankAccounts(
+        env={
+            "IS_SNAPSHOTTING_ENABLED": snapshotting,
+            "BANK_ACCOUNT_SNAPSHOTTING_INTERVAL": "3",
+            "AGGREGATE_CACHE_MAXSIZE": "",
+        }
+    )
+
+    account_id = accounts.open_account(
+        full_name="Alice",
+        email_address="alice@example.com",
+    )
+    for amount in ["10.00", "2.50", "-4.00"]:
+        accounts.deposit_funds(credit_account_id=account_id, amount=Decimal(amount))
+    accounts.set_overdraft_limit(account_id=account_id, overdraft_limit=Decimal("5"))
+    accounts.deposit_funds(credit_account_id=account_id, amount=Decimal("1.25"))
+
+    assert accounts.fold_balance(account_id) == Decimal("9.75")
+    assert accounts.get_balance(account_id) == accounts.get_account(account_id).balance
+
+    with pytest.raises(AccountNotFoundError):
+        accounts.fold_balance(uuid4())
+
+
+def test_bank_accounts_minor_units_transcoder(tmp_path):
+    env = {
+        "PERSISTENCE_MODULE": "eventsourcing.sqlite",
+        "SQLITE_DBNAME": str(tmp_path / "bank.db"),
+        "BANK_ACCOUNT_SNAPSHOTTING_INTERVAL": "2",
+        "AGGREGATE_CACHE_MAXSIZE": "",
+    }
+
+    # Decimal strings first, then minor units, in the same stream.
+    accounts = BankAccounts(env=env)
+    account_id = accounts.open_account(
+        full_name="Alice",
+        email_address="alice@example.com",
+    )
+    accounts.deposit_funds(credit_account_id=account_id, amount=Decimal("10.00"))
+    accounts.close()
+
+    accounts = BankAccounts(
+        env={**env, "TRANSCODER_TOPIC": "src.app.transcoders:MinorUnitsTranscoder"}
+    )
+    for amount in ["0.001", "-4.50", "5"]:
+        accounts.deposit_funds(credit_account_id=account_id, amount=Decimal(amount))
+
+    stored_events = accounts.recorder.select_events(account_id)
+    assert b'"$d"' in stored_events[1].state
+    assert b'"$m":[-450,2]' in stored_events[3].state
+
+    amounts = [t.amount for t in accounts.get_transactions(account_id, limit=10)]
+    assert [str(amount) for amount in amounts] == ["10.00", "0.001", "-4.50", "5"]
+    assert str(accounts.get_balance(account_id)) == "10.501"
+    accounts.close()
+
+    accounts = BankAccounts(env=env)
+    account = accounts.get_account(account_id)
+    assert str(account.balance) == "10.501"
+    assert str(accounts.fold_balance(account_id)) == "10.501"
+    accounts.close()
+
+
+@pytest.mark.parametrize("cache_maxsize", ["10", ""])
+def test_bank_accounts_idempotency_keys(tmp_path, cache_maxsize):
+    env = {
+        "PERSISTENCE_MODULE": "eventsourcing.sqlite",
+        "SQLITE_DBNAME": str(tmp_path / "bank.db"),
+        "IDEMPOTENCY_CACHE_MAXSIZE": cache_maxsize,
+    }
+    accounts = BankAccounts(env=env)
+
+    alice_id = accounts.open_account(
+        full_name="Alice",
+        email_address="alice@example.com",
+    )
+    bob_id = accounts.open_account(
+        full_name="Bob",
+        email_address="bob@example.com",
+    )
+
+    for _ in range(2):
+        accounts.deposit_funds(alice_id, Decimal("100.00"), idempotency_key="d-1")
+        accounts.withdraw_funds(alice_id, Decimal("10.00"), idempotency_key="w-1")
+        accounts.transfer_funds(
+            alice_id, bob_id, Decimal("30.00"), idempotency_key="t-1"
+        )
+    accounts.deposit_funds(alice_id, Decimal("100.00"), idempotency_key="d-2")
+    accounts.deposit_funds(alice_id, Decimal("1.00"))
+
+    assert accounts.get_balance(alice_id) == Decimal("161.00")
+    assert accounts.get_balance(bob_id) == Decimal("30.00")
+
+    # Both sides of the transfer are identified by the key.
+    (debit,) = accounts.get_transactions(alice_id, limit=1, gt=3, lte=4)
+    (credit,) = accounts.get_transactions(bob_id, limit=1)
+    assert debit.transaction_id == credit.transaction_id == get_transaction_id("t-1")
+    assert (
+        accounts.get_transactions(alice_id, limit=1, desc=True)[0].transaction_id
+        is None
+    )
+
+    # Another worker without the key cached is stopped by the saved key.
+    other = BankAccounts(env=env)
+    other.deposit_funds(alice_id, Decimal("100.00"), idempotency_key="d-1")
+    assert other.get_balance(alice_id) == Decimal("161.00")
+    other.close()
+
+    accounts.close()
+
+
+def test_bank_accounts_recent_idempotency_keys(monkeypatch):
+    accounts = BankAccounts()
+    account_id = accounts.open_account(
+        full_name="Alice",
+        email_address="alice@example.com",
+    )
+    accounts.deposit_funds(account_id, Decimal("5.00"), idempotency_key="d-1")
+
+    # Repeats return without loading the account.
+    def get_account(*args, **kwargs):
+        raise AssertionError("account loaded")
+
+    monkeypatch.setattr(accounts, "get_account", get_account)
+    accounts.deposit_funds(account_id, Decimal("5.00"), idempotency_key="d-1")
+    monkeypatch.undo()
+
+    assert accounts.get_balance(account_id) == Decimal("5.00")
+    # Key aggregates aren't cached with the accounts.
+    with pytest.raises(KeyError):
+        accounts.repository.cache.get(IdempotencyKey.create_id("d-1"))
+
+
+def test_bank_accounts_telemetry(prometheus_telemetry):
+    accounts = BankAccounts()
+    account_id = accounts.open_account("Alice", "alice@example.com")
+    accounts.deposit_funds(account_id, Decimal("10.00"))
+
+    metrics = prometheus_telemetry.render()
+    assert 'span_duration_seconds_count{span="BankAccounts.deposit_funds"} 1' in metrics
+    assert 'span_duration_seconds_count{span="BankAccounts.save"} 2' in metrics
+    assert 'span_duration_seconds_count{span="Repository.get"} 1' in metrics
+    # The deposit read the account from the cache, replaying nothing.
+    assert 'bank_accounts_events_replayed_bucket{le="1.0"} 1' in metrics
+    assert "bank_accounts_events_written_sum 2.0" in metrics
+    assert "bank_accounts_bytes_written_count 2" in metrics
+
+    # Without the cache, the account is replayed from its events.
+    accounts = BankAccounts(
+        env={"AGGREGATE_CACHE_MAXSIZE": "", "IS_SNAPSHOTTING_ENABLED": "n"}
+    )
+    account_id = accounts.open_account("Bob", "bob@example.com")
+    accounts.deposit_funds(account_id, Decimal("10.00"))
+    assert accounts.get_account(account_id).balance == Decimal("10.00")
+
+    metrics = prometheus_telemetry.render()
+    assert "bank_accounts_events_replayed_sum 3.0" in metrics
+    assert "bank_accounts_events_replayed_count 3" in metrics
@@ -0,0 +1,244 @@
+from decimal import Decimal
+from queue import Queue
+from threading import Event, Thread
+
+import pytest
+from eventsourcing.system import SingleThreadedRunner
+
+from src.app.bank_account_statistics import BankAccountStatistics
+from src.app.bank_account_summaries import BankAccountSummaries
+from src.app.bank_accounts import BankAccounts
+from src.app.catchup import _fold_partition, catch_up_in_parallel
+from src.app.container import system
+from src.app.repository import get_partition, select_notification_batches
+
+
+def test_catch_up_in_parallel(tmp_path):
+    env = {
+        "PERSISTENCE_MODULE": "eventsourcing.sqlite",
+        "SQLITE_DBNAME": str(tmp_path / "bank.db"),
+    }
+
+    runner = SingleThreadedRunner(system, env=env)
+    runner.start()
+    try:
+        accounts = runner.get(BankAccounts)
+        account_ids = [
+            accounts.open_account(full_name=f"Client {i}", email_address=f"{i}@x.com")
+            for i in range(8)
+        ]
+        for i, account_id in enumerate(account_ids):
+            accounts.deposit_funds(account_id, Decimal(i))
+        accounts.set_overdraft_limit(account_ids[0], Decimal("10.00"))
+        accounts.withdraw_funds(account_ids[0], Decimal("5.00"))
+        accounts.close_account(account_ids[1])
+
+        summaries = runner.get(BankAccountSummaries)
+        statistics = runner.get(BankAccountStatistics)
+        expected_summaries = summaries.get_summaries(account_ids)
+        expected_statistics = statistics.get_statistics()
+        position = accounts.recorder.max_notification_id()
+    finally:
+        runner.stop()
+
+    progress = []
+    for follower_class in [BankAccountSummaries, BankAccountStatistics]:
+        assert (
+            catch_up_in_parallel(
+                follower_class,
+                BankAccounts,
+                num_partitions=3,
+                env=env,
+                batch_size=4,
+                on_progress=progress.append,
+            )
+            == position
+        )
+
+    assert {p.partition for p in progress} == {0, 1, 2}
+    assert max(p.position for p in progress) == position
+
+    runner = SingleThreadedRunner(system, env=env)
+    runner.start()
+    try:
+        summaries = runner.get(BankAccountSummaries)
+        statistics = runner.get(BankAccountStatistics)
+        assert summaries.get_summaries(account_ids) == expected_summaries
+        assert statistics.get_statistics() == expected_statistics
+        assert summaries.recorder.max_tracking_id(BankAccounts.name) == position
+        assert statistics.recorder.max_tracking_id(BankAccounts.name) == position
+
+        # Processing carries on after the rebuilt position.
+        runner.get(BankAccounts).deposit_funds(account_ids[2], Decimal("1.00"))
+        assert summaries.get_summary(account_ids[2]).balance == Decimal("3.00")
+        assert statistics.get_statistics().transaction_count == (
+            expected_statistics.transaction_count + 1
+        )
+    finally:
+        runner.stop()
+
+
+def test_catch_up_in_parallel_needs_shared_database():
+    with pytest.raises(ValueError):
+        catch_up_in_parallel(
+            BankAccountStatistics,
+            BankAccounts,
+            num_partitions=2,
+            env={"PERSISTENCE_MODULE": "eventsourcing.popo"},
+        )
+
+
+def test_catch_up_in_parallel_resumes(tmp_path):
+    env = {
+        "PERSISTENCE_MODULE": "eventsourcing.sqlite",
+        "SQLITE_DBNAME": str(tmp_path / "bank.db"),
+    }
+
+    runner = SingleThreadedRunner(system, env=env)
+    runner.start()
+    try:
+        accounts = runner.get(BankAccounts)
+        account_ids = [
+            accounts.open_account(full_name=f"Client {i}", email_address=f"{i}@x.com")
+            for i in range(8)
+        ]
+        for i, account_id in enumerate(account_ids):
+            accounts.deposit_funds(account_id, Decimal(i))
+        position = accounts.recorder.max_notification_id()
+
+        # A catch-up that folded the first of its partitions, then failed.
+        follower = BankAccountSummaries(env)
+        try:
+            follower.catchup_recorder.insert_partitions(follower.name, 3, position)
+        finally:
+            follower.close()
+        _fold_partition(
+            BankAccountSummaries, BankAccounts, env, 0, position, 4, 0.0, Queue()
+        )
+
+        # Processed as usual until the catch-up is run again.
+        accounts.deposit_funds(account_ids[0], Decimal("1.00"))
+    finally:
+        runner.stop()
+
+    progress = []
+    assert (
+        catch_up_in_parallel(
+            BankAccountSummaries,
+            BankAccounts,
+            num_partitions=3,
+            env=env,
+            batch_size=4,
+            on_progress=progress.append,
+        )
+        == position
+    )
+
+    # The first partition wasn't folded again.
+    assert progress[0].partition == 0
+    assert progress[0].position == position
+    assert [p for p in progress[3:] if p.partition == 0] == []
+
+    runner = SingleThreadedRunner(system, env=env)
+    runner.start()
+    try:
+        summaries = runner.get(BankAccountSummaries)
+        assert summaries.catchup_recorder.select_partitions(summaries.name) == []
+        assert summaries.recorder.max_tracking_id(BankAccounts.name) == position
+
+        # Processing carries on after the rebuilt position.
+        runner.get(BankAccounts).deposit_funds(account_ids[1], Decimal("1.00"))
+        balances = {
+            account_id: summary.balance
+            for account_id, summary in summaries.get_summaries(account_ids).items()
+        }
+        assert balances == {
+            account_id: Decimal(i) + (i < 2) for i, account_id in enumerate(account_ids)
+        }
+    finally:
+        runner.stop()
+
+
+@pytest.mark.parametrize("persistence_module", [None, "eventsourcing.sqlite"])
+def test_rebuilding_excludes_processing(tmp_path, persistence_module):
+    env = {}
+    if persistence_module is not None:
+        env = {
+            "PERSISTENCE_MODULE": persistence_module,
+            "SQLITE_DBNAME": str(tmp_path / "bank.db"),
+        }
+
+    follower = BankAccountSummaries(env)
+    recorder = follower.catchup_recorder
+    is_rebuilding = Event()
+    has_rebuilt = Event()
+
+    def rebuild() -> None:
+        with recorder.rebuilding(follower.name):
+            is_rebuilding.set()
+            has_rebuilt.wait(5)
+
+    try:
+        with recorder.processing(follower.name):
+            thread = Thread(target=rebuild)
+            thread.start()
+            assert not is_rebuilding.wait(0.2)
+        assert is_rebuilding.wait(5)
+
+        processed = Event()
+
+        def process() -> None:
+            with recorder.processing(follower.name):
+                processed.set()
+
+        other_thread = Thread(target=process)
+        other_thread.start()
+        assert not processed.wait(0.2)
+        has_rebuilt.set()
+        assert processed.wait(5)
+        thread.join()
+        other_thread.join()
+    finally:
+        follower.close()
+
+
+@pytest.mark.parametrize("persistence_module", [None, "eventsourcing.sqlite"])
+def test_select_notification_batches_of_partition(tmp_path, persistence_module):
+    env = {}
+    if persistence_module is not None:
+        env = {
+            "PERSISTENCE_MODULE": persistence_module,
+            "SQLITE_DBNAME": str(tmp_path / "bank.db"),
+        }
+
+    accounts = BankAccounts(env=env)
+    try:
+        for i in range(20):
+            accounts.open_account(full_name=f"Client {i}", email_address=f"{i}@x.com")
+        stop = accounts.recorder.max_notification_id()
+        notifications = [
+            notification
+            for batch in select_notification_batches(
+                accounts.notification_log, batch_size=100, stop=stop
+            )
+            for notification in batch
+        ]
+
+        for partition in range(3):
+            batches = list(
+                select_notification_batches(
+                    accounts.notification_log,
+                    batch_size=4,
+                    stop=stop,
+                    partition=partition,
+                    num_partitions=3,
+                )
+            )
+            assert all(len(batch) <= 4 for batch in batches)
+            assert [n for batch in batches for n in batch] == [
+                notification
+                for notification in notifications
+                if get_partition(notification.originator_id, 3) == partition
+            ]
+    finally:
+        accounts.close()
@@ -0,0 +1,63 @@
+from decimal import Decimal
+
+import pytest
+from eventsourcing.persistence import IntegrityError
+
+from src.app.bank_accounts import BankAccounts
+from src.app.container import Container, ContainerNotStartedError
+
+
+def test_container_lifecycle():
+    container = Container()
+
+    # Not started yet.
+    with pytest.raises(ContainerNotStartedError):
+        container.bank_accounts
+
+    container.start()
+
+    # Same application instance is shared.
+    accounts = container.bank_accounts
+    assert isinstance(accounts, BankAccounts)
+    assert container.bank_accounts is accounts
+
+    # Starting again is a no-op.
+    container.start()
+    assert container.bank_accounts is accounts
+
+    container.stop()
+
+    with pytest.raises(ContainerNotStartedError):
+        container.bank_accounts
+
+
+def test_container_projection_errors(monkeypatch, caplog):
+    container = Container()
+    container.start()
+
+    try:
+        summaries = container.bank_account_summaries
+        process_event = summaries.process_event
+        failures = []
+
+        def process_event_failing_once(*args):
+            if not failures:
+                failures.append(args)
+                raise IntegrityError("Projection failed")
+            return process_event(*args)
+
+        monkeypatch.setattr(summaries, "process_event", process_event_failing_once)
+
+        # Commands succeed when projecting their events fails.
+        accounts = container.bank_accounts
+        account_id = accounts.open_account("Alice", "alice@example.com")
+        accounts.deposit_funds(account_id, Decimal("10.00"))
+        assert accounts.get_balance(account_id) == Decimal("10.00")
+
+        # Processing is retried from where it failed.
+        assert container.wait_for_projections(timeout=10)
+        assert failures
+        assert summaries.get_summary(account_id).balance == Decimal("10.00")
+        assert "BankAccountSummaries failed to process events" in caplog.text
+    finally:
+        container.stop()
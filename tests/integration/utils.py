@@ -9,5 +9,7 @@ async def get_test_client(
 ) -> typing.AsyncGenerator[AsyncClient, None]:
     test_url = f"http://test-{quote(app.title)}"
 
-    async with AsyncClient(app=app, base_url=test_url) as client:
-        yield client
+    # The ASGI transport doesn't send lifespan events, so run them here.
+    async with app.router.lifespan_context(app):
+        async with AsyncClient(app=app, base_url=test_url) as client:
+            yield client
@@ -0,0 +1,17 @@
+from decimal import Decimal
+
+import pytest
+
+from src.domain.money import Money
+
+
+def test_money():
+    amount = Money.from_decimal(Decimal("-4.50"))
+    assert amount == Money(-450, 2)
+    assert str(amount.to_decimal()) == "-4.50"
+    assert str(amount) == "-4.50"
+    assert str(Money.from_decimal(Decimal("5")).to_decimal()) == "5"
+    assert str(Money.from_decimal(Decimal("0.001")).to_decimal()) == "0.001"
+
+    with pytest.raises(ValueError):
+        Money.from_decimal(Decimal("NaN"))
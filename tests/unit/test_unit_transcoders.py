@@ -0,0 +1,33 @@
+from datetime import datetime, timezone
+from decimal import Decimal
+from uuid import uuid4
+
+import pytest
+
+from src.app.transcoders import MinorUnitsTranscoder, OrjsonTranscoder
+
+
+@pytest.mark.parametrize("transcoder_class", [OrjsonTranscoder, MinorUnitsTranscoder])
+def test_transcoder_round_trip(transcoder_class):
+    transcoder = transcoder_class()
+    obj = {
+        "id": uuid4(),
+        "amount": Decimal("-4.50"),
+        "at": datetime.now(timezone.utc),
+        "items": [Decimal("5"), {"nested": Decimal("0.001")}],
+    }
+
+    assert transcoder.decode(transcoder.encode(obj)) == obj
+
+
+def test_transcoder_dollar_keys():
+    transcoder = OrjsonTranscoder()
+    # Dicts of user data that look like tagged values.
+    obj = {
+        "metadata": {"$u": "not a uuid"},
+        "other": {"$d": "5.00", "$$x": 1, "y": {"$t": "then"}},
+    }
+
+    assert transcoder.decode(transcoder.encode(obj)) == obj
+    assert transcoder.decode(b'{"$d": "5.00", "$x": 1}') == {"$d": "5.00", "$x": 1}
+    assert transcoder.decode(b'{"a": {"$d": "5.00"}}') == {"a": Decimal("5.00")}